@@ -1,6 +1,6 @@
 # dormitory/admin.py
 from django.contrib import admin
-from .models import Building, RoomType, Room, Student, Contract
+from .models import Building, RoomType, Room, Student, Contract, ExportJob
 
 @admin.register(Building)
 class BuildingAdmin(admin.ModelAdmin):
@@ -14,7 +14,7 @@ class RoomTypeAdmin(admin.ModelAdmin):
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
-    list_display = ['room_number', 'building', 'room_type', 'floor', 'status']
+    list_display = ['room_number', 'building', 'room_type', 'floor', 'status', 'occupied_beds', 'free_beds']
     list_filter = ['building', 'floor', 'status']
     search_fields = ['room_number']
 
@@ -27,4 +27,10 @@ class StudentAdmin(admin.ModelAdmin):
 class ContractAdmin(admin.ModelAdmin):
     list_display = ['contract_number', 'student', 'room', 'start_date', 'end_date', 'status']
     list_filter = ['status', 'start_date']
-    search_fields = ['contract_number', 'student__student_id']
\ No newline at end of file
+    search_fields = ['contract_number', 'student__student_id']
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'export_type', 'format', 'status', 'rows_processed', 'total_rows', 'requested_by', 'created_at', 'expires_at']
+    list_filter = ['export_type', 'format', 'status']
\ No newline at end of file
@@ -0,0 +1,302 @@
+# dormitory/allocation.py
+import csv
+import time
+from collections import Counter, defaultdict, deque
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from . import counters, occupancy, search
+from .booking import CONTRACT_DAYS, contract_number, unused_contract_numbers
+from .models import Building, Contract, Room, RoomType, Student
+from .text import normalize
+
+BATCH_SIZE = 500
+# Trường của sinh viên dùng để chia nhóm ở chung phòng
+GROUP_FIELDS = ('faculty', 'university', 'course')
+# Mức khớp nguyện vọng của một chỗ được xếp, theo thứ tự ưu tiên
+MATCH_LEVELS = ('exact', 'room_type', 'building', 'any')
+
+
+class AllocationError(Exception):
+    """Không ghi được kết quả xếp phòng; toàn bộ giao dịch đã được hoàn tác"""
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def read_preferences(file):
+    """Đọc nguyện vọng từ CSV có cột student_id và tùy chọn building, room_type (theo tên)"""
+    return [
+        {
+            'student_id': (row.get('student_id') or '').strip(),
+            'building': (row.get('building') or '').strip(),
+            'room_type': (row.get('room_type') or '').strip(),
+        }
+        for row in csv.DictReader(file)
+        if (row.get('student_id') or '').strip()
+    ]
+
+
+def load_applicants(preferences=None, group_by='faculty'):
+    """Sinh viên cần xếp phòng (chưa có hợp đồng active) kèm nguyện vọng đã đổi sang id.
+
+    Không có file nguyện vọng thì lấy mọi sinh viên chưa có phòng, không kèm nguyện vọng.
+    Trả về (danh sách ứng viên, thống kê các dòng bị bỏ qua).
+    """
+    group_field = group_by if group_by in GROUP_FIELDS else None
+    fields = ['pk', 'student_id'] + ([group_field] if group_field else [])
+    has_contract = Contract.objects.filter(student=OuterRef('pk'), status='active')
+    students = Student.objects.filter(~Exists(has_contract)).order_by()
+    skipped = {'unknown_student': 0, 'has_contract': 0, 'unknown_preference': 0, 'duplicate': 0}
+
+    if preferences is None:
+        rows = students.values_list(*fields).iterator(chunk_size=2000)
+        return [_applicant(row, group_field) for row in rows], skipped
+
+    buildings = {normalize(name): pk for pk, name in Building.objects.values_list('pk', 'name')}
+    room_types = {normalize(name): pk for pk, name in RoomType.objects.values_list('pk', 'name')}
+    codes = list(dict.fromkeys(pref['student_id'] for pref in preferences))
+    skipped['duplicate'] = len(preferences) - len(codes)
+    found = {}
+    for chunk in _chunks(codes, BATCH_SIZE):
+        for row in students.filter(student_id__in=chunk).values_list(*fields):
+            found[row[1]] = row
+    # Mã không có trong danh sách chờ: hoặc đã có hợp đồng, hoặc không tồn tại
+    known = set()
+    for chunk in _chunks([code for code in codes if code not in found], BATCH_SIZE):
+        known.update(Student.objects.filter(student_id__in=chunk).values_list('student_id', flat=True))
+
+    applicants, seen = [], set()
+    for pref in preferences:
+        code = pref['student_id']
+        if code in seen:
+            continue
+        seen.add(code)
+        if code not in found:
+            skipped['has_contract' if code in known else 'unknown_student'] += 1
+            continue
+        building_id = buildings.get(normalize(pref['building'])) if pref['building'] else None
+        room_type_id = room_types.get(normalize(pref['room_type'])) if pref['room_type'] else None
+        if (pref['building'] and building_id is None) or (pref['room_type'] and room_type_id is None):
+            # Tên không khớp thì coi như không có nguyện vọng đó
+            skipped['unknown_preference'] += 1
+        applicants.append(_applicant(found[code], group_field, building_id, room_type_id))
+    return applicants, skipped
+
+
+def _applicant(row, group_field, building_id=None, room_type_id=None):
+    return {
+        'student_pk': row[0],
+        'student_id': row[1],
+        'group': normalize(row[2]) if group_field else '',
+        'building_id': building_id,
+        'room_type_id': room_type_id,
+    }
+
+
+def _levels(building_id, room_type_id, strict=False):
+    """Các khóa thử lần lượt: đúng cả hai, đúng loại phòng, đúng tòa nhà, phòng bất kỳ"""
+    levels = [(building_id, room_type_id)]
+    if not strict:
+        levels += [(None, room_type_id), (building_id, None), (None, None)]
+    return list(dict.fromkeys(levels))
+
+
+class RoomPool:
+    """Giường trống trong bộ nhớ, đánh chỉ mục theo (tòa nhà, loại phòng) và các mức nới lỏng.
+
+    Mỗi phòng nằm trong hàng đợi của cả bốn khóa; phòng hết giường hay đã có nhóm khác
+    được bỏ khỏi đầu hàng đợi khi gặp (xóa lười), nên mỗi lần xếp là O(1) khấu hao.
+    """
+
+    def __init__(self, rooms, groups):
+        self.free = {}
+        self.group = {}
+        self.placement = {}
+        self.empty = defaultdict(deque)
+        self.partial = defaultdict(deque)
+        for room_id, building_id, room_type_id, free_beds in rooms:
+            occupant_groups = groups.get(room_id, set())
+            if len(occupant_groups) > 1:
+                # Phòng đã có sinh viên nhiều nhóm khác nhau: không xếp thêm
+                continue
+            self.free[room_id] = free_beds
+            self.placement[room_id] = (building_id, room_type_id)
+            self.group[room_id] = next(iter(occupant_groups), None)
+            for key in _levels(building_id, room_type_id):
+                if self.group[room_id] is None:
+                    self.empty[key].append(room_id)
+                else:
+                    self.partial[key, self.group[room_id]].append(room_id)
+
+    def take(self, levels, group):
+        """Giường cho một sinh viên: ưu tiên phòng cùng nhóm còn chỗ rồi mới mở phòng trống"""
+        for key in levels:
+            queue = self.partial[key, group]
+            while queue and self.free[queue[0]] <= 0:
+                queue.popleft()
+            if queue:
+                return self._assign(queue[0], group)
+            queue = self.empty[key]
+            while queue and self.group[queue[0]] is not None:
+                queue.popleft()
+            if queue:
+                return self._assign(queue[0], group)
+        return None
+
+    def _assign(self, room_id, group):
+        self.free[room_id] -= 1
+        if self.group[room_id] is None:
+            self.group[room_id] = group
+            if self.free[room_id] > 0:
+                for key in _levels(*self.placement[room_id]):
+                    self.partial[key, group].append(room_id)
+        return room_id
+
+
+def _match_level(applicant, placement):
+    building_ok = applicant['building_id'] in (None, placement[0])
+    room_type_ok = applicant['room_type_id'] in (None, placement[1])
+    if building_ok and room_type_ok:
+        return 'exact'
+    return 'room_type' if room_type_ok else 'building' if building_ok else 'any'
+
+
+def plan_allocation(applicants, rooms, groups, strict=False):
+    """Xếp tham lam trong bộ nhớ.
+
+    Trả về (các cặp (ứng viên, id phòng), ứng viên không có chỗ, {id phòng: (tòa nhà, loại phòng)}).
+
+    Ứng viên có nhiều nguyện vọng được xếp trước; trong cùng mức, ứng viên cùng nhóm đứng
+    liền nhau để lấp đầy phòng của nhóm trước khi mở phòng mới.
+    """
+    pool = RoomPool(rooms, groups)
+    order = sorted(applicants, key=lambda a: (
+        (a['building_id'] is None) + (a['room_type_id'] is None),
+        a['group'], a['building_id'] or 0, a['room_type_id'] or 0, a['student_id'],
+    ))
+    assignments, unassigned = [], []
+    for applicant in order:
+        room_id = pool.take(_levels(applicant['building_id'], applicant['room_type_id'], strict), applicant['group'])
+        if room_id is None:
+            unassigned.append(applicant)
+        else:
+            assignments.append((applicant, room_id))
+    return assignments, unassigned, pool.placement
+
+
+def load_rooms(group_by='faculty'):
+    """Phòng còn giường (dùng index status, free_beds) và nhóm của người đang ở.
+
+    Phòng đã có người thuộc một nhóm chỉ nhận thêm sinh viên cùng nhóm.
+    """
+    free_rooms = Room.objects.filter(status='available', free_beds__gt=0)
+    rooms = list(
+        free_rooms.order_by('building_id', 'floor', 'room_number')
+        .values_list('pk', 'building_id', 'room_type_id', 'free_beds')
+    )
+    groups = defaultdict(set)
+    group_field = group_by if group_by in GROUP_FIELDS else None
+    occupants = Contract.objects.filter(status='active', room__in=free_rooms).order_by()
+    if group_field:
+        for room_id, value in occupants.values_list('room_id', f'student__{group_field}'):
+            groups[room_id].add(normalize(value))
+    else:
+        for room_id in occupants.values_list('room_id', flat=True):
+            groups[room_id].add('')
+    return rooms, groups
+
+
+def write_allocation(assignments, start_date, numbers, batch_size=BATCH_SIZE):
+    """Ghi toàn bộ kết quả trong một giao dịch: cộng giường theo lô, bulk_create hợp đồng.
+
+    numbers: mã sinh viên -> số hợp đồng (từ unused_contract_numbers).
+
+    Số giường được giữ bằng UPDATE có điều kiện free_beds >= n; nếu phòng nào vừa bị
+    đăng ký mất chỗ thì hủy cả lần ghi để không vượt sức chứa.
+    """
+    per_room = Counter(room_id for _, room_id in assignments)
+    by_count = defaultdict(list)
+    for room_id, count in per_room.items():
+        by_count[count].append(room_id)
+    end_date = start_date + timedelta(days=CONTRACT_DAYS)
+    now = timezone.now()
+
+    try:
+        with transaction.atomic():
+            for count, room_ids in by_count.items():
+                for chunk in _chunks(room_ids, batch_size):
+                    claimed = Room.objects.filter(pk__in=chunk, status='available', free_beds__gte=count).update(
+                        occupied_beds=F('occupied_beds') + count, free_beds=F('free_beds') - count, updated_at=now,
+                    )
+                    if claimed != len(chunk):
+                        raise AllocationError('Số giường trống đã thay đổi trong lúc xếp phòng, hãy chạy lại')
+            for chunk in _chunks(list(per_room), batch_size):
+                occupancy.sync_status(Room.objects.filter(pk__in=chunk))
+
+            prices = {}
+            for chunk in _chunks(list(per_room), batch_size):
+                prices.update(Room.objects.filter(pk__in=chunk).values_list('pk', 'room_type__price_per_month'))
+            contracts = Contract.objects.bulk_create([
+                Contract(
+                    contract_number=numbers[applicant['student_id']],
+                    student_id=applicant['student_pk'],
+                    room_id=room_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    deposit=prices[room_id],  # Cọc 1 tháng
+                    status='active',
+                )
+                for applicant, room_id in assignments
+            ], batch_size=batch_size)
+            # bulk_create không gửi signal nên tự cập nhật bộ đếm và chỉ mục tìm kiếm
+            counters.bump(counters.contract_counter('active'), len(contracts))
+            counters.bump(counters.CONTRACTS_VERSION, 1)
+            search.index_objects('contract', [contract.pk for contract in contracts])
+    except IntegrityError as exc:
+        # Sinh viên vừa tự đăng ký phòng, hoặc hợp đồng trùng số được tạo trong lúc xếp
+        raise AllocationError(f'Không ghi được hợp đồng: {exc}')
+    return len(contracts)
+
+
+def allocate_rooms(preferences=None, start_date=None, group_by='faculty', strict=False, dry_run=False,
+                   batch_size=BATCH_SIZE):
+    """Xếp phòng hàng loạt đầu học kỳ: đọc dữ liệu, xếp trong bộ nhớ, ghi một lần"""
+    start_date = start_date or timezone.now().date()
+    started = time.monotonic()
+    applicants, skipped = load_applicants(preferences, group_by)
+    rooms, groups = load_rooms(group_by)
+    loaded = time.monotonic()
+
+    assignments, unassigned, placement = plan_allocation(applicants, rooms, groups, strict)
+    planned = time.monotonic()
+    levels = Counter(_match_level(applicant, placement[room_id]) for applicant, room_id in assignments)
+    # Sinh viên đã có hợp đồng (thường là đã chấm dứt) mang số của ngày bắt đầu nhận hậu tố -2, -3, ...
+    numbers = unused_contract_numbers([applicant['student_id'] for applicant, _ in assignments], start_date)
+    renumbered = sum(1 for code, number in numbers.items() if number != contract_number(code, start_date))
+
+    created = 0
+    if not dry_run and assignments:
+        created = write_allocation(assignments, start_date, numbers, batch_size)
+    finished = time.monotonic()
+
+    return {
+        'applicants': len(applicants),
+        'assigned': len(assignments),
+        'contracts_created': created,
+        'unassigned': [applicant['student_id'] for applicant in unassigned],
+        'rooms_used': len({room_id for _, room_id in assignments}),
+        'free_beds': sum(free_beds for *_, free_beds in rooms),
+        'levels': {level: levels.get(level, 0) for level in MATCH_LEVELS},
+        'skipped': skipped,
+        'renumbered': renumbered,
+        'load_seconds': loaded - started,
+        'plan_seconds': planned - loaded,
+        'write_seconds': finished - planned,
+        'elapsed': finished - started,
+    }
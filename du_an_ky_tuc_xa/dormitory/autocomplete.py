@@ -0,0 +1,167 @@
+# dormitory/autocomplete.py
+import threading
+import time
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Room, SearchChange, Student
+from .text import normalize
+
+# Khoảng thời gian tối thiểu giữa hai lần đọc nhật ký thay đổi
+REFRESH_SECONDS = getattr(settings, 'AUTOCOMPLETE_REFRESH_SECONDS', 5)
+JOURNAL_RETENTION_DAYS = getattr(settings, 'AUTOCOMPLETE_JOURNAL_RETENTION_DAYS', 7)
+RESULT_LIMIT = 10
+
+
+def _word_suffixes(text):
+    """'nguyen van anh' -> ['nguyen van anh', 'van anh', 'anh'] để gõ tên riêng cũng ra"""
+    words = text.split()
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+
+def _student_entries(rows):
+    for pk, student_id, full_name, full_name_normalized in rows:
+        keys = {normalize(student_id), *_word_suffixes(full_name_normalized)}
+        label = f"{student_id} - {full_name}" if full_name else student_id
+        yield ('student', pk), label, keys
+
+
+def _room_entries(rows):
+    for pk, room_number, room_number_normalized, building_name, building_normalized in rows:
+        keys = {room_number_normalized, f'{building_normalized} {room_number_normalized}'}
+        yield ('room', pk), f"{building_name} - Phòng {room_number}", keys
+
+
+def _load(kind, ids=None):
+    """Đọc (khóa đối tượng, nhãn, các khóa tìm kiếm) từ DB, toàn bộ hoặc theo danh sách id"""
+    if kind == 'student':
+        queryset = Student.objects.values_list('pk', 'student_id', 'full_name', 'full_name_normalized')
+        build = _student_entries
+    else:
+        queryset = Room.objects.values_list(
+            'pk', 'room_number', 'room_number_normalized', 'building__name', 'building__name_normalized',
+        )
+        build = _room_entries
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    return build(queryset.order_by().iterator(chunk_size=2000))
+
+
+class PrefixIndex:
+    """Mảng (khóa, loại, id) đã sắp xếp; tìm tiền tố bằng bisect, không chạm DB.
+
+    Không sửa tại chỗ: mỗi lần cập nhật tạo một index mới rồi thay thế, nên các luồng
+    đang đọc index cũ không cần khóa.
+    """
+
+    def __init__(self, entries, labels):
+        self.entries = entries
+        self.labels = labels
+
+    @classmethod
+    def build(cls, items, base=None, removed=()):
+        removed = set(removed)
+        entries = [] if base is None else [entry for entry in base.entries if entry[1:] not in removed]
+        labels = {} if base is None else {key: label for key, label in base.labels.items() if key not in removed}
+        for key, label, search_keys in items:
+            labels[key] = label
+            entries.extend((search_key, *key) for search_key in search_keys if search_key)
+        # Timsort gần như tuyến tính khi phần lớn mảng đã có thứ tự
+        entries.sort()
+        return cls(entries, labels)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def search(self, text, kind=None, limit=RESULT_LIMIT):
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        results, seen = [], set()
+        entries = self.entries
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(results) < limit:
+            search_key, entry_kind, pk = entries[i]
+            if not search_key.startswith(prefix):
+                break
+            i += 1
+            if (kind is None or entry_kind == kind) and (entry_kind, pk) not in seen:
+                seen.add((entry_kind, pk))
+                results.append({'type': entry_kind, 'id': pk, 'label': self.labels[(entry_kind, pk)]})
+        return results
+
+
+_state = {'index': None, 'version': 0, 'checked_at': 0.0}
+_lock = threading.Lock()
+
+
+def reset():
+    """Bỏ index hiện tại, lần gọi sau sẽ nạp lại từ đầu"""
+    with _lock:
+        _state.update(index=None, version=0, checked_at=0.0)
+
+
+def _prune_journal():
+    # Dọn nhật ký cũ; tiến trình nào đã tụt quá mốc này sẽ tự nạp lại toàn bộ
+    SearchChange.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=JOURNAL_RETENTION_DAYS)
+    ).delete()
+
+
+def _full_load():
+    _prune_journal()
+    # Lấy version trước khi đọc dữ liệu để không bỏ sót thay đổi xảy ra trong lúc nạp
+    version = SearchChange.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    items = [*_load('student'), *_load('room')]
+    _state.update(index=PrefixIndex.build(items), version=version)
+
+
+def _refresh():
+    changes = list(
+        SearchChange.objects.filter(pk__gt=_state['version']).order_by('pk').values_list('pk', 'kind', 'object_id')
+    )
+    if not changes:
+        return
+    oldest = SearchChange.objects.order_by('pk').values_list('pk', flat=True).first()
+    if oldest > _state['version'] + 1:
+        # Nhật ký đã bị dọn qua mốc của tiến trình này, không còn đủ để cập nhật dần
+        _full_load()
+        return
+
+    student_ids = {object_id for _, kind, object_id in changes if kind == 'student'}
+    room_ids = {object_id for _, kind, object_id in changes if kind == 'room'}
+    building_ids = {object_id for _, kind, object_id in changes if kind == 'building'}
+    if building_ids:
+        # Đổi tên tòa nhà làm đổi nhãn và khóa tìm kiếm của các phòng trong tòa
+        room_ids.update(Room.objects.filter(building_id__in=building_ids).values_list('pk', flat=True))
+
+    items = [*_load('student', student_ids), *_load('room', room_ids)]
+    removed = {('student', pk) for pk in student_ids} | {('room', pk) for pk in room_ids}
+    _state.update(index=PrefixIndex.build(items, base=_state['index'], removed=removed), version=changes[-1][0])
+
+
+def get_index():
+    """Index của tiến trình: nạp lần đầu khi cần, sau đó đọc nhật ký tối đa mỗi REFRESH_SECONDS"""
+    now = time.monotonic()
+    if _state['index'] is not None and now - _state['checked_at'] < REFRESH_SECONDS:
+        return _state['index']
+    with _lock:
+        if _state['index'] is None:
+            _full_load()
+        elif now - _state['checked_at'] >= REFRESH_SECONDS:
+            _refresh()
+            # Tiến trình sống lâu chỉ nạp toàn bộ một lần, nên dọn nhật ký sau mỗi lần cập nhật dần
+            _prune_journal()
+        _state['checked_at'] = now
+    return _state['index']
+
+
+def record_change(kind, object_id):
+    SearchChange.objects.create(kind=kind, object_id=object_id)
+
+
+def suggest(text, kind=None, limit=RESULT_LIMIT):
+    return get_index().search(text, kind=kind, limit=limit)
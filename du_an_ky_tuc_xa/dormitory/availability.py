@@ -0,0 +1,49 @@
+# dormitory/availability.py
+from django.db.models import Count, DateField, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Contract, Room
+
+
+def overlapping_contracts(start_date, end_date):
+    """Hợp đồng active có thời hạn giao với [start_date, end_date] (tính cả hai đầu)"""
+    return Contract.objects.filter(status='active', start_date__lte=end_date, end_date__gte=start_date)
+
+
+def peak_booked_beds(start_date, end_date):
+    """Subquery: số hợp đồng cùng hiệu lực nhiều nhất trong khoảng ngày của một phòng.
+
+    Số người ở chỉ tăng tại ngày bắt đầu của một hợp đồng (hoặc ngày đầu khoảng với hợp
+    đồng bắt đầu trước đó), nên chỉ cần đếm số hợp đồng đang hiệu lực tại các ngày đó rồi
+    lấy lớn nhất. Hợp đồng nối tiếp nhau (9-10 rồi 11-1) chỉ chiếm một giường.
+    """
+    overlapping = overlapping_contracts(start_date, end_date)
+    moved_in = Greatest(OuterRef('start_date'), Value(start_date, output_field=DateField()))
+    concurrent = Subquery(
+        overlapping.filter(room=OuterRef('room'), start_date__lte=moved_in, end_date__gte=moved_in)
+        .order_by().values('room').annotate(n=Count('pk')).values('n'),
+        output_field=IntegerField(),
+    )
+    return Subquery(
+        overlapping.filter(room=OuterRef('pk'))
+        .annotate(concurrent=concurrent).order_by('-concurrent').values('concurrent')[:1],
+        output_field=IntegerField(),
+    )
+
+
+def available_rooms(start_date, end_date, min_beds=1, building=None, room_type=None):
+    """Phòng còn ít nhất min_beds giường trong suốt khoảng ngày, gắn period_free_beds.
+
+    Số giường đã thuê là số hợp đồng cùng hiệu lực nhiều nhất trong khoảng, tính bằng
+    subquery tương quan; index (room, start_date, end_date) giúp subquery chỉ đọc hợp
+    đồng của chính phòng đó thay vì duyệt hợp đồng của mọi phòng bằng Python.
+    """
+    rooms = Room.objects.exclude(status='maintenance')
+    if building:
+        rooms = rooms.filter(building=building)
+    if room_type:
+        rooms = rooms.filter(room_type=room_type)
+    return rooms.annotate(
+        booked_beds=Coalesce(peak_booked_beds(start_date, end_date), Value(0)),
+        period_free_beds=F('room_type__capacity') - F('booked_beds'),
+    ).filter(period_free_beds__gte=min_beds)
@@ -0,0 +1,109 @@
+# dormitory/booking.py
+import sqlite3
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+
+from . import occupancy
+from .models import Contract, Room
+
+# Thời hạn hợp đồng mặc định khi sinh viên tự đăng ký
+CONTRACT_DAYS = 365
+# SQLite chỉ cho một giao dịch ghi tại một thời điểm: thử lại khi CSDL đang bị khóa
+LOCK_RETRIES = getattr(settings, 'BOOKING_LOCK_RETRIES', 20)
+LOCK_RETRY_DELAY = 0.01
+
+
+class BookingError(Exception):
+    """Không đăng ký được phòng; message là thông báo hiển thị cho sinh viên"""
+
+
+def is_locked(exc):
+    """Lỗi do CSDL đang bị khóa: SQLITE_BUSY / SQLITE_LOCKED (kể cả mã mở rộng) của lỗi gốc từ driver"""
+    code = getattr(exc.__cause__, 'sqlite_errorcode', None)
+    return code is not None and code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+
+def contract_number(student_code, today):
+    return f"CT{today.strftime('%Y%m%d')}{student_code}"
+
+
+def unused_contract_number(student_code, today):
+    """Số hợp đồng chưa dùng: sinh viên đăng ký lại trong ngày (sau khi hợp đồng trước bị
+    chấm dứt) nhận thêm hậu tố -2, -3, ..."""
+    base = contract_number(student_code, today)
+    taken = set(Contract.objects.filter(contract_number__startswith=base).values_list('contract_number', flat=True))
+    return _first_unused(base, taken)
+
+
+def unused_contract_numbers(student_codes, today):
+    """Như unused_contract_number cho nhiều sinh viên, một truy vấn cho mọi số của ngày"""
+    prefix = contract_number('', today)
+    taken = set(Contract.objects.filter(contract_number__startswith=prefix).values_list('contract_number', flat=True))
+    numbers = {}
+    for code in student_codes:
+        numbers[code] = _first_unused(contract_number(code, today), taken)
+        taken.add(numbers[code])
+    return numbers
+
+
+def _first_unused(base, taken):
+    number, suffix = base, 1
+    while number in taken:
+        suffix += 1
+        number = f'{base}-{suffix}'
+    return number
+
+
+def _book(student, room_id, today):
+    if Contract.objects.filter(student=student, status='active').exists():
+        raise BookingError("Bạn đã có hợp đồng đang hoạt động!")
+    with transaction.atomic():
+        # UPDATE có điều kiện là phép kiểm tra và giữ giường trong cùng một câu lệnh:
+        # hai yêu cầu đồng thời thì chỉ một yêu cầu lấy được giường cuối cùng
+        if not occupancy.occupy(room_id):
+            raise BookingError("Phòng đã hết giường trống hoặc không còn nhận đăng ký!")
+        room = Room.objects.select_related('room_type').get(pk=room_id)
+
+        contract = Contract(
+            contract_number=unused_contract_number(student.student_id, today),
+            student=student,
+            room=room,
+            start_date=today,
+            end_date=today + timedelta(days=CONTRACT_DAYS),
+            deposit=room.room_type.price_per_month,  # Cọc 1 tháng
+            status='active',
+        )
+        # Giường đã được giữ ở trên, signal không cộng thêm lần nữa
+        contract._bed_claimed = True
+        try:
+            with transaction.atomic():
+                contract.save()
+        except IntegrityError:
+            # Thoát khỏi atomic ngoài để trả lại giường. Ràng buộc một hợp đồng active cho
+            # mỗi sinh viên: yêu cầu khác của cùng sinh viên vừa thắng; còn lại là trùng số
+            # hợp đồng với một yêu cầu chạy đồng thời
+            if Contract.objects.filter(student=student, status='active').exists():
+                raise BookingError("Bạn đã có hợp đồng đang hoạt động!")
+            raise BookingError("Không tạo được hợp đồng, vui lòng thử lại!")
+    return contract
+
+
+def book_room(student, room_id, today=None):
+    """Đăng ký phòng cho sinh viên trong một giao dịch, trả về hợp đồng mới.
+
+    Giường được giữ bằng UPDATE ... WHERE status='available' AND free_beds > 0 thay vì đọc
+    rồi ghi, nên phòng không bao giờ vượt sức chứa; ràng buộc unique_active_contract_per_student chặn
+    sinh viên có hai hợp đồng active. Lỗi nghiệp vụ được báo bằng BookingError.
+    """
+    today = today or timezone.now().date()
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return _book(student, room_id, today)
+        except OperationalError as exc:
+            if not is_locked(exc) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(LOCK_RETRY_DELAY * (attempt + 1))
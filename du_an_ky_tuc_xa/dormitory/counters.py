@@ -0,0 +1,94 @@
+# dormitory/counters.py
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+
+# Tăng mỗi khi hợp đồng thay đổi; dùng làm phiên bản cho các kết quả tính từ hợp đồng được cache
+CONTRACTS_VERSION = 'contracts:version'
+
+
+def room_counter(status):
+    return f'rooms:{status}'
+
+
+def contract_counter(status):
+    return f'contracts:{status}'
+
+
+def payment_counter(status):
+    return f'payments:{status}'
+
+
+def bump(name, delta, building_id=None):
+    """Cộng delta vào bộ đếm bằng UPDATE ... SET value = value + delta"""
+    from .models import StatCounter
+    if not delta:
+        return
+    counters = StatCounter.objects.filter(name=name, building_id=building_id)
+    if counters.update(value=F('value') + delta) or delta < 0:
+        # Thiếu bộ đếm mà delta âm: tòa nhà vừa bị xóa, không cần ghi lại
+        return
+    try:
+        with transaction.atomic():
+            StatCounter.objects.create(name=name, building_id=building_id, value=delta)
+    except IntegrityError:
+        # Tiến trình khác vừa tạo bộ đếm
+        counters.update(value=F('value') + delta)
+
+
+def move(old_name, new_name, old_building_id=None, new_building_id=None):
+    """Chuyển một đơn vị từ bộ đếm cũ sang bộ đếm mới khi trạng thái thay đổi"""
+    if old_name == new_name and old_building_id == new_building_id:
+        return
+    bump(old_name, -1, old_building_id)
+    bump(new_name, 1, new_building_id)
+
+
+def read_counters():
+    """Đọc toàn bộ bộ đếm: {(name, building_id): value}"""
+    from .models import StatCounter
+    return {
+        (name, building_id): value
+        for name, building_id, value in StatCounter.objects.values_list('name', 'building_id', 'value')
+    }
+
+
+def read_counter(name, building_id=None):
+    from .models import StatCounter
+    return StatCounter.objects.filter(name=name, building_id=building_id).values_list('value', flat=True).first() or 0
+
+
+def total(counters, name):
+    """Tổng một bộ đếm trên mọi tòa nhà"""
+    return sum(value for (counter_name, _), value in counters.items() if counter_name == name)
+
+
+def rebuild_counters(apps=global_apps):
+    """Tính lại toàn bộ bộ đếm từ dữ liệu gốc để sửa sai lệch"""
+    StatCounter = apps.get_model('dormitory', 'StatCounter')
+    Building = apps.get_model('dormitory', 'Building')
+    Room = apps.get_model('dormitory', 'Room')
+    Student = apps.get_model('dormitory', 'Student')
+    Contract = apps.get_model('dormitory', 'Contract')
+    Payment = apps.get_model('payment', 'Payment')
+
+    rows = [
+        StatCounter(name='buildings', value=Building.objects.count()),
+        StatCounter(name='students', value=Student.objects.count()),
+    ]
+    # Phiên bản không tính lại được từ dữ liệu gốc: giữ nguyên để cache cũ không bị dùng lại
+    version = StatCounter.objects.filter(name=CONTRACTS_VERSION, building__isnull=True).values_list('value', flat=True).first()
+    if version:
+        rows.append(StatCounter(name=CONTRACTS_VERSION, value=version))
+    for building_id, status, count in Room.objects.values_list('building_id', 'status').annotate(n=Count('id')).order_by():
+        rows.append(StatCounter(name=room_counter(status), building_id=building_id, value=count))
+    for status, count in Contract.objects.values_list('status').annotate(n=Count('id')).order_by():
+        rows.append(StatCounter(name=contract_counter(status), value=count))
+    for status, count in Payment.objects.values_list('status').annotate(n=Count('id')).order_by():
+        rows.append(StatCounter(name=payment_counter(status), value=count))
+
+    with transaction.atomic():
+        StatCounter.objects.all().delete()
+        StatCounter.objects.bulk_create(rows)
+    return len(rows)
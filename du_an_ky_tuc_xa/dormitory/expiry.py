@@ -0,0 +1,47 @@
+# dormitory/expiry.py
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, occupancy
+from .models import Contract, Room
+
+BATCH_SIZE = 500
+
+
+def due_contracts(today):
+    """Hợp đồng active đã qua ngày kết thúc (dùng index status, end_date)"""
+    return Contract.objects.filter(status='active', end_date__lt=today)
+
+
+def expire_contracts(today=None, dry_run=False):
+    """Chuyển mọi hợp đồng đến hạn sang 'expired' rồi trả giường cho các phòng liên quan.
+
+    Hợp đồng đổi bằng một câu UPDATE; số giường của các phòng bị ảnh hưởng được tính lại
+    từ hợp đồng active bằng UPDATE dùng Subquery. Chạy lại không đổi gì thêm, nên có thể
+    đặt lịch chạy vài phút một lần: khi không có hợp đồng đến hạn chỉ tốn một truy vấn.
+    """
+    today = today or timezone.now().date()
+    started = time.monotonic()
+    result = {'expired': 0, 'rooms': 0, 'reopened': 0, 'elapsed': 0.0}
+
+    with transaction.atomic():
+        due = due_contracts(today)
+        room_ids = list(due.order_by().values_list('room_id', flat=True).distinct())
+        result['rooms'] = len(room_ids)
+        if dry_run:
+            result['expired'] = due.count()
+        elif room_ids:
+            result['expired'] = due.update(status='expired')
+            # update() không gửi signal nên tự chuyển bộ đếm và trả giường
+            counters.bump(counters.contract_counter('active'), -result['expired'])
+            counters.bump(counters.contract_counter('expired'), result['expired'])
+            counters.bump(counters.CONTRACTS_VERSION, 1)
+            for start in range(0, len(room_ids), BATCH_SIZE):
+                rooms = Room.objects.filter(pk__in=room_ids[start:start + BATCH_SIZE])
+                occupancy.recompute_beds(rooms)
+                result['reopened'] += occupancy.sync_status(rooms)[1]
+
+    result['elapsed'] = time.monotonic() - started
+    return result
@@ -0,0 +1,209 @@
+# dormitory/export_jobs.py
+import hashlib
+import json
+import logging
+import tempfile
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from . import exports, pdf_export, search
+from .models import ExportJob
+from .services import rooms_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# File xuất xong được giữ trong khoảng này rồi bị xóa
+RETENTION_HOURS = getattr(settings, 'EXPORT_JOB_RETENTION_HOURS', 24)
+# Job 'running' không cập nhật tiến độ quá lâu coi như tiến trình chạy nó đã chết
+STALE_SECONDS = getattr(settings, 'EXPORT_JOB_STALE_SECONDS', 600)
+# Chạy job trong luồng nền của web server; đặt False khi có worker run_export_jobs
+RUN_IN_THREAD = getattr(settings, 'EXPORT_JOBS_IN_THREAD', True)
+PROGRESS_EVERY = 1000
+
+
+def _list_search(kind):
+    def apply(queryset, filters):
+        text = filters.get('search')
+        return search.search_list(queryset, kind, text) if text else queryset
+    return apply
+
+
+def _payments():
+    from payment.exports import PAYMENTS
+    return PAYMENTS
+
+
+def _filter_payments(queryset, filters):
+    from payment.services import filter_payments
+    return filter_payments(queryset, filters)
+
+
+def _payment_filter_keys():
+    from payment.services import PAYMENT_FILTERS
+    return PAYMENT_FILTERS
+
+
+# Loại xuất: tên -> (dataset, hàm áp bộ lọc, các tham số lọc được nhận)
+EXPORT_TYPES = {
+    'rooms': (lambda: exports.ROOMS, _list_search('room'), lambda: ('search',)),
+    'students': (lambda: exports.STUDENTS, _list_search('student'), lambda: ('search',)),
+    'contracts': (lambda: exports.CONTRACTS, _list_search('contract'), lambda: ('search',)),
+    'payments': (_payments, _filter_payments, _payment_filter_keys),
+}
+# Định dạng chỉ một số loại xuất có: định dạng -> {loại xuất: hàm ghi (dataset, rows, output)}
+WRITERS = {
+    'pdf': {'rooms': pdf_export.write_rooms_pdf},
+}
+# Dấu vân tay dữ liệu theo (loại, định dạng): job đã xong được dùng lại tới khi dữ liệu đổi
+FINGERPRINTS = {
+    ('rooms', 'pdf'): rooms_fingerprint,
+}
+
+
+def supports(export_type, fmt):
+    if export_type not in EXPORT_TYPES or fmt not in dict(ExportJob.FORMAT_CHOICES):
+        return False
+    return fmt not in WRITERS or export_type in WRITERS[fmt]
+
+
+def clean_filters(export_type, params):
+    """Chỉ giữ các tham số lọc hợp lệ, bỏ giá trị rỗng"""
+    allowed = EXPORT_TYPES[export_type][2]()
+    return {key: params.get(key) for key in allowed if params.get(key)}
+
+
+def dedupe_key(export_type, fmt, filters, fingerprint=None):
+    parts = [export_type, fmt, filters] + ([fingerprint] if fingerprint else [])
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def fail_stale_jobs():
+    """Giải phóng khóa dedupe của job đang chạy mà tiến trình đã chết"""
+    now = timezone.now()
+    return ExportJob.objects.filter(
+        status='running', updated_at__lt=now - timedelta(seconds=STALE_SECONDS),
+    ).update(status='failed', error='Worker dừng giữa chừng', finished_at=now,
+             expires_at=now + timedelta(hours=RETENTION_HOURS))
+
+
+def submit(export_type, fmt, filters, user=None):
+    """Tạo job hoặc trả về job giống hệt đang chờ/chạy (hay đã xong, nếu dữ liệu chưa đổi). Trả về (job, created)"""
+    filters = clean_filters(export_type, filters)
+    fingerprint = FINGERPRINTS.get((export_type, fmt))
+    key = dedupe_key(export_type, fmt, filters, fingerprint() if fingerprint else None)
+    purge_expired()
+    fail_stale_jobs()
+
+    statuses = ExportJob.ACTIVE_STATUSES + ('done',) if fingerprint else ExportJob.ACTIVE_STATUSES
+    existing = ExportJob.objects.filter(dedupe_key=key, status__in=statuses).order_by('-created_at').first()
+    if existing:
+        return existing, False
+    try:
+        with transaction.atomic():
+            job = ExportJob.objects.create(
+                export_type=export_type, format=fmt, filters=filters, dedupe_key=key,
+                requested_by=user if user and user.is_authenticated else None,
+            )
+    except IntegrityError:
+        # Yêu cầu song song vừa tạo job cùng khóa
+        return ExportJob.objects.get(dedupe_key=key, status__in=ExportJob.ACTIVE_STATUSES), False
+
+    if RUN_IN_THREAD:
+        transaction.on_commit(lambda: run_in_background(_run_in_thread, job.pk))
+    return job, True
+
+
+def claim(job_id):
+    """Nhận job bằng UPDATE có điều kiện, chỉ một worker thắng"""
+    return ExportJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=timezone.now(), updated_at=timezone.now(),
+    ) == 1
+
+
+def _track(rows, job_id):
+    """Đếm dòng đã ghi, cập nhật tiến độ mỗi PROGRESS_EVERY dòng"""
+    processed = 0
+    for row in rows:
+        yield row
+        processed += 1
+        if processed % PROGRESS_EVERY == 0:
+            ExportJob.objects.filter(pk=job_id).update(rows_processed=processed, updated_at=timezone.now())
+    ExportJob.objects.filter(pk=job_id).update(rows_processed=processed, updated_at=timezone.now())
+
+
+def run_job(job_id):
+    """Chạy một job đã được tạo; trả về False nếu worker khác đã nhận job"""
+    if not claim(job_id):
+        return False
+    job = ExportJob.objects.get(pk=job_id)
+    try:
+        dataset_getter, apply_filters, _ = EXPORT_TYPES[job.export_type]
+        dataset = dataset_getter()
+        queryset = apply_filters(dataset.queryset(), job.filters)
+        ExportJob.objects.filter(pk=job_id).update(total_rows=queryset.count())
+
+        rows = _track(dataset.rows(queryset, formatted=job.format in ('xlsx', 'pdf')), job_id)
+        with tempfile.TemporaryFile() as output:
+            if job.format in WRITERS:
+                WRITERS[job.format][job.export_type](dataset, rows, output)
+                output.seek(0)
+            elif job.format == 'xlsx':
+                exports.write_xlsx(dataset, rows=rows, output=output)
+            else:
+                lines = exports.csv_lines(dataset, rows) if job.format == 'csv' else exports.ndjson_lines(dataset, rows)
+                for line in lines:
+                    output.write(line.encode())
+                output.seek(0)
+            job.file.save(f'{dataset.name}-{job.pk}.{job.format}', File(output), save=False)
+
+        now = timezone.now()
+        ExportJob.objects.filter(pk=job_id).update(
+            status='done', file=job.file.name, finished_at=now, updated_at=now,
+            expires_at=now + timedelta(hours=RETENTION_HOURS),
+        )
+    except Exception as exc:
+        logger.exception('Lỗi chạy export job %s', job_id)
+        now = timezone.now()
+        ExportJob.objects.filter(pk=job_id).update(
+            status='failed', error=str(exc), finished_at=now, expires_at=now + timedelta(hours=RETENTION_HOURS),
+        )
+    return True
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Luồng nền tự mở kết nối DB, phải đóng khi xong
+        connections.close_all()
+
+
+def run_in_background(target, *args):
+    threading.Thread(target=target, args=args, daemon=True).start()
+
+
+def run_pending(limit=10):
+    """Chạy các job đang chờ theo thứ tự tạo, trả về số job đã chạy (dùng cho worker)"""
+    fail_stale_jobs()
+    ran = 0
+    for job_id in ExportJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)[:limit]:
+        if run_job(job_id):
+            ran += 1
+    return ran
+
+
+def purge_expired(now=None):
+    """Xóa file và bản ghi của job đã quá hạn lưu giữ, trả về số job đã xóa"""
+    now = now or timezone.now()
+    expired = list(ExportJob.objects.filter(expires_at__lt=now))
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+    ExportJob.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return len(expired)
@@ -0,0 +1,221 @@
+# dormitory/exports.py
+import csv
+import json
+import re
+import tempfile
+import zlib
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from openpyxl import Workbook
+
+from .models import Contract, Room, Student
+
+# Số dòng mỗi lần đọc từ cursor phía server
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+STREAM_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+# Số dòng gộp thành một khối gửi đi (và một lần flush gzip)
+STREAM_FLUSH_ROWS = 500
+_accepts_gzip = re.compile(r'\bgzip\b')
+
+
+def choice_label(choices):
+    labels = dict(choices)
+    return lambda value: labels.get(value, value)
+
+
+def date_vn(value):
+    return value.strftime('%d/%m/%Y') if value else ''
+
+
+def money(value):
+    return float(value) if value is not None else None
+
+
+class Column:
+    """Một cột xuất: key (tên trường trong NDJSON), tiêu đề, các trường values_list và hàm định dạng"""
+
+    def __init__(self, key, header, fields=None, format=None):
+        self.key = key
+        self.header = header
+        fields = fields or key
+        self.fields = (fields,) if isinstance(fields, str) else tuple(fields)
+        self.format = format
+
+
+class Dataset:
+    """Mô tả một bảng xuất: chỉ đọc values_list theo từng chunk, không tạo đối tượng model"""
+
+    def __init__(self, name, title, filename, queryset, columns):
+        self.name = name
+        self.title = title
+        self.filename = filename
+        self.queryset = queryset
+        self.columns = columns
+
+    @property
+    def headers(self):
+        return [column.header for column in self.columns]
+
+    @property
+    def keys(self):
+        return [column.key for column in self.columns]
+
+    def rows(self, queryset=None, formatted=True):
+        """Sinh từng dòng; bộ nhớ chỉ giữ một chunk.
+
+        formatted=False giữ giá trị gốc (mã trạng thái, ngày ISO) cho CSV/NDJSON, chỉ các
+        cột ghép từ nhiều trường vẫn qua hàm định dạng.
+        """
+        queryset = self.queryset() if queryset is None else queryset
+        fields = [field for column in self.columns for field in column.fields]
+        values = queryset.order_by('pk').values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        for raw in values:
+            row, i = [], 0
+            for column in self.columns:
+                args = raw[i:i + len(column.fields)]
+                i += len(column.fields)
+                if column.format and (formatted or len(args) > 1):
+                    row.append(column.format(*args))
+                else:
+                    row.append(args[0])
+            yield row
+
+
+def write_xlsx(dataset, queryset=None, rows=None, output=None):
+    """Ghi workbook ở chế độ write-only vào file tạm (openpyxl đẩy từng dòng xuống đĩa)"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(dataset.title)
+    sheet.append(dataset.headers)
+    for row in dataset.rows(queryset) if rows is None else rows:
+        sheet.append(row)
+    output = tempfile.TemporaryFile() if output is None else output
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def xlsx_response(dataset, queryset=None):
+    """Trả file XLSX theo từng khối; file tạm tự xóa khi response đóng"""
+    return FileResponse(
+        write_xlsx(dataset, queryset),
+        as_attachment=True,
+        filename=dataset.filename,
+        content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+class _Echo:
+    """Đối tượng giả file để csv.writer trả về dòng thay vì ghi"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(dataset, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(dataset.keys)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(dataset, rows):
+    keys = dataset.keys
+    for row in rows:
+        yield json.dumps(dict(zip(keys, row)), ensure_ascii=False, cls=DjangoJSONEncoder) + '\n'
+
+
+def _chunks(lines):
+    """Gộp dòng thành khối; khối đầu (dòng tiêu đề CSV) gửi ngay trước khi chạy truy vấn"""
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is not None:
+        yield first.encode()
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= STREAM_FLUSH_ROWS:
+            yield ''.join(buffer).encode()
+            buffer = []
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def _gzip(chunks):
+    """Nén gzip từng khối, flush sau mỗi khối để client nhận được dữ liệu ngay"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def stream_response(request, dataset, fmt, queryset=None):
+    """Xuất CSV / NDJSON dạng stream, nén gzip nếu client chấp nhận"""
+    rows = dataset.rows(queryset, formatted=False)
+    lines = csv_lines(dataset, rows) if fmt == 'csv' else ndjson_lines(dataset, rows)
+    body = _chunks(lines)
+    compress = bool(_accepts_gzip.search(request.headers.get('Accept-Encoding', '')))
+    if compress:
+        body = _gzip(body)
+
+    response = StreamingHttpResponse(body, content_type=STREAM_CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset.name}.{fmt}"'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def _student_name(full_name, first_name, last_name):
+    return full_name or f'{first_name} {last_name}'.strip()
+
+
+ROOMS = Dataset(
+    'rooms', 'Danh sách phòng', 'danh_sach_phong.xlsx',
+    Room.objects.all,
+    [
+        Column('room_number', 'Mã phòng'),
+        Column('building', 'Tòa nhà', 'building__name'),
+        Column('room_type', 'Loại phòng', 'room_type__name'),
+        Column('capacity', 'Sức chứa', 'room_type__capacity'),
+        Column('price_per_month', 'Giá thuê', 'room_type__price_per_month', money),
+        Column('floor', 'Tầng'),
+        Column('status', 'Trạng thái', format=choice_label(Room.status_choices)),
+    ],
+)
+
+STUDENTS = Dataset(
+    'students', 'Danh sách sinh viên', 'danh_sach_sinh_vien.xlsx',
+    Student.objects.all,
+    [
+        Column('student_id', 'Mã SV'),
+        Column('full_name', 'Họ tên', ('full_name', 'user__first_name', 'user__last_name'), _student_name),
+        Column('date_of_birth', 'Ngày sinh', format=date_vn),
+        Column('email', 'Email', 'user__email'),
+        Column('university', 'Trường'),
+        Column('faculty', 'Khoa'),
+        Column('course', 'Khóa học'),
+    ],
+)
+
+CONTRACTS = Dataset(
+    'contracts', 'Danh sách hợp đồng', 'danh_sach_hop_dong.xlsx',
+    Contract.objects.all,
+    [
+        Column('contract_number', 'Số hợp đồng'),
+        Column('student_id', 'Mã SV', 'student__student_id'),
+        Column('student_name', 'Họ tên', ('student__full_name', 'student__user__first_name', 'student__user__last_name'), _student_name),
+        Column('building', 'Tòa nhà', 'room__building__name'),
+        Column('room_number', 'Phòng', 'room__room_number'),
+        Column('start_date', 'Ngày bắt đầu', format=date_vn),
+        Column('end_date', 'Ngày kết thúc', format=date_vn),
+        Column('deposit', 'Tiền cọc', format=money),
+        Column('status', 'Trạng thái', format=choice_label(Contract.status_choices)),
+    ],
+)
@@ -0,0 +1,133 @@
+# dormitory/forecast.py
+from collections import defaultdict
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from . import counters
+from .models import Contract, Room
+from .services import rooms_fingerprint
+
+try:
+    import numpy as np
+except ImportError:  # NumPy không bắt buộc, thiếu thì quét bằng Python thuần
+    np = None
+
+FORECAST_DAYS = getattr(settings, 'VACANCY_FORECAST_DAYS', 365)
+CACHE_SECONDS = getattr(settings, 'VACANCY_FORECAST_CACHE_SECONDS', 24 * 3600)
+
+
+def _load(start, days):
+    """Sức chứa theo (tòa nhà, loại phòng) và các sự kiện vào / ra của hợp đồng active.
+
+    Phòng bảo trì không tính vào sức chứa, nên hợp đồng ở các phòng đó cũng bị bỏ qua.
+    """
+    last = start + timedelta(days=days - 1)
+    groups = list(
+        Room.objects.exclude(status='maintenance')
+        .values('building_id', 'building__name', 'room_type_id', 'room_type__name')
+        .annotate(rooms=Count('id'), capacity=Sum('room_type__capacity'))
+        .order_by('building__name', 'room_type__name')
+    )
+    contracts = (
+        Contract.objects.filter(status='active', end_date__gte=start, start_date__lte=last)
+        .exclude(room__status='maintenance')
+        .values_list('room__building_id', 'room__room_type_id', 'start_date', 'end_date')
+        .iterator(chunk_size=2000)
+    )
+    return groups, contracts
+
+
+def _sweep_numpy(group_count, days, events):
+    """Cộng +1 / -1 vào ô ngày của từng nhóm rồi cumsum theo trục ngày"""
+    delta = np.zeros((group_count, days + 1), dtype=np.int64)
+    if events:
+        rows, cols, changes = np.array(events, dtype=np.int64).T
+        np.add.at(delta, (rows, cols), changes)
+    return np.cumsum(delta[:, :days], axis=1).tolist()
+
+
+def _sweep_python(group_count, days, events):
+    delta = [[0] * (days + 1) for _ in range(group_count)]
+    for row, col, change in events:
+        delta[row][col] += change
+    return [list(accumulate(row[:days])) for row in delta]
+
+
+def sweep(group_count, days, events):
+    """Số giường đang thuê mỗi ngày của từng nhóm từ các sự kiện (nhóm, ngày, +1/-1)"""
+    return (_sweep_numpy if np is not None else _sweep_python)(group_count, days, events)
+
+
+def compute_forecast(start=None, days=FORECAST_DAYS):
+    """Dự báo giường trống từng ngày trong days ngày tới, theo tòa nhà và loại phòng.
+
+    Mỗi hợp đồng tạo sự kiện +1 ở ngày bắt đầu (hoặc hôm nay) và -1 ở ngày sau ngày kết
+    thúc; cộng dồn các sự kiện đã xếp theo ngày (sweep-line) cho số giường đang thuê, nên
+    chi phí là O(số hợp đồng + số nhóm x số ngày) thay vì kiểm tra từng hợp đồng mỗi ngày.
+    """
+    start = start or timezone.now().date()
+    groups, contracts = _load(start, days)
+    index = {(group['building_id'], group['room_type_id']): i for i, group in enumerate(groups)}
+
+    events = []
+    for building_id, room_type_id, start_date, end_date in contracts:
+        row = index.get((building_id, room_type_id))
+        if row is None:
+            continue
+        events.append((row, max((start_date - start).days, 0), 1))
+        # Ngoài khoảng dự báo thì rơi vào ô cuối (days), ô này không được cộng dồn
+        events.append((row, min((end_date - start).days + 1, days), -1))
+    occupied = sweep(len(groups), days, events)
+
+    result_groups = []
+    total = [0] * days
+    for group, taken in zip(groups, occupied):
+        free = [group['capacity'] - beds for beds in taken]
+        total = [a + b for a, b in zip(total, free)]
+        result_groups.append({
+            'building_id': group['building_id'],
+            'building': group['building__name'],
+            'room_type_id': group['room_type_id'],
+            'room_type': group['room_type__name'],
+            'rooms': group['rooms'],
+            'capacity': group['capacity'],
+            'free': free,
+        })
+    return {
+        'start': start,
+        'days': days,
+        'capacity': sum(group['capacity'] for group in groups),
+        'groups': result_groups,
+        'total': total,
+    }
+
+
+def cache_key(start, days):
+    """Khóa đổi khi hợp đồng thay đổi (bộ đếm phiên bản) hoặc phòng / sức chứa thay đổi"""
+    version = counters.read_counter(counters.CONTRACTS_VERSION)
+    return f'vacancy_forecast:{start.isoformat()}:{days}:{version}:{rooms_fingerprint()}'
+
+
+def get_forecast(start=None, days=FORECAST_DAYS):
+    """Dự báo đã cache; tính lại khi khóa phiên bản đổi"""
+    start = start or timezone.now().date()
+    key = cache_key(start, days)
+    forecast = cache.get(key)
+    if forecast is None:
+        forecast = compute_forecast(start, days)
+        cache.set(key, forecast, CACHE_SECONDS)
+    return forecast
+
+
+def monthly_minimum(forecast, series):
+    """Gộp chuỗi ngày thành [(tháng, số giường trống thấp nhất trong tháng)] để hiển thị"""
+    months = defaultdict(list)
+    for offset, value in enumerate(series):
+        day = forecast['start'] + timedelta(days=offset)
+        months[(day.year, day.month)].append(value)
+    return [(f'{month:02d}/{year}', min(values)) for (year, month), values in months.items()]
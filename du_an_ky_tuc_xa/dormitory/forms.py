@@ -1,6 +1,6 @@
 # dormitory/forms.py - TẠO FILE MỚI
 from django import forms
-from .models import Room, Building, Student, Contract
+from .models import Room, Building, RoomType, Student, Contract
 
 class RoomForm(forms.ModelForm):
     class Meta:
@@ -53,4 +53,22 @@ class ContractForm(forms.ModelForm):
             'end_date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
             'deposit': forms.NumberInput(attrs={'class': 'form-control'}),
             'status': forms.Select(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+
+class AvailabilityForm(forms.Form):
+    """Khoảng ngày và bộ lọc cho tra cứu phòng trống"""
+    start_date = forms.DateField(label='Từ ngày', widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    end_date = forms.DateField(label='Đến ngày', widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    building = forms.ModelChoiceField(label='Tòa nhà', queryset=Building.objects.order_by('name'), required=False,
+                                      widget=forms.Select(attrs={'class': 'form-control'}))
+    room_type = forms.ModelChoiceField(label='Loại phòng', queryset=RoomType.objects.order_by('name'), required=False,
+                                       widget=forms.Select(attrs={'class': 'form-control'}))
+    min_beds = forms.IntegerField(label='Số giường cần', min_value=1, initial=1, required=False,
+                                  widget=forms.NumberInput(attrs={'class': 'form-control'}))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date, end_date = cleaned_data.get('start_date'), cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            self.add_error('end_date', 'Ngày kết thúc phải sau ngày bắt đầu')
+        return cleaned_data
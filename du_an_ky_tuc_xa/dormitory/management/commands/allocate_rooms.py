@@ -0,0 +1,85 @@
+# dormitory/management/commands/allocate_rooms.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from dormitory.allocation import BATCH_SIZE, GROUP_FIELDS, AllocationError, allocate_rooms, read_preferences
+
+LEVEL_LABELS = {
+    'exact': 'đúng nguyện vọng',
+    'room_type': 'đúng loại phòng',
+    'building': 'đúng tòa nhà',
+    'any': 'phòng khác',
+}
+
+
+class Command(BaseCommand):
+    help = 'Xếp phòng hàng loạt cho sinh viên chưa có hợp đồng (đầu học kỳ)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('preferences', nargs='?',
+                            help='File CSV nguyện vọng: student_id, building, room_type. '
+                                 'Bỏ trống để xếp mọi sinh viên chưa có phòng')
+        parser.add_argument('--start-date', help='Ngày bắt đầu hợp đồng (YYYY-MM-DD), mặc định hôm nay')
+        parser.add_argument('--group-by', choices=[*GROUP_FIELDS, 'none'], default='faculty',
+                            help='Chỉ xếp sinh viên cùng nhóm ở chung phòng')
+        parser.add_argument('--strict', action='store_true',
+                            help='Không xếp sang tòa nhà / loại phòng khác nguyện vọng')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Số dòng mỗi lần UPDATE / bulk_create')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Chỉ tính kết quả xếp phòng, không ghi dữ liệu')
+
+    def handle(self, *args, **options):
+        start_date = None
+        if options['start_date']:
+            start_date = parse_date(options['start_date'])
+            if start_date is None:
+                raise CommandError('Ngày bắt đầu không hợp lệ, dùng dạng YYYY-MM-DD')
+
+        preferences = None
+        if options['preferences']:
+            with open(options['preferences'], encoding='utf-8-sig', newline='') as file:
+                preferences = read_preferences(file)
+
+        try:
+            result = allocate_rooms(
+                preferences,
+                start_date=start_date,
+                group_by=options['group_by'],
+                strict=options['strict'],
+                dry_run=options['dry_run'],
+                batch_size=options['batch_size'],
+            )
+        except AllocationError as exc:
+            raise CommandError(f'❌ {exc}')
+
+        skipped = result['skipped']
+        self.stdout.write(
+            f'👥 {result["applicants"]} sinh viên chờ xếp • {result["free_beds"]} giường trống • '
+            f'bỏ qua {skipped["has_contract"]} đã có phòng, {skipped["unknown_student"]} mã không tồn tại'
+        )
+        if result['renumbered']:
+            self.stdout.write(
+                f'ℹ️ {result["renumbered"]} sinh viên đã có hợp đồng cùng số trong ngày bắt đầu, số mới có hậu tố -2, -3, ...'
+            )
+        if skipped['unknown_preference']:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {skipped["unknown_preference"]} nguyện vọng có tên tòa nhà / loại phòng không khớp'
+            ))
+        for level, count in result['levels'].items():
+            if count:
+                self.stdout.write(f'   - {LEVEL_LABELS[level]}: {count}')
+        if result['unassigned']:
+            self.stdout.write(self.style.WARNING(f'⚠️ {len(result["unassigned"])} sinh viên chưa có chỗ'))
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'🧪 Chạy thử: sẽ xếp {result["assigned"]} sinh viên vào {result["rooms_used"]} phòng'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Đã tạo {result["contracts_created"]} hợp đồng ở {result["rooms_used"]} phòng'
+            ))
+        self.stdout.write(
+            f'⏱️ {result["elapsed"]:.2f}s (đọc {result["load_seconds"]:.2f}s • '
+            f'xếp {result["plan_seconds"]:.2f}s • ghi {result["write_seconds"]:.2f}s)'
+        )
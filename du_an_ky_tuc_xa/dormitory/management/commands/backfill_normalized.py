@@ -0,0 +1,12 @@
+# dormitory/management/commands/backfill_normalized.py
+from django.core.management.base import BaseCommand
+from dormitory.text import backfill_normalized
+
+class Command(BaseCommand):
+    help = 'Điền lại các cột tìm kiếm bỏ dấu cho tòa nhà, phòng, sinh viên'
+
+    def handle(self, *args, **kwargs):
+        updated = backfill_normalized()
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Đã cập nhật {updated} bản ghi')
+        )
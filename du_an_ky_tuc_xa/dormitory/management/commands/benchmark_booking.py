@@ -0,0 +1,90 @@
+# dormitory/management/commands/benchmark_booking.py
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from accounts.models import CustomUser
+from dormitory.booking import BookingError, book_room
+from dormitory.models import Building, Contract, Room, RoomType, Student
+
+
+class Command(BaseCommand):
+    help = 'Đo số lượt đăng ký phòng mỗi giây khi nhiều luồng cùng đăng ký (trên CSDL tạm, không đụng dữ liệu thật)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=400, help='Số sinh viên đăng ký')
+        parser.add_argument('--rooms', type=int, default=100, help='Số phòng đôi')
+        parser.add_argument('--threads', type=int, default=8, help='Số luồng đăng ký song song')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('❌ Lệnh này chỉ đo trên SQLite')
+        with tempfile.TemporaryDirectory() as tmp:
+            # CSDL file tạm (không dùng CSDL trong bộ nhớ) để khóa giống khi chạy thật
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmp, 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self._run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, options):
+        students, rooms = self._seed(options['students'], options['rooms'])
+        # Mỗi sinh viên thử hai phòng, như khi bấm đăng ký ở hai tab
+        requests = [(student, rooms[(i + offset) % len(rooms)]) for i, student in enumerate(students) for offset in (0, 2)]
+
+        def attempt(args):
+            student, room = args
+            started = time.monotonic()
+            try:
+                book_room(student, room.pk)
+                result = 'booked'
+            except BookingError:
+                result = 'rejected'
+            except OperationalError:
+                result = 'failed'
+            finally:
+                connection.close()
+            return result, time.monotonic() - started
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            results = list(pool.map(attempt, requests))
+        elapsed = time.monotonic() - started
+
+        outcomes = [outcome for outcome, _ in results]
+        latencies = sorted(seconds for _, seconds in results)
+        booked = outcomes.count('booked')
+        self.stdout.write(
+            f'👥 {len(requests)} yêu cầu • {options["threads"]} luồng • {len(rooms) * 2} giường • '
+            f'{booked} đăng ký thành công, {outcomes.count("rejected")} bị từ chối, '
+            f'{outcomes.count("failed")} lỗi khóa sau khi thử lại'
+        )
+        self.stdout.write(
+            f'⏱️ {elapsed:.2f}s • {booked / elapsed:.1f} đăng ký/giây • {len(requests) / elapsed:.1f} yêu cầu/giây • '
+            f'p50 {latencies[len(latencies) // 2] * 1000:.1f}ms • p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms'
+        )
+        if Contract.objects.filter(status='active').count() != booked or Room.objects.filter(free_beds__lt=0).exists():
+            raise CommandError('❌ Hợp đồng / số giường không khớp số lượt đăng ký thành công')
+        self.stdout.write(self.style.SUCCESS('✅ Không có phòng nào bị đặt quá sức chứa'))
+
+    def _seed(self, student_count, room_count):
+        with transaction.atomic():
+            building = Building.objects.create(name='Benchmark', address='-', total_floors=1)
+            room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1000000)
+            rooms = [
+                Room.objects.create(room_number=f'{i:04d}', building=building, room_type=room_type, floor=1)
+                for i in range(room_count)
+            ]
+            students = [
+                Student.objects.create(
+                    user=CustomUser.objects.create_user(username=f'bench{i}', user_type='student'),
+                    student_id=f'BENCH{i:05d}', full_name=f'Sinh viên {i}',
+                )
+                for i in range(student_count)
+            ]
+        return students, rooms
@@ -0,0 +1,25 @@
+# dormitory/management/commands/expire_contracts.py
+from django.core.management.base import BaseCommand
+from dormitory.expiry import expire_contracts
+
+class Command(BaseCommand):
+    help = 'Chuyển hợp đồng đã qua ngày kết thúc sang hết hạn và trả giường cho phòng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Chỉ báo cáo số hợp đồng đến hạn, không ghi dữ liệu')
+
+    def handle(self, *args, **options):
+        result = expire_contracts(dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'🧪 Chạy thử: {result["expired"]} hợp đồng đến hạn ở {result["rooms"]} phòng'
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Đã chuyển {result["expired"]} hợp đồng sang hết hạn • '
+            f'cập nhật {result["rooms"]} phòng • mở lại {result["reopened"]} phòng'
+        ))
+        self.stdout.write(f'⏱️ {result["elapsed"]:.2f}s')
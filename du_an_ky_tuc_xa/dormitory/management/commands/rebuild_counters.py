@@ -0,0 +1,12 @@
+# dormitory/management/commands/rebuild_counters.py
+from django.core.management.base import BaseCommand
+from dormitory.counters import rebuild_counters
+
+class Command(BaseCommand):
+    help = 'Tính lại toàn bộ bộ đếm thống kê từ dữ liệu gốc'
+
+    def handle(self, *args, **kwargs):
+        rows = rebuild_counters()
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Đã tính lại {rows} bộ đếm')
+        )
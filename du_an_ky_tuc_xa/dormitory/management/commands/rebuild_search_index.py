@@ -0,0 +1,17 @@
+# dormitory/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+from dormitory.search import is_available, rebuild_index
+
+class Command(BaseCommand):
+    help = 'Xây lại chỉ mục tìm kiếm sinh viên, hợp đồng, phòng'
+
+    def handle(self, *args, **kwargs):
+        if not is_available():
+            self.stdout.write(
+                self.style.WARNING('⚠️ CSDL không có chỉ mục FTS5, tìm kiếm dùng icontains')
+            )
+            return
+        documents = rebuild_index()
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Đã lập chỉ mục {documents} tài liệu')
+        )
@@ -0,0 +1,34 @@
+# dormitory/management/commands/run_export_jobs.py
+import time
+from django.core.management.base import BaseCommand
+from dormitory.export_jobs import purge_expired, run_pending
+
+class Command(BaseCommand):
+    help = 'Chạy các yêu cầu xuất dữ liệu đang chờ và xóa file đã hết hạn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Số job tối đa mỗi lượt')
+        parser.add_argument('--loop', action='store_true',
+                            help='Chạy liên tục, chờ job mới khi hàng đợi trống')
+        parser.add_argument('--sleep', type=float, default=2,
+                            help='Số giây chờ khi hàng đợi trống (dùng với --loop)')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            purged = purge_expired()
+            if purged:
+                self.stdout.write(f'🗑️ Đã xóa {purged} file xuất hết hạn')
+            ran = run_pending(options['limit'])
+            total += ran
+            if ran:
+                self.stdout.write(f'📦 Đã chạy {ran} job xuất dữ liệu')
+            elif not options['loop']:
+                break
+            else:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Đã chạy {total} job xuất dữ liệu')
+        )
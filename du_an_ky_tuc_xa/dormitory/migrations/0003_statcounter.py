@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_counters(apps, schema_editor):
+    from dormitory.counters import rebuild_counters
+    rebuild_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0002_student_date_of_birth_student_full_name'),
+        ('payment', '0006_payment_overdue_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('value', models.IntegerField(default=0)),
+                ('building', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='dormitory.building')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='statcounter',
+            constraint=models.UniqueConstraint(fields=('name', 'building'), name='unique_counter_per_building'),
+        ),
+        migrations.AddConstraint(
+            model_name='statcounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('building__isnull', True)), fields=('name',), name='unique_global_counter'),
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
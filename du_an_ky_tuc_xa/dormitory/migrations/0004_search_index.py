@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 14:02
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from dormitory.search import create_index, rebuild_index
+    create_index(schema_editor)
+    rebuild_index(apps)
+
+
+def drop_search_index(apps, schema_editor):
+    from dormitory.search import drop_index
+    drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0003_statcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:19
+
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    from dormitory.text import backfill_normalized
+    backfill_normalized(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='building',
+            name='name_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='room_number_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='faculty_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='full_name_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='university_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
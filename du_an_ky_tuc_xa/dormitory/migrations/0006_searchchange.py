@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0005_normalized_search_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('student', 'Sinh viên'), ('room', 'Phòng'), ('building', 'Tòa nhà')], max_length=20)),
+                ('object_id', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
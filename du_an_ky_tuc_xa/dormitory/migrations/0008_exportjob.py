@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dormitory', '0007_room_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_type', models.CharField(max_length=30)),
+                ('format', models.CharField(choices=[('xlsx', 'Excel'), ('csv', 'CSV'), ('ndjson', 'NDJSON')], default='xlsx', max_length=10)),
+                ('filters', models.JSONField(blank=True, default=dict)),
+                ('dedupe_key', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('queued', 'Đang chờ'), ('running', 'Đang chạy'), ('done', 'Hoàn tất'), ('failed', 'Thất bại')], default='queued', max_length=20)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('total_rows', models.IntegerField(blank=True, null=True)),
+                ('file', models.FileField(blank=True, upload_to='exports/jobs/')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='export_job_status_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='exportjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('dedupe_key',), name='unique_active_export_job'),
+        ),
+    ]
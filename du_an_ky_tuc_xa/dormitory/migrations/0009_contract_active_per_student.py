@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:29
+
+import logging
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def terminate_duplicate_contracts(apps, schema_editor):
+    """Dữ liệu cũ có thể có sinh viên với nhiều hợp đồng active (đăng ký trùng):
+    giữ hợp đồng mới nhất, chấm dứt các hợp đồng còn lại rồi tính lại bộ đếm.
+
+    Các hợp đồng bị chấm dứt được ghi log (mã SV, số hợp đồng) để quản lý kiểm tra lại.
+    """
+    Contract = apps.get_model('dormitory', 'Contract')
+    keep, duplicates = set(), []
+    rows = (
+        Contract.objects.filter(status='active').order_by('student_id', '-pk')
+        .values_list('pk', 'student_id', 'student__student_id', 'contract_number')
+    )
+    for pk, student_id, student_code, number in rows:
+        if student_id in keep:
+            duplicates.append(pk)
+            logger.warning("Chấm dứt hợp đồng trùng %s (#%s) của sinh viên %s", number, pk, student_code)
+        keep.add(student_id)
+    if duplicates:
+        Contract.objects.filter(pk__in=duplicates).update(status='terminated')
+        from dormitory.counters import rebuild_counters
+        rebuild_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0008_exportjob'),
+        ('payment', '0006_payment_overdue_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(terminate_duplicate_contracts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='contract',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'active')), fields=('student',), name='unique_active_contract_per_student', violation_error_message='Sinh viên đã có hợp đồng đang hoạt động.'),
+        ),
+    ]
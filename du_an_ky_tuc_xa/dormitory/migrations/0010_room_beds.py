@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:33
+
+from django.db import migrations, models
+
+
+def backfill_beds(apps, schema_editor):
+    """Đếm hợp đồng active của từng phòng; phòng nhiều giường trước đây bị đánh dấu
+    'occupied' sau hợp đồng đầu tiên nay trở lại 'available' nếu còn giường"""
+    from dormitory.counters import rebuild_counters
+    from dormitory.occupancy import recompute_beds
+    Room = apps.get_model('dormitory', 'Room')
+    recompute_beds(apps=apps)
+    Room.objects.filter(status='available', free_beds__lte=0).update(status='occupied')
+    Room.objects.filter(status='occupied', free_beds__gt=0).update(status='available')
+    rebuild_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0009_contract_active_per_student'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='free_beds',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='occupied_beds',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['status', 'free_beds'], name='room_status_free_beds_idx'),
+        ),
+        migrations.RunPython(backfill_beds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0010_room_beds'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['status', 'end_date'], name='contract_status_end_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0012_contract_room_period_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='format',
+            field=models.CharField(choices=[('xlsx', 'Excel'), ('csv', 'CSV'), ('ndjson', 'NDJSON'), ('pdf', 'PDF')], default='xlsx', max_length=10),
+        ),
+    ]
@@ -4,6 +4,8 @@ from accounts.models import CustomUser
 
 class Building(models.Model):
     name = models.CharField(max_length=100)
+    # Tên bỏ dấu, chữ thường để tìm theo tiền tố (điền tự động khi lưu)
+    name_normalized = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
     address = models.TextField()
     total_floors = models.IntegerField()
     description = models.TextField(blank=True)
@@ -23,6 +25,7 @@ class RoomType(models.Model):
 
 class Room(models.Model):
     room_number = models.CharField(max_length=10)
+    room_number_normalized = models.CharField(max_length=10, blank=True, editable=False, db_index=True)
     building = models.ForeignKey(Building, on_delete=models.CASCADE)
     room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE)
     floor = models.IntegerField()
@@ -33,9 +36,19 @@ class Room(models.Model):
     )
     status = models.CharField(max_length=20, choices=status_choices, default='available')
     notes = models.TextField(blank=True)
+    # Số giường đã có hợp đồng active và số giường còn trống (sức chứa - đã thuê),
+    # được cộng trừ bằng F() khi hợp đồng thay đổi thay vì đếm hợp đồng mỗi lần hiển thị
+    occupied_beds = models.PositiveIntegerField(default=0, editable=False)
+    free_beds = models.IntegerField(default=0, editable=False)
+    # Đổi khi phòng, tòa nhà hoặc loại phòng thay đổi - dùng làm dấu vân tay cho file xuất
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ['building', 'room_number']
+        indexes = [
+            # Tìm phòng còn giường: status='available' AND free_beds >= n
+            models.Index(fields=['status', 'free_beds'], name='room_status_free_beds_idx'),
+        ]
     
     def __str__(self):
         return f"{self.building.name} - Phòng {self.room_number}"
@@ -48,6 +61,10 @@ class Student(models.Model):
     course = models.CharField(max_length=50)
     full_name = models.CharField(max_length=100, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
+    # Bản bỏ dấu, chữ thường của full_name, university, faculty (điền tự động khi lưu)
+    full_name_normalized = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
+    university_normalized = models.CharField(max_length=200, blank=True, editable=False, db_index=True)
+    faculty_normalized = models.CharField(max_length=100, blank=True, editable=False, db_index=True)
     def __str__(self):
         return f"{self.student_id} - {self.user.get_full_name()}"
 
@@ -66,5 +83,112 @@ class Contract(models.Model):
     status = models.CharField(max_length=20, choices=status_choices, default='active')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        constraints = [
+            # Mỗi sinh viên chỉ có một hợp đồng đang hoạt động, kể cả khi đăng ký đồng thời
+            models.UniqueConstraint(
+                fields=['student'], condition=models.Q(status='active'),
+                name='unique_active_contract_per_student',
+                violation_error_message='Sinh viên đã có hợp đồng đang hoạt động.',
+            ),
+        ]
+        indexes = [
+            # Quét hợp đồng đến hạn: status='active' AND end_date < hôm nay
+            models.Index(fields=['status', 'end_date'], name='contract_status_end_date_idx'),
+            # Tra cứu phòng trống theo khoảng ngày: hợp đồng của một phòng giao với khoảng
+            models.Index(fields=['room', 'start_date', 'end_date'], name='contract_room_period_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.contract_number} - {self.student}"
+
+class StatCounter(models.Model):
+    """Bộ đếm thống kê được cập nhật dần khi trạng thái phòng, hợp đồng, hóa đơn thay đổi.
+
+    Bộ đếm toàn cục có building rỗng; số phòng theo trạng thái được đếm riêng cho từng tòa nhà.
+    """
+    name = models.CharField(max_length=50)
+    building = models.ForeignKey(Building, on_delete=models.CASCADE, null=True, blank=True)
+    value = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'building'], name='unique_counter_per_building'),
+            models.UniqueConstraint(fields=['name'], condition=models.Q(building__isnull=True), name='unique_global_counter'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+class SearchChange(models.Model):
+    """Nhật ký thay đổi để chỉ mục tự động gợi ý trong bộ nhớ của từng tiến trình cập nhật dần.
+
+    Mỗi tiến trình nhớ id lớn nhất đã đọc và chỉ nạp lại các đối tượng có id thay đổi sau đó.
+    """
+    kind_choices = (
+        ('student', 'Sinh viên'),
+        ('room', 'Phòng'),
+        ('building', 'Tòa nhà'),
+    )
+    kind = models.CharField(max_length=20, choices=kind_choices)
+    object_id = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.kind} #{self.object_id}"
+
+class ExportJob(models.Model):
+    """Yêu cầu xuất dữ liệu chạy nền; các yêu cầu giống nhau đang chờ/chạy được gộp qua dedupe_key"""
+    FORMAT_CHOICES = (
+        ('xlsx', 'Excel'),
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+        ('pdf', 'PDF'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Đang chờ'),
+        ('running', 'Đang chạy'),
+        ('done', 'Hoàn tất'),
+        ('failed', 'Thất bại'),
+    )
+    ACTIVE_STATUSES = ('queued', 'running')
+    
+    export_type = models.CharField(max_length=30)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default='xlsx')
+    filters = models.JSONField(default=dict, blank=True)
+    dedupe_key = models.CharField(max_length=64)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    rows_processed = models.IntegerField(default=0)
+    total_rows = models.IntegerField(null=True, blank=True)
+    file = models.FileField(upload_to='exports/jobs/', blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    
+    class Meta:
+        constraints = [
+            # Chỉ một job đang chờ/chạy cho mỗi tổ hợp loại + định dạng + bộ lọc
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_export_job',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='export_job_status_idx'),
+        ]
+    
+    @property
+    def percent(self):
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, int(self.rows_processed * 100 / self.total_rows))
+    
     def __str__(self):
-        return f"{self.contract_number} - {self.student}"
\ No newline at end of file
+        return f"{self.export_type}.{self.format} #{self.id} ({self.status})"
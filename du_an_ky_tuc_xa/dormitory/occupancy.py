@@ -0,0 +1,73 @@
+# dormitory/occupancy.py
+from django.apps import apps as global_apps
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import counters
+from .models import Room
+
+
+def _set_status(rooms, old, new):
+    """Đổi trạng thái bằng UPDATE có điều kiện theo từng tòa nhà, chuyển bộ đếm đúng số dòng đã đổi"""
+    rooms = rooms.filter(status=old)
+    building_ids = set(rooms.order_by().values_list('building_id', flat=True).distinct())
+    total = 0
+    for building_id in building_ids:
+        moved = rooms.filter(building_id=building_id).update(status=new, updated_at=timezone.now())
+        counters.bump(counters.room_counter(old), -moved, building_id)
+        counters.bump(counters.room_counter(new), moved, building_id)
+        total += moved
+    return total
+
+
+def sync_status(rooms):
+    """Phòng hết giường chuyển 'occupied', phòng 'occupied' còn giường trở lại 'available'.
+
+    Phòng đang bảo trì giữ nguyên trạng thái. Trả về (số phòng vừa đầy, số phòng mở lại).
+    """
+    filled = _set_status(rooms.filter(free_beds__lte=0), 'available', 'occupied')
+    reopened = _set_status(rooms.filter(free_beds__gt=0), 'occupied', 'available')
+    return filled, reopened
+
+
+def occupy(room_id, force=False):
+    """Giữ một giường bằng UPDATE ... SET occupied_beds = occupied_beds + 1.
+
+    Mặc định chỉ giữ khi phòng còn trống (điều kiện nằm trong câu UPDATE nên hai yêu cầu
+    đồng thời không lấy cùng một giường cuối); force=True dùng cho hợp đồng do quản lý tạo.
+    """
+    rooms = Room.objects.filter(pk=room_id)
+    claimable = rooms if force else rooms.filter(status='available', free_beds__gt=0)
+    claimed = claimable.update(
+        occupied_beds=F('occupied_beds') + 1, free_beds=F('free_beds') - 1, updated_at=timezone.now(),
+    )
+    if claimed:
+        sync_status(rooms)
+    return bool(claimed)
+
+
+def release(room_id):
+    """Trả một giường khi hợp đồng chấm dứt, hết hạn hoặc bị xóa"""
+    rooms = Room.objects.filter(pk=room_id)
+    rooms.filter(occupied_beds__gt=0).update(
+        occupied_beds=F('occupied_beds') - 1, free_beds=F('free_beds') + 1, updated_at=timezone.now(),
+    )
+    sync_status(rooms)
+
+
+def recompute_beds(rooms=None, apps=global_apps):
+    """Tính lại số giường từ hợp đồng active trong một câu UPDATE dùng Subquery, trả về số phòng.
+
+    Dùng cho migration và các thao tác hàng loạt đổi trạng thái hợp đồng bằng update().
+    """
+    Room = apps.get_model('dormitory', 'Room')
+    Contract = apps.get_model('dormitory', 'Contract')
+    RoomType = apps.get_model('dormitory', 'RoomType')
+    rooms = Room.objects.all() if rooms is None else rooms
+    active = Coalesce(Subquery(
+        Contract.objects.filter(room=OuterRef('pk'), status='active')
+        .order_by().values('room').annotate(n=Count('pk')).values('n')
+    ), Value(0))
+    capacity = Subquery(RoomType.objects.filter(pk=OuterRef('room_type_id')).values('capacity'))
+    return rooms.update(occupied_beds=active, free_beds=capacity - active, updated_at=timezone.now())
@@ -0,0 +1,191 @@
+# dormitory/pagination.py
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+PER_PAGE = 10
+# Tập kết quả nhỏ hơn ngưỡng này vẫn dùng số trang như cũ
+SMALL_RESULT_LIMIT = 1000
+
+
+def encode_cursor(values):
+    """Mã hóa giá trị khóa sắp xếp thành chuỗi cursor dùng trên URL"""
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Giải mã cursor; trả về None nếu cursor hỏng"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class CursorPage:
+    """Một trang của CursorPaginator, dùng được như Page của Django trong template"""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous, count_label):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.count_label = count_label
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.cursor_for(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.cursor_for(self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """Phân trang theo khóa (keyset) thay cho OFFSET.
+
+    ordering là các trường có index, luôn kết thúc bằng khóa chính để thứ tự là duy nhất.
+    Mỗi trang chỉ đọc per_page + 1 dòng ngay sau (hoặc trước) cursor, nên thời gian không
+    phụ thuộc trang sâu đến đâu và không cần COUNT(*).
+    """
+
+    def __init__(self, queryset, per_page=PER_PAGE, ordering=('pk',)):
+        ordering = list(ordering)
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        self.queryset = queryset
+        self.per_page = per_page
+        self.fields = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    def cursor_for(self, obj):
+        values = []
+        for name, _ in self.fields:
+            value = obj
+            for part in name.split('__'):
+                value = getattr(value, part)
+            values.append(value)
+        return encode_cursor(values)
+
+    def _field(self, name):
+        """Trường (hoặc output_field của annotation) ứng với một khóa sắp xếp"""
+        query = self.queryset.query
+        if name in query.annotations:
+            return query.annotations[name].output_field
+        model = self.queryset.model
+        *path, last = name.split('__')
+        for part in path:
+            model = model._meta.get_field(part).related_model
+        return model._meta.pk if last == 'pk' else model._meta.get_field(last)
+
+    def coerce(self, values):
+        """Đổi giá trị trong cursor về kiểu của từng khóa sắp xếp.
+
+        decode_cursor chỉ kiểm tra cấu trúc; cursor bị sửa tay (["x", "y"] cho khóa số) báo
+        ValidationError ở đây thay vì lọt xuống ORM thành lỗi 500.
+        """
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise ValidationError('Cursor không khớp thứ tự sắp xếp')
+        return [
+            None if value is None else self._field(name).to_python(value)
+            for (name, _), value in zip(self.fields, values)
+        ]
+
+    def order_by(self, reverse=False):
+        return [
+            name if descending == reverse else f'-{name}'
+            for name, descending in self.fields
+        ]
+
+    def _seek(self, values, reverse=False):
+        """Điều kiện (a, b, c) > (x, y, z) viết dạng OR để dùng được index trên mọi CSDL"""
+        condition = Q()
+        for i, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for j in range(i):
+                step &= Q(**{self.fields[j][0]: values[j]})
+            condition |= step
+        return condition
+
+    def page(self, after=None, before=None, count_label=None):
+        cursor = decode_cursor(before or after or '')
+        queryset = None
+        if cursor is not None:
+            reverse = bool(before)
+            try:
+                queryset = self.queryset.order_by(*self.order_by(reverse)).filter(
+                    self._seek(self.coerce(cursor), reverse)
+                )
+            except (ValidationError, ValueError, TypeError):
+                # Cursor hỏng: về trang đầu
+                cursor = None
+        if cursor is None:
+            reverse = False
+            queryset = self.queryset.order_by(*self.order_by())
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if reverse:
+            rows.reverse()
+            return CursorPage(rows, self, has_next=True, has_previous=has_more, count_label=count_label)
+        return CursorPage(rows, self, has_next=has_more, has_previous=cursor is not None, count_label=count_label)
+
+
+def paginate(request, queryset, per_page=PER_PAGE, ordering=('pk',)):
+    """Chọn cách phân trang cho danh sách.
+
+    Chỉ đếm tối đa SMALL_RESULT_LIMIT + 1 dòng: tập nhỏ giữ phân trang theo số trang
+    (?page=), tập lớn chuyển sang cursor (?after= / ?before=) và bỏ qua số đếm chính xác.
+    """
+    paginator = CursorPaginator(queryset, per_page, ordering)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    count = queryset.order_by()[:SMALL_RESULT_LIMIT + 1].count()
+
+    if count > SMALL_RESULT_LIMIT or after or before:
+        count_label = f'{SMALL_RESULT_LIMIT}+' if count > SMALL_RESULT_LIMIT else count
+        return paginator.page(after=after, before=before, count_label=count_label)
+
+    numbered = Paginator(queryset.order_by(*paginator.order_by()), per_page)
+    # Đã có số đếm, không để Paginator chạy lại COUNT(*)
+    numbered.count = count
+    page = numbered.get_page(request.GET.get('page'))
+    page.is_cursor = False
+    page.count_label = count
+    return page
+
+
+def page_query(request):
+    """Tham số lọc hiện tại (bỏ tham số phân trang) để nối vào link chuyển trang"""
+    params = request.GET.copy()
+    for key in ('page', 'after', 'before'):
+        params.pop(key, None)
+    return params.urlencode()
@@ -0,0 +1,44 @@
+# dormitory/pdf_export.py
+from django.utils import timezone
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+# Các cột của dataset ROOMS được in ra PDF: key, tiêu đề, vị trí x
+PDF_COLUMNS = (
+    ('room_number', "Mã phòng", 50),
+    ('building', "Tòa nhà", 120),
+    ('room_type', "Loại phòng", 200),
+    ('floor', "Tầng", 300),
+    ('status', "Trạng thái", 350),
+)
+
+
+def _draw_header(p, y):
+    p.setFont("Helvetica-Bold", 10)
+    for _, header, x in PDF_COLUMNS:
+        p.drawString(x, y, header)
+    p.setFont("Helvetica", 9)
+
+
+def write_rooms_pdf(dataset, rows, output):
+    """Vẽ các dòng (đã định dạng) của dataset phòng vào file output, mỗi lần một dòng"""
+    p = canvas.Canvas(output, pagesize=letter)
+
+    # Tiêu đề
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(100, 750, "DANH SÁCH PHÒNG - KÝ TÚC XÁ")
+    p.setFont("Helvetica", 10)
+    p.drawString(100, 730, f"Ngày xuất: {timezone.localtime().strftime('%d/%m/%Y %H:%M')}")
+    _draw_header(p, 700)
+
+    positions = [dataset.keys.index(key) for key, _, _ in PDF_COLUMNS]
+    y = 680
+    for row in rows:
+        if y < 100:  # Tạo trang mới nếu hết chỗ
+            p.showPage()
+            _draw_header(p, 750)
+            y = 730
+        for (_, _, x), i in zip(PDF_COLUMNS, positions):
+            p.drawString(x, y, str(row[i]))
+        y -= 20
+    p.save()
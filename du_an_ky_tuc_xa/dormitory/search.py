@@ -0,0 +1,193 @@
+# dormitory/search.py
+from django.apps import apps as global_apps
+from django.db import OperationalError, connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .text import normalize, prefix_filter
+
+SEARCH_TABLE = 'dormitory_search'
+INDEX_BATCH_SIZE = 500
+
+# Mỗi loại tài liệu: model và các trường được gộp vào nội dung tìm kiếm
+DOCUMENTS = {
+    'student': ('Student', (
+        'student_id', 'full_name', 'user__username', 'university', 'faculty',
+    )),
+    'contract': ('Contract', (
+        'contract_number', 'student__student_id', 'student__full_name',
+        'room__room_number', 'room__building__name',
+    )),
+    'room': ('Room', (
+        'room_number', 'building__name', 'room_type__name',
+    )),
+}
+
+# Trường tìm icontains (dự phòng) và trường chuẩn hóa tìm theo tiền tố của từng danh sách
+LIST_SEARCH_FIELDS = {
+    'room': (
+        ('room_number', 'building__name', 'room_type__name'),
+        ('room_number_normalized', 'building__name_normalized'),
+    ),
+    'student': (
+        ('student_id', 'full_name', 'user__username', 'university', 'faculty'),
+        ('full_name_normalized', 'university_normalized', 'faculty_normalized'),
+    ),
+    'contract': (
+        ('contract_number', 'student__student_id', 'student__full_name', 'room__room_number', 'room__building__name'),
+        ('student__full_name_normalized', 'room__room_number_normalized', 'room__building__name_normalized'),
+    ),
+}
+
+_available = {}
+
+
+def create_index(schema_editor):
+    """Tạo bảng FTS5; CSDL không có FTS5 thì bỏ qua và tìm kiếm quay về icontains.
+
+    Với PostgreSQL có thể thay bằng một cột tsvector có GIN index theo cùng giao diện.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, body, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    except OperationalError:
+        # SQLite được biên dịch không kèm FTS5
+        pass
+    _available.clear()
+
+
+def drop_index(schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    _available.clear()
+
+
+def is_available():
+    """Chỉ mục có dùng được trên kết nối hiện tại không (kiểm tra một lần mỗi CSDL)"""
+    key = (connection.alias, connection.settings_dict['NAME'])
+    if key not in _available:
+        _available[key] = (
+            connection.vendor == 'sqlite'
+            and SEARCH_TABLE in connection.introspection.table_names()
+        )
+    return _available[key]
+
+
+def _documents(kind, ids=None, apps=global_apps):
+    model_name, fields = DOCUMENTS[kind]
+    queryset = apps.get_model('dormitory', model_name).objects.order_by()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    for row in queryset.values_list('pk', *fields).iterator(chunk_size=INDEX_BATCH_SIZE):
+        # unicode61 bỏ dấu được nhưng không coi 'đ' là 'd' nên chuẩn hóa trước khi ghi
+        yield row[0], normalize(' '.join(str(value) for value in row[1:] if value))
+
+
+def _write(cursor, kind, rows):
+    """Ghi tài liệu theo lô để không giữ cả bảng trong bộ nhớ, trả về số tài liệu"""
+    sql = f'INSERT INTO {SEARCH_TABLE} (kind, object_id, body) VALUES (%s, %s, %s)'
+    batch, total = [], 0
+    for pk, body in rows:
+        batch.append((kind, pk, body))
+        if len(batch) >= INDEX_BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        total += len(batch)
+    return total
+
+
+def remove_objects(kind, ids):
+    """Xóa tài liệu khỏi chỉ mục"""
+    ids = list(ids)
+    if not ids or not is_available():
+        return
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), INDEX_BATCH_SIZE):
+            batch = ids[start:start + INDEX_BATCH_SIZE]
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE kind = %s AND object_id IN ({', '.join(['%s'] * len(batch))})",
+                [kind, *batch],
+            )
+
+
+def index_objects(kind, ids):
+    """Ghi lại tài liệu của các đối tượng sau khi chúng (hoặc bản ghi liên quan) thay đổi"""
+    ids = list(ids)
+    if not ids or not is_available():
+        return
+    remove_objects(kind, ids)
+    with connection.cursor() as cursor:
+        _write(cursor, kind, _documents(kind, ids))
+
+
+def rebuild_index(apps=global_apps):
+    """Xây lại toàn bộ chỉ mục từ dữ liệu gốc, trả về số tài liệu"""
+    if not is_available():
+        return 0
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        for kind in DOCUMENTS:
+            total += _write(cursor, kind, _documents(kind, apps=apps))
+    return total
+
+
+def fts_query(text):
+    """Mỗi từ khóa thành một cụm tìm theo tiền tố: nguyen van -> "nguyen"* "van"*"""
+    terms = normalize(text).split()
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def ranked(queryset, kind, text):
+    """Lọc theo chỉ mục full-text và gắn search_rank (bm25, nhỏ hơn là khớp hơn).
+
+    JOIN với bảng FTS5 (không LIMIT) nên trả về mọi dòng khớp; MATCH chạy một lần cho cả
+    truy vấn và mỗi tài liệu khớp tra đối tượng theo khóa chính. search_rank là annotation
+    nên sắp xếp và lọc theo cursor được. Trả về None khi không có chỉ mục hoặc từ khóa rỗng.
+    """
+    query = fts_query(text)
+    if not query or not is_available():
+        return None
+    meta = queryset.model._meta
+    column = f'{connection.ops.quote_name(meta.db_table)}.{connection.ops.quote_name(meta.pk.column)}'
+    return queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[f'{SEARCH_TABLE} MATCH %s', f'{SEARCH_TABLE}.kind = %s', f'{SEARCH_TABLE}.object_id = {column}'],
+        params=[query, kind],
+    ).annotate(search_rank=RawSQL(f'{SEARCH_TABLE}.rank', [], output_field=FloatField()))
+
+
+def search(queryset, kind, text, fallback, prefix_fields=()):
+    """Lọc queryset theo từ khóa, gắn search_rank để sắp xếp (nhỏ hơn là khớp hơn).
+
+    Thứ tự thử: chỉ mục full-text, tiền tố trên các cột chuẩn hóa (có index), rồi mới
+    đến điều kiện fallback (các icontains cũ) cho từ khóa là một đoạn giữa mã số; hai
+    cách sau không có điểm nên search_rank bằng 0. Danh sách và các bản export dùng hàm
+    này nên trả về mọi dòng khớp.
+    """
+    matched = ranked(queryset, kind, text)
+    if matched is not None and matched.exists():
+        return matched
+    unranked = Value(0.0, output_field=FloatField())
+    if prefix_fields:
+        prefixed = queryset.filter(prefix_filter(prefix_fields, text))
+        if prefixed.exists():
+            return prefixed.annotate(search_rank=unranked)
+    return queryset.filter(fallback).annotate(search_rank=unranked)
+
+
+def search_list(queryset, kind, text):
+    """Bộ lọc ô tìm kiếm của danh sách phòng / sinh viên / hợp đồng (dùng chung cho các export)"""
+    contains_fields, prefix_fields = LIST_SEARCH_FIELDS[kind]
+    fallback = Q()
+    for field in contains_fields:
+        fallback |= Q(**{f'{field}__icontains': text})
+    return search(queryset, kind, text, fallback, prefix_fields)
@@ -0,0 +1,114 @@
+# dormitory/services.py
+import hashlib
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import counters
+from .models import Building, Contract, Room
+
+
+def get_overview_stats(today=None):
+    """Thống kê tổng quan cho home, dashboard và reports.
+
+    Số liệu đọc từ bảng bộ đếm StatCounter; chỉ số hợp đồng sắp hết hạn (phụ thuộc ngày)
+    là cần một truy vấn đếm riêng.
+    """
+    today = today or timezone.now().date()
+    values = counters.read_counters()
+
+    def total(name):
+        return counters.total(values, name)
+
+    rooms = {
+        'available': total(counters.room_counter('available')),
+        'occupied': total(counters.room_counter('occupied')),
+        'maintenance': total(counters.room_counter('maintenance')),
+    }
+    rooms['total'] = sum(rooms.values())
+
+    # Tính tỷ lệ lấp đầy
+    if rooms['total'] > 0:
+        rooms['occupancy_percentage'] = (rooms['occupied'] / rooms['total']) * 100
+    else:
+        rooms['occupancy_percentage'] = 0
+
+    contracts = {
+        'active': total(counters.contract_counter('active')),
+        'expired': total(counters.contract_counter('expired')),
+        # Hợp đồng sắp hết hạn (trong 30 ngày tới)
+        'upcoming_expiry': Contract.objects.filter(
+            status='active',
+            end_date__lte=today + timedelta(days=30)
+        ).count(),
+    }
+    # Hóa đơn quá hạn là hóa đơn đã được check_overdue_payments chuyển sang 'overdue'
+    overdue = total(counters.payment_counter('overdue'))
+    payments = {
+        'pending': total(counters.payment_counter('pending')) + overdue,
+        'overdue': overdue,
+    }
+
+    return {
+        'rooms': rooms,
+        'contracts': contracts,
+        'payments': payments,
+        'total_buildings': total('buildings'),
+        'total_students': total('students'),
+    }
+
+
+def building_statistics(today=None):
+    """Thống kê theo tòa nhà trong một truy vấn GROUP BY.
+
+    Mỗi dòng gồm số phòng theo trạng thái, sức chứa (tổng RoomType.capacity) và
+    doanh thu dự kiến hàng tháng: giá thuê tính một lần cho mỗi hợp đồng còn hiệu lực,
+    giống cách generate_monthly_bills lập hóa đơn (phòng nhiều giường có nhiều hợp đồng).
+    """
+    today = today or timezone.now().date()
+    # Subquery riêng để JOIN hợp đồng không nhân số dòng của các Count theo phòng
+    revenue = Subquery(
+        Contract.objects.filter(room__building=OuterRef('pk'), status='active', end_date__gte=today)
+        .order_by().values('room__building').annotate(total=Sum('room__room_type__price_per_month'))
+        .values('total'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+    buildings = Building.objects.annotate(
+        total_rooms=Count('room'),
+        available_rooms=Count('room', filter=Q(room__status='available')),
+        occupied_rooms=Count('room', filter=Q(room__status='occupied')),
+        maintenance_rooms=Count('room', filter=Q(room__status='maintenance')),
+        capacity=Coalesce(Sum('room__room_type__capacity'), Value(0), output_field=IntegerField()),
+        expected_revenue=Coalesce(
+            revenue,
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+    ).order_by('name').values(
+        'id', 'name', 'total_rooms', 'available_rooms', 'occupied_rooms', 'maintenance_rooms',
+        'capacity', 'expected_revenue',
+    )
+
+    stats = []
+    for building in buildings:
+        # Tính tỷ lệ lấp đầy cho từng tòa nhà
+        if building['total_rooms'] > 0:
+            building['occupancy_rate'] = (building['occupied_rooms'] / building['total_rooms']) * 100
+        else:
+            building['occupancy_rate'] = 0
+        stats.append(building)
+    return stats
+
+
+def rooms_fingerprint():
+    """Dấu vân tay dữ liệu phòng: số dòng + updated_at lớn nhất (một truy vấn aggregate).
+
+    Sửa, thêm, xóa phòng, hay đổi tên tòa nhà / loại phòng (signal chạm updated_at của
+    các phòng liên quan) đều làm dấu vân tay thay đổi.
+    """
+    stats = Room.objects.aggregate(count=Count('id'), latest=Max('updated_at'))
+    latest = stats['latest'].isoformat() if stats['latest'] else ''
+    return hashlib.sha1(f"{stats['count']}:{latest}".encode()).hexdigest()[:16]
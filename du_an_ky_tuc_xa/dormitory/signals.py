@@ -0,0 +1,185 @@
+# dormitory/signals.py
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, counters, occupancy, search
+from .text import fill_normalized
+from .models import Building, Contract, Room, RoomType, Student
+
+
+def remember_state(sender, instance, fields):
+    """Lưu giá trị cũ trong DB trước khi ghi, để post_save biết trạng thái đã đổi hay chưa"""
+    if instance.pk is None:
+        instance._old_state = None
+    else:
+        instance._old_state = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(pre_save, sender=Building)
+@receiver(pre_save, sender=Room)
+@receiver(pre_save, sender=Student)
+def normalize_search_fields(sender, instance, **kwargs):
+    fill_normalized(instance)
+
+
+@receiver(post_save, sender=Building)
+def building_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump('buildings', 1)
+
+
+@receiver(post_delete, sender=Building)
+def building_deleted(sender, instance, **kwargs):
+    counters.bump('buildings', -1)
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump('students', 1)
+
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    counters.bump('students', -1)
+
+
+@receiver(pre_save, sender=Room)
+def room_before_save(sender, instance, **kwargs):
+    remember_state(sender, instance, ('building_id', 'status', 'occupied_beds'))
+    # Số giường đã thuê chỉ đổi qua occupancy; lấy giá trị trong DB để form sửa phòng
+    # không ghi đè bằng bản cũ, và tính lại giường trống theo loại phòng (có thể vừa đổi)
+    if instance._old_state is not None:
+        instance.occupied_beds = instance._old_state[2]
+    instance.free_beds = instance.room_type.capacity - instance.occupied_beds
+
+
+@receiver(post_save, sender=Room)
+def room_saved(sender, instance, **kwargs):
+    new_name = counters.room_counter(instance.status)
+    if instance._old_state is None:
+        counters.bump(new_name, 1, instance.building_id)
+    else:
+        old_building_id, old_status, _ = instance._old_state
+        counters.move(counters.room_counter(old_status), new_name, old_building_id, instance.building_id)
+
+
+@receiver(post_delete, sender=Room)
+def room_deleted(sender, instance, **kwargs):
+    counters.bump(counters.room_counter(instance.status), -1, instance.building_id)
+
+
+@receiver(pre_save, sender=Contract)
+def contract_before_save(sender, instance, **kwargs):
+    remember_state(sender, instance, ('status', 'room_id'))
+
+
+@receiver(post_save, sender=Contract)
+def contract_saved(sender, instance, **kwargs):
+    new_name = counters.contract_counter(instance.status)
+    if instance._old_state is None:
+        counters.bump(new_name, 1)
+    else:
+        counters.move(counters.contract_counter(instance._old_state[0]), new_name)
+
+
+@receiver(post_save, sender=Contract)
+def contract_beds(sender, instance, **kwargs):
+    """Trả giường khi hợp đồng hết hiệu lực hoặc chuyển phòng, giữ giường khi hợp đồng active mới"""
+    old_status, old_room_id = instance._old_state or (None, None)
+    was_active = old_status == 'active'
+    is_active = instance.status == 'active'
+    if was_active and (not is_active or old_room_id != instance.room_id):
+        occupancy.release(old_room_id)
+    # book_room đã giữ giường bằng UPDATE có điều kiện trước khi tạo hợp đồng
+    if is_active and (not was_active or old_room_id != instance.room_id) and not getattr(instance, '_bed_claimed', False):
+        occupancy.occupy(instance.room_id, force=True)
+
+
+@receiver(post_save, sender=Contract)
+@receiver(post_delete, sender=Contract)
+def contracts_changed(sender, instance, **kwargs):
+    counters.bump(counters.CONTRACTS_VERSION, 1)
+
+
+@receiver(post_delete, sender=Contract)
+def contract_deleted(sender, instance, origin=None, **kwargs):
+    counters.bump(counters.contract_counter(instance.status), -1)
+    # Xóa dây chuyền từ phòng / tòa nhà / loại phòng thì phòng cũng bị xóa, không cần trả giường
+    origin_model = getattr(origin, 'model', type(origin))
+    if instance.status == 'active' and origin_model not in (Room, Building, RoomType):
+        occupancy.release(instance.room_id)
+
+# Đồng bộ chỉ mục tìm kiếm: tài liệu gộp cả tên tòa nhà, loại phòng, sinh viên
+# nên khi các bản ghi này đổi thì tài liệu liên quan cũng được ghi lại.
+
+@receiver(post_save, sender=Student)
+def index_student(sender, instance, created, **kwargs):
+    search.index_objects('student', [instance.pk])
+    if not created:
+        search.index_objects('contract', Contract.objects.filter(student=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Room)
+def index_room(sender, instance, created, **kwargs):
+    search.index_objects('room', [instance.pk])
+    if not created:
+        search.index_objects('contract', Contract.objects.filter(room=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Building)
+def index_building(sender, instance, created, **kwargs):
+    if not created:
+        search.index_objects('room', Room.objects.filter(building=instance).values_list('pk', flat=True))
+        search.index_objects('contract', Contract.objects.filter(room__building=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=RoomType)
+def index_room_type(sender, instance, created, **kwargs):
+    if not created:
+        search.index_objects('room', Room.objects.filter(room_type=instance).values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Contract)
+def index_contract(sender, instance, **kwargs):
+    search.index_objects('contract', [instance.pk])
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=Contract)
+def unindex_object(sender, instance, **kwargs):
+    search.remove_objects(sender._meta.model_name, [instance.pk])
+
+
+# Ghi nhật ký thay đổi cho chỉ mục gợi ý trong bộ nhớ của các tiến trình
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=Building)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Room)
+def record_autocomplete_change(sender, instance, **kwargs):
+    autocomplete.record_change(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=RoomType)
+def room_type_capacity(sender, instance, created, **kwargs):
+    """Sức chứa thay đổi thì tính lại giường trống của các phòng thuộc loại này"""
+    if not created:
+        rooms = Room.objects.filter(room_type=instance)
+        rooms.exclude(free_beds=instance.capacity - F('occupied_beds')).update(
+            free_beds=instance.capacity - F('occupied_beds'),
+        )
+        occupancy.sync_status(rooms)
+
+
+@receiver(post_save, sender=Building)
+@receiver(post_save, sender=RoomType)
+def touch_rooms(sender, instance, created, **kwargs):
+    """Tên tòa nhà / loại phòng nằm trong file xuất phòng nên đổi dấu vân tay của các phòng đó"""
+    if not created:
+        field = 'building' if sender is Building else 'room_type'
+        Room.objects.filter(**{field: instance}).update(updated_at=timezone.now())
@@ -1,3 +1,1066 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from accounts.models import CustomUser
+from payment.models import Payment
+from .models import Building, Contract, ExportJob, Room, RoomType, SearchChange, Student
+from .counters import read_counters, rebuild_counters
+from .pagination import CursorPaginator, encode_cursor, paginate
+from . import autocomplete, export_jobs, forecast, occupancy, search
+from .allocation import allocate_rooms, read_preferences
+from .availability import available_rooms
+from .booking import BookingError, book_room
+from .expiry import expire_contracts
+from .text import backfill_normalized, normalize, prefix_filter
+from .services import building_statistics, get_overview_stats, rooms_fingerprint
+
+
+class OverviewStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        rooms = [
+            Room.objects.create(room_number=str(100 + i), building=building, room_type=room_type, floor=1, status=status)
+            for i, status in enumerate(['available', 'available', 'occupied', 'maintenance'])
+        ]
+        for i in range(3):
+            user = CustomUser.objects.create_user(username=f'sv{i}', password='x')
+            student = Student.objects.create(user=user, student_id=f'SV{i}')
+            contract = Contract.objects.create(
+                contract_number=f'CT{i}', student=student, room=rooms[2],
+                start_date=today - timedelta(days=300), end_date=today + timedelta(days=10 + 100 * i),
+                deposit=0, status='expired' if i == 2 else 'active',
+            )
+            Payment.objects.create(
+                contract=contract, amount=1, due_date=today - timedelta(days=i),
+                status='overdue' if i else 'pending',
+            )
+
+    def test_stats_values(self):
+        stats = get_overview_stats()
+
+        self.assertEqual(stats['rooms'], {
+            'total': 4, 'available': 2, 'occupied': 1, 'maintenance': 1, 'occupancy_percentage': 25.0,
+        })
+        self.assertEqual(stats['contracts'], {'active': 2, 'expired': 1, 'upcoming_expiry': 1})
+        self.assertEqual(stats['payments'], {'pending': 3, 'overdue': 2})
+        self.assertEqual((stats['total_buildings'], stats['total_students']), (1, 3))
+
+    def test_query_count_is_pinned(self):
+        with self.assertNumQueries(2):
+            get_overview_stats()
+
+    def test_pages_use_aggregated_stats(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse('home'))
+        # Thống kê + 2 danh sách thông báo thanh toán
+        with self.assertNumQueries(4):
+            self.client.get(reverse('dashboard'))
+        # Thống kê + một truy vấn GROUP BY theo tòa nhà
+        with self.assertNumQueries(3):
+            self.client.get(reverse('reports'))
+
+    def test_building_statistics_rollup(self):
+        Building.objects.create(name='B2', address='Hà Nội', total_floors=3)
+
+        with self.assertNumQueries(1):
+            stats = building_statistics()
+
+        self.assertEqual([row['name'] for row in stats], ['A1', 'B2'])
+        a1, b2 = stats
+        self.assertEqual(
+            (a1['total_rooms'], a1['available_rooms'], a1['occupied_rooms'], a1['maintenance_rooms']),
+            (4, 2, 1, 1),
+        )
+        self.assertEqual(a1['capacity'], 8)
+        # Hai hợp đồng active ở phòng 102, mỗi hợp đồng một lần giá thuê
+        self.assertEqual(a1['expected_revenue'], 3000000)
+        self.assertEqual(a1['occupancy_rate'], 25.0)
+        self.assertEqual((b2['total_rooms'], b2['capacity'], b2['expected_revenue']), (0, 0, 0))
+
+
+    def test_counters_follow_status_changes_and_match_rebuild(self):
+        room = Room.objects.get(room_number='100')
+        room.status = 'maintenance'
+        room.save()
+        contract = Contract.objects.get(contract_number='CT0')
+        contract.status = 'terminated'
+        contract.save()
+        Payment.objects.filter(contract=contract).delete()
+        Building.objects.create(name='B2', address='Hà Nội', total_floors=3)
+
+        stats = get_overview_stats()
+        # Phòng 102 (2 giường) được trả một giường nên trở lại còn trống
+        self.assertEqual(stats['rooms']['available'], 2)
+        self.assertEqual(stats['rooms']['occupied'], 0)
+        self.assertEqual(stats['rooms']['maintenance'], 2)
+        self.assertEqual(stats['contracts']['active'], 1)
+        self.assertEqual(stats['payments']['pending'], 2)
+        self.assertEqual(stats['total_buildings'], 2)
+
+        incremental = {key: value for key, value in read_counters().items() if value}
+        rebuild_counters()
+        self.assertEqual(incremental, read_counters())
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        other = Building.objects.create(name='B2', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        for i in range(13):
+            Room.objects.create(room_number=f'{i % 7:03}', building=building if i < 7 else other,
+                                room_type=room_type, floor=1)
+
+    def walk(self, paginator, direction='after'):
+        """Đi hết các trang theo cursor, trả về danh sách pk theo thứ tự hiển thị"""
+        page = paginator.page()
+        pages = [[room.pk for room in page]]
+        while page.has_next():
+            page = paginator.page(after=page.next_cursor)
+            pages.append([room.pk for room in page])
+        if direction == 'before':
+            pages = [pages[-1]]
+            while page.has_previous():
+                page = paginator.page(before=page.previous_cursor)
+                pages.insert(0, [room.pk for room in page])
+        return [pk for rows in pages for pk in rows]
+
+    def test_cursor_walk_matches_ordering(self):
+        expected = list(Room.objects.order_by('building_id', 'room_number', 'pk').values_list('pk', flat=True))
+        paginator = CursorPaginator(Room.objects.all(), 5, ordering=('building_id', 'room_number'))
+
+        self.assertEqual(self.walk(paginator), expected)
+        self.assertEqual(self.walk(paginator, 'before'), expected)
+
+    def test_descending_ordering(self):
+        expected = list(Room.objects.order_by('-pk').values_list('pk', flat=True))
+        paginator = CursorPaginator(Room.objects.all(), 4, ordering=('-pk',))
+
+        self.assertEqual(self.walk(paginator), expected)
+
+    def test_small_sets_keep_page_numbers(self):
+        request = RequestFactory().get('/rooms/', {'page': 2})
+        page = paginate(request, Room.objects.all(), 5)
+
+        self.assertFalse(page.is_cursor)
+        self.assertEqual((page.number, page.count_label, page.paginator.num_pages), (2, 13, 3))
+
+    def test_large_sets_switch_to_cursor_without_exact_count(self):
+        request = RequestFactory().get('/rooms/')
+        with mock.patch('dormitory.pagination.SMALL_RESULT_LIMIT', 10):
+            # Một truy vấn đếm có LIMIT + một truy vấn lấy trang
+            with self.assertNumQueries(2):
+                page = paginate(request, Room.objects.all(), 5)
+                rows = list(page)
+
+        self.assertTrue(page.is_cursor)
+        self.assertEqual(page.count_label, '10+')
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(page.has_next())
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        paginator = CursorPaginator(Room.objects.all(), 5)
+
+        page = paginator.page(after='khong-hop-le')
+
+        self.assertEqual([room.pk for room in page], list(Room.objects.order_by('pk').values_list('pk', flat=True)[:5]))
+
+    def test_tampered_cursor_values_fall_back_to_first_page(self):
+        paginator = CursorPaginator(Room.objects.all(), 5, ordering=('building_id', 'room_number'))
+        first = [room.pk for room in paginator.page()]
+
+        for values in (['x', 'y', 'z'], [{'a': 1}, '001', 1], [1, '001']):
+            page = paginator.page(after=encode_cursor(values))
+            self.assertEqual([room.pk for room in page], first)
+            self.assertFalse(page.has_previous())
+        # Giá trị số gửi dạng chuỗi vẫn được đổi đúng kiểu
+        room = Room.objects.get(pk=first[0])
+        page = paginator.page(after=encode_cursor([str(room.building_id), room.room_number, str(room.pk)]))
+        self.assertEqual(list(page), list(paginator.page(after=paginator.cursor_for(room))))
+
+        with mock.patch('dormitory.pagination.SMALL_RESULT_LIMIT', 1):
+            response = self.client.get(reverse('student_list'), {'after': encode_cursor(['x', 'y'])})
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_views_render_cursor_links(self):
+        with mock.patch('dormitory.pagination.SMALL_RESULT_LIMIT', 10):
+            response = self.client.get(reverse('room_list'), {'search': '003'})
+            self.assertFalse(response.context['page_obj'].is_cursor)
+            self.assertEqual(response.context['page_obj'].count_label, 2)
+
+            response = self.client.get(reverse('room_list'))
+            page = response.context['page_obj']
+            self.assertContains(response, f'?after={page.next_cursor}')
+
+            response = self.client.get(reverse('room_list'), {'after': page.next_cursor})
+            self.assertContains(response, '?before=')
+            self.assertEqual(len(response.context['page_obj']), 3)
+            self.assertNotContains(response, '?after=')
+
+        for name in ('building_list', 'student_list', 'contract_list'):
+            self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        cls.building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        cls.room = Room.objects.create(room_number='101', building=cls.building, room_type=room_type, floor=1)
+        names = ['Nguyễn Văn Đức', 'Trần Thị Nguyên', 'Lê Văn Bình']
+        cls.students = []
+        for i, name in enumerate(names):
+            user = CustomUser.objects.create_user(username=f'sv{i}', password='x')
+            student = Student.objects.create(user=user, student_id=f'SV00{i}', full_name=name,
+                                             university='Bách Khoa', faculty='CNTT')
+            cls.students.append(student)
+        cls.contract = Contract.objects.create(
+            contract_number='CT001', student=cls.students[0], room=cls.room,
+            start_date=today, end_date=today + timedelta(days=180), deposit=0,
+        )
+
+    def match(self, kind, text):
+        """id khớp trong chỉ mục, xếp theo bm25"""
+        model = {'student': Student, 'contract': Contract, 'room': Room}[kind]
+        ranked = search.ranked(model.objects.all(), kind, text)
+        return list(ranked.order_by('search_rank', 'pk').values_list('pk', flat=True))
+
+    def test_index_is_available(self):
+        self.assertTrue(search.is_available())
+
+    def test_accent_insensitive_prefix_match(self):
+        self.assertEqual(self.match('student', 'nguyen duc'), [self.students[0].pk])
+        self.assertEqual(set(self.match('student', 'nguy')), {self.students[0].pk, self.students[1].pk})
+        self.assertEqual(self.match('contract', 'duc a1'), [self.contract.pk])
+
+    def test_index_follows_related_changes(self):
+        self.building.name = 'Tòa B'
+        self.building.save()
+        self.assertEqual(self.match('room', 'toa b'), [self.room.pk])
+        self.assertEqual(self.match('contract', 'toa'), [self.contract.pk])
+
+        self.contract.delete()
+        self.assertEqual(self.match('contract', 'ct001'), [])
+
+    def test_rebuild_index(self):
+        # 3 sinh viên + 1 hợp đồng + 1 phòng
+        self.assertEqual(search.rebuild_index(), 5)
+        self.assertEqual(self.match('student', 'binh'), [self.students[2].pk])
+
+    def test_list_is_ranked_and_not_capped(self):
+        user = CustomUser.objects.create_user(username='sv9', password='x')
+        best = Student.objects.create(user=user, student_id='SV009', full_name='Khoa Văn Khoa',
+                                      university='Bách Khoa', faculty='Khoa học')
+
+        with self.assertNumQueries(2):
+            students = list(search.search_list(Student.objects.all(), 'student', 'khoa').order_by('search_rank', 'pk'))
+        self.assertEqual(len(students), 4)
+        self.assertEqual(students[0], best)
+        self.assertTrue(all(a.search_rank <= b.search_rank for a, b in zip(students, students[1:])))
+
+        response = self.client.get(reverse('student_list'), {'search': 'khoa'})
+        self.assertEqual(response.context['page_obj'][0], best)
+
+    def test_list_views_use_index(self):
+        response = self.client.get(reverse('student_list'), {'search': 'nguyen van'})
+        self.assertEqual([student.pk for student in response.context['page_obj']], [self.students[0].pk])
+
+        # Đoạn giữa mã số không khớp tiền tố nào, vẫn tìm được bằng icontains
+        response = self.client.get(reverse('student_list'), {'search': '002'})
+        self.assertEqual([student.pk for student in response.context['page_obj']], [self.students[2].pk])
+
+        response = self.client.get(reverse('contract_list'), {'search': 'nguyen'})
+        self.assertEqual([contract.pk for contract in response.context['page_obj']], [self.contract.pk])
+        response = self.client.get(reverse('room_list'), {'search': 'phong doi'})
+        self.assertEqual([room.pk for room in response.context['page_obj']], [self.room.pk])
+
+
+class NormalizedSearchFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.building = Building.objects.create(name='Tòa Đông', address='Hà Nội', total_floors=5)
+        user = CustomUser.objects.create_user(username='sv', password='x')
+        cls.student = Student.objects.create(user=user, student_id='SV001', full_name='Nguyễn Văn Ánh',
+                                             university='Đại học Bách Khoa', faculty='Công nghệ')
+
+    def test_normalize(self):
+        self.assertEqual(normalize('  Nguyễn   Văn ĐỨC '), 'nguyen van duc')
+
+    def test_columns_filled_on_save(self):
+        self.assertEqual(
+            (self.student.full_name_normalized, self.student.university_normalized, self.student.faculty_normalized),
+            ('nguyen van anh', 'dai hoc bach khoa', 'cong nghe'),
+        )
+        self.assertEqual(self.building.name_normalized, 'toa dong')
+
+    def test_backfill_fixes_rows_written_without_signals(self):
+        Student.objects.filter(pk=self.student.pk).update(full_name='Trần Bình', full_name_normalized='')
+
+        self.assertEqual(backfill_normalized(), 1)
+        self.assertEqual(Student.objects.get(pk=self.student.pk).full_name_normalized, 'tran binh')
+        self.assertEqual(backfill_normalized(), 0)
+
+    def test_prefix_lookup(self):
+        students = Student.objects.filter(prefix_filter(['full_name_normalized', 'faculty_normalized'], 'NGUYEN van a'))
+        self.assertEqual(list(students), [self.student])
+        self.assertFalse(Student.objects.filter(prefix_filter(['full_name_normalized'], 'van anh')).exists())
+
+    def test_list_view_without_full_text_index(self):
+        with mock.patch('dormitory.search.is_available', return_value=False):
+            response = self.client.get(reverse('student_list'), {'search': 'nguyen van a'})
+        self.assertEqual(list(response.context['page_obj']), [self.student])
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.building = Building.objects.create(name='Tòa A', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        cls.room = Room.objects.create(room_number='101', building=cls.building, room_type=room_type, floor=1)
+        user = CustomUser.objects.create_user(username='sv', password='x')
+        cls.student = Student.objects.create(user=user, student_id='SV2024001', full_name='Nguyễn Văn Ánh')
+        cls.staff = CustomUser.objects.create_user(username='nv', password='x', user_type='staff')
+
+    def setUp(self):
+        autocomplete.reset()
+
+    def test_prefix_lookup_without_queries_on_hot_path(self):
+        autocomplete.get_index()
+
+        with self.assertNumQueries(0):
+            by_id = autocomplete.suggest('sv2024')
+            by_name = autocomplete.suggest('anh')
+            by_room = autocomplete.suggest('toa a 10', kind='room')
+
+        self.assertEqual(by_id, [{'type': 'student', 'id': self.student.pk, 'label': 'SV2024001 - Nguyễn Văn Ánh'}])
+        self.assertEqual([r['id'] for r in by_name], [self.student.pk])
+        self.assertEqual(by_room, [{'type': 'room', 'id': self.room.pk, 'label': 'Tòa A - Phòng 101'}])
+        self.assertEqual(autocomplete.suggest('101', kind='student'), [])
+
+    def test_incremental_refresh_from_change_journal(self):
+        autocomplete.get_index()
+        self.building.name = 'Tòa B'
+        self.building.save()
+        self.student.delete()
+
+        with mock.patch('dormitory.autocomplete.REFRESH_SECONDS', 0), \
+                mock.patch('dormitory.autocomplete._full_load') as full_load:
+            self.assertEqual([r['label'] for r in autocomplete.suggest('toa b')], ['Tòa B - Phòng 101'])
+            self.assertEqual(autocomplete.suggest('toa a'), [])
+            self.assertEqual(autocomplete.suggest('sv'), [])
+        full_load.assert_not_called()
+
+    def test_incremental_refresh_prunes_old_journal_rows(self):
+        autocomplete.get_index()
+        self.student.full_name = 'Trần Thị Bình'
+        self.student.save()
+        SearchChange.objects.update(created_at=timezone.now() - timedelta(days=autocomplete.JOURNAL_RETENTION_DAYS + 1))
+        self.building.name = 'Tòa B'
+        self.building.save()
+
+        with mock.patch('dormitory.autocomplete.REFRESH_SECONDS', 0), \
+                mock.patch('dormitory.autocomplete._full_load') as full_load:
+            self.assertEqual([r['label'] for r in autocomplete.suggest('binh')], ['SV2024001 - Trần Thị Bình'])
+            self.assertEqual([r['label'] for r in autocomplete.suggest('toa b')], ['Tòa B - Phòng 101'])
+        full_load.assert_not_called()
+        self.assertEqual(list(SearchChange.objects.values_list('kind', flat=True)), ['building'])
+
+    def test_endpoint(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('autocomplete'), {'q': 'nguyen'})
+        self.assertEqual(response.json()['results'][0]['url'], reverse('student_edit', args=[self.student.pk]))
+
+        self.client.force_login(self.student.user)
+        self.assertEqual(self.client.get(reverse('autocomplete'), {'q': 'nguyen'}).status_code, 403)
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        today = date(2026, 1, 15)
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        for i in range(3):
+            room = Room.objects.create(room_number=f'10{i}', building=building, room_type=room_type, floor=1)
+            user = CustomUser.objects.create_user(username=f'sv{i}', password='x', first_name='Văn', last_name=f'A{i}')
+            student = Student.objects.create(user=user, student_id=f'SV{i}', full_name='' if i else 'Nguyễn Văn A')
+            Contract.objects.create(contract_number=f'CT{i}', student=student, room=room,
+                                    start_date=today, end_date=today + timedelta(days=30), deposit=500000)
+        cls.staff = CustomUser.objects.create_user(username='nv', password='x', user_type='staff')
+
+    def read(self, url_name):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse(url_name))
+        self.assertTrue(response.streaming)
+        return list(load_workbook(BytesIO(b''.join(response.streaming_content))).active.values)
+
+    def test_rooms(self):
+        rows = self.read('export_rooms_excel')
+        self.assertEqual(rows[0], ('Mã phòng', 'Tòa nhà', 'Loại phòng', 'Sức chứa', 'Giá thuê', 'Tầng', 'Trạng thái'))
+        self.assertEqual(rows[1], ('100', 'A1', 'Phòng đôi', 2, 1500000, 1, 'Còn trống'))
+        self.assertEqual(len(rows), 4)
+
+    def test_students_fall_back_to_user_name(self):
+        rows = self.read('export_students_excel')
+        self.assertEqual([row[1] for row in rows[1:]], ['Nguyễn Văn A', 'Văn A1', 'Văn A2'])
+
+    def test_contracts(self):
+        rows = self.read('export_contracts_excel')
+        self.assertEqual(rows[1], ('CT0', 'SV0', 'Nguyễn Văn A', 'A1', '100', '15/01/2026', '14/02/2026', 500000, 'Đang hoạt động'))
+
+    def test_excel_exports_require_staff(self):
+        for url_name in ('export_rooms_excel', 'export_students_excel', 'export_contracts_excel'):
+            response = self.client.get(reverse(url_name))
+            self.assertEqual(response.status_code, 302)
+            self.assertTrue(response.url.startswith(settings.LOGIN_URL))
+
+        self.client.force_login(Student.objects.get(student_id='SV0').user)
+        response = self.client.get(reverse('export_contracts_excel'))
+        self.assertRedirects(response, reverse('contract_list'), fetch_redirect_response=False)
+
+    def test_csv_stream(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_stream', args=['contracts', 'csv']))
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'contract_number,student_id,student_name,building,room_number,start_date,end_date,deposit,status')
+        self.assertEqual(lines[1], 'CT0,SV0,Nguyễn Văn A,A1,100,2026-01-15,2026-02-14,500000.00,active')
+        self.assertEqual(len(lines), 4)
+
+    def test_ndjson_stream_with_search_and_gzip(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('export_stream', args=['rooms', 'ndjson']), {'search': '101'},
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual([json.loads(line) for line in body.splitlines()], [{
+            'room_number': '101', 'building': 'A1', 'room_type': 'Phòng đôi', 'capacity': 2,
+            'price_per_month': '1500000.00', 'floor': 1, 'status': 'available',
+        }])
+
+    def test_stream_requires_staff_and_known_dataset(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse('export_stream', args=['users', 'csv'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export_stream', args=['rooms', 'xml'])).status_code, 404)
+
+        self.client.force_login(CustomUser.objects.get(username='sv0'))
+        self.assertEqual(self.client.get(reverse('export_stream', args=['rooms', 'csv'])).status_code, 302)
+
+
+class RoomsPdfExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        for i in range(40):
+            Room.objects.create(room_number=f'{i:03}', building=cls.building, room_type=room_type, floor=1)
+        cls.staff = CustomUser.objects.create_user(username='nv', password='x', user_type='staff')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_login(self.staff)
+
+    def test_first_request_starts_one_job_then_serves_cached_file(self):
+        response = self.client.get(reverse('export_rooms_pdf'))
+        job = ExportJob.objects.get()
+        self.assertEqual((job.export_type, job.format), ('rooms', 'pdf'))
+        self.assertRedirects(response, reverse('export_job_status', args=[job.pk]), fetch_redirect_response=False)
+
+        # Bấm lại khi job chưa xong không tạo thêm job
+        self.client.get(reverse('export_rooms_pdf'))
+        self.assertEqual(ExportJob.objects.count(), 1)
+        self.assertContains(self.client.get(response.url), 'Đang tạo file')
+
+        self.assertEqual(export_jobs.run_pending(), 1)
+        self.assertContains(self.client.get(response.url), 'Tải xuống')
+
+        response = self.client.get(reverse('export_rooms_pdf'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(response['ETag'], f'"{job.dedupe_key}"')
+
+        response = self.client.get(reverse('export_rooms_pdf'), HTTP_IF_NONE_MATCH=f'"{job.dedupe_key}"')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(ExportJob.objects.count(), 1)
+
+    def test_fingerprint_changes_with_related_data(self):
+        before = rooms_fingerprint()
+        self.building.name = 'A2'
+        self.building.save()
+        after = rooms_fingerprint()
+        self.assertNotEqual(before, after)
+
+        Room.objects.get(room_number='000').delete()
+        self.assertNotEqual(rooms_fingerprint(), after)
+
+    def test_changed_data_starts_a_new_job(self):
+        self.client.get(reverse('export_rooms_pdf'))
+        export_jobs.run_pending()
+
+        Room.objects.get(room_number='001').save()
+        response = self.client.get(reverse('export_rooms_pdf'))
+
+        job = ExportJob.objects.latest('created_at')
+        self.assertEqual((ExportJob.objects.count(), job.status), (2, 'queued'))
+        self.assertRedirects(response, reverse('export_job_status', args=[job.pk]), fetch_redirect_response=False)
+
+    def test_pdf_only_for_rooms(self):
+        self.assertEqual(self.client.get(reverse('export_job_start', args=['students', 'pdf'])).status_code, 404)
+
+
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        for i in range(5):
+            Room.objects.create(room_number=f'10{i}', building=building, room_type=room_type, floor=1)
+        cls.staff = CustomUser.objects.create_user(username='nv', password='x', user_type='staff')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_login(self.staff)
+
+    def test_identical_requests_are_merged(self):
+        first, created = export_jobs.submit('rooms', 'csv', {'search': '101', 'page': '3'})
+        second, created_again = export_jobs.submit('rooms', 'csv', {'search': '101'})
+        other, _ = export_jobs.submit('rooms', 'csv', {})
+
+        self.assertTrue(created)
+        self.assertFalse(created_again)
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(first.filters, {'search': '101'})
+
+        # Job đã xong thì yêu cầu mới tạo job mới
+        export_jobs.run_job(first.pk)
+        self.assertNotEqual(export_jobs.submit('rooms', 'csv', {'search': '101'})[0], first)
+
+    def test_worker_runs_job_and_reports_progress(self):
+        response = self.client.get(reverse('export_job_start', args=['rooms', 'csv']))
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('export_job_status', args=[job.pk]))
+        self.assertEqual(self.client.get(reverse('export_job_progress', args=[job.pk])).json()['status'], 'queued')
+
+        with mock.patch('dormitory.export_jobs.PROGRESS_EVERY', 2):
+            self.assertEqual(export_jobs.run_pending(), 1)
+        self.assertFalse(export_jobs.run_job(job.pk))
+
+        progress = self.client.get(reverse('export_job_progress', args=[job.pk])).json()
+        self.assertEqual((progress['status'], progress['rows_processed'], progress['total_rows'], progress['percent']),
+                         ('done', 5, 5, 100))
+        response = self.client.get(progress['download_url'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].startswith('100,A1,'))
+
+    def test_payments_xlsx_job(self):
+        job, _ = export_jobs.submit('payments', 'xlsx', {'status': 'paid', 'search': 'x'})
+        self.assertEqual(job.filters, {'status': 'paid'})
+        export_jobs.run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.total_rows), ('done', 0))
+        self.assertTrue(job.file.name.endswith('.xlsx'))
+
+    def test_expired_files_are_purged(self):
+        job, _ = export_jobs.submit('students', 'ndjson', {})
+        export_jobs.run_job(job.pk)
+        job.refresh_from_db()
+        path = job.file.path
+        self.assertTrue(os.path.exists(path))
+
+        self.assertEqual(export_jobs.purge_expired(job.expires_at + timedelta(seconds=1)), 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(ExportJob.objects.exists())
+
+
+def _make_students(count, prefix='SV'):
+    students = []
+    for i in range(count):
+        user = CustomUser.objects.create_user(username=f'{prefix.lower()}{i}', user_type='student')
+        students.append(Student.objects.create(
+            user=user, student_id=f'{prefix}{i:04d}', university='ĐHBK', faculty='CNTT',
+            course='K65', full_name=f'Sinh viên {i}',
+        ))
+    return students
+
+
+class RoomBookingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đơn', capacity=1, price_per_month=1200000)
+        cls.rooms = [
+            Room.objects.create(room_number=f'10{i}', building=building, room_type=room_type, floor=1)
+            for i in range(2)
+        ]
+        cls.students = _make_students(2)
+
+    def test_booking_claims_room_and_updates_counters(self):
+        contract = book_room(self.students[0], self.rooms[0].pk, today=date(2026, 9, 1))
+
+        self.rooms[0].refresh_from_db()
+        self.assertEqual(self.rooms[0].status, 'occupied')
+        self.assertEqual((contract.start_date, contract.end_date, contract.deposit),
+                         (date(2026, 9, 1), date(2027, 9, 1), 1200000))
+        stats = get_overview_stats()
+        self.assertEqual((stats['rooms']['available'], stats['rooms']['occupied'], stats['contracts']['active']), (1, 1, 1))
+
+    def test_taken_room_and_second_contract_are_rejected(self):
+        book_room(self.students[0], self.rooms[0].pk)
+
+        with self.assertRaises(BookingError):
+            book_room(self.students[1], self.rooms[0].pk)
+        with self.assertRaises(BookingError):
+            book_room(self.students[0], self.rooms[1].pk)
+        self.rooms[1].refresh_from_db()
+        self.assertEqual(self.rooms[1].status, 'available')
+        self.assertEqual(Contract.objects.count(), 1)
+
+    def test_contract_lost_to_parallel_request_releases_room(self):
+        Contract.objects.create(
+            contract_number='CT-OTHER', student=self.students[0], room=self.rooms[1],
+            start_date=date(2026, 9, 1), end_date=date(2027, 9, 1), deposit=0, status='active',
+        )
+        # Giả lập yêu cầu song song: bỏ qua bước kiểm tra trước, để ràng buộc DB chặn
+        with mock.patch('dormitory.booking.Contract.objects.filter') as existing:
+            existing.return_value.exists.return_value = False
+            with self.assertRaises(BookingError):
+                book_room(self.students[0], self.rooms[0].pk)
+        self.rooms[0].refresh_from_db()
+        self.assertEqual((self.rooms[0].status, self.rooms[0].free_beds), ('available', 1))
+        self.assertEqual(read_counters()[('rooms:available', self.rooms[0].building_id)], 1)
+
+    def test_rebooking_same_day_after_termination(self):
+        today = date(2026, 9, 1)
+        first = book_room(self.students[0], self.rooms[0].pk, today=today)
+        first.status = 'terminated'
+        first.save()
+
+        second = book_room(self.students[0], self.rooms[1].pk, today=today)
+        other = book_room(self.students[1], self.rooms[0].pk, today=today)
+
+        self.assertEqual(second.contract_number, f'{first.contract_number}-2')
+        self.assertEqual(other.contract_number, f'CT20260901{self.students[1].student_id}')
+
+    def test_only_lock_errors_are_retried(self):
+        def driver_error(waiter, sql):
+            # Lỗi thật của driver sqlite3, bọc như Django bọc
+            try:
+                waiter.execute(sql)
+            except sqlite3.OperationalError as cause:
+                error = OperationalError(str(cause))
+                error.__cause__ = cause
+                return error
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'lock.sqlite3')
+            holder = sqlite3.connect(path, isolation_level=None)
+            holder.execute('BEGIN IMMEDIATE')
+            waiter = sqlite3.connect(path, timeout=0)
+            busy = driver_error(waiter, 'CREATE TABLE t (id integer)')
+            # Thông báo có chữ 'locked' nhưng không phải lỗi khóa
+            missing = driver_error(waiter, 'SELECT * FROM locked_rooms')
+            holder.close()
+            waiter.close()
+
+        with mock.patch('dormitory.booking.LOCK_RETRY_DELAY', 0), \
+                mock.patch('dormitory.booking._book', side_effect=[busy, 'contract']) as book:
+            self.assertEqual(book_room(self.students[0], self.rooms[0].pk), 'contract')
+        self.assertEqual(book.call_count, 2)
+
+        with mock.patch('dormitory.booking._book', side_effect=[missing]) as book:
+            with self.assertRaises(OperationalError):
+                book_room(self.students[0], self.rooms[0].pk)
+        self.assertEqual(book.call_count, 1)
+
+    def test_view_books_room(self):
+        self.client.force_login(self.students[0].user)
+        response = self.client.post(reverse('room_booking', args=[self.rooms[0].pk]))
+        self.assertRedirects(response, reverse('student_dashboard'), fetch_redirect_response=False)
+        self.assertTrue(Contract.objects.filter(student=self.students[0], room=self.rooms[0]).exists())
+
+
+class RoomOccupancyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        cls.room_type = RoomType.objects.create(name='Phòng tập thể', capacity=3, price_per_month=800000)
+        cls.room = Room.objects.create(room_number='301', building=building, room_type=cls.room_type, floor=3)
+        cls.students = _make_students(4)
+
+    def assertBeds(self, occupied, free, status):
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.occupied_beds, self.room.free_beds, self.room.status), (occupied, free, status))
+
+    def assertCountersMatchRebuild(self):
+        incremental = {key: value for key, value in read_counters().items() if value}
+        rebuild_counters()
+        self.assertEqual(incremental, {key: value for key, value in read_counters().items() if value})
+
+    def test_room_fills_bed_by_bed_and_frees_on_terminate_and_delete(self):
+        self.assertBeds(0, 3, 'available')
+        contracts = [book_room(student, self.room.pk) for student in self.students[:3]]
+        self.assertBeds(3, 0, 'occupied')
+        with self.assertRaises(BookingError):
+            book_room(self.students[3], self.room.pk)
+
+        contracts[0].status = 'terminated'
+        contracts[0].save()
+        self.assertBeds(2, 1, 'available')
+        contracts[1].delete()
+        self.assertBeds(1, 2, 'available')
+        self.assertCountersMatchRebuild()
+
+    def test_room_form_and_capacity_changes_keep_beds_consistent(self):
+        stale = Room.objects.get(pk=self.room.pk)
+        book_room(self.students[0], self.room.pk)
+        book_room(self.students[1], self.room.pk)
+        # Lưu bản phòng đọc trước khi đăng ký không làm mất số giường đã thuê
+        stale.notes = 'Sơn lại'
+        stale.save()
+        self.assertBeds(2, 1, 'available')
+
+        self.room_type.capacity = 2
+        self.room_type.save()
+        self.assertBeds(2, 0, 'occupied')
+        self.assertCountersMatchRebuild()
+
+    def test_recompute_beds_and_dashboard_lists_rooms_with_free_beds(self):
+        book_room(self.students[0], self.room.pk)
+        Room.objects.update(occupied_beds=0, free_beds=0)
+        occupancy.recompute_beds()
+        self.assertBeds(1, 2, 'available')
+
+        self.client.force_login(self.students[1].user)
+        response = self.client.get(reverse('student_dashboard'))
+        self.assertEqual(list(response.context['available_rooms']), [self.room])
+        self.assertContains(response, 'Giường trống:</strong> 2')
+
+
+class RoomAllocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.a1 = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        cls.b2 = Building.objects.create(name='B2', address='Hà Nội', total_floors=5)
+        cls.double = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        cls.rooms = [
+            Room.objects.create(room_number=f'10{i}', building=building, room_type=cls.double, floor=1)
+            for i, building in enumerate([cls.a1, cls.a1, cls.b2])
+        ]
+        cls.students = _make_students(6)
+        for student, faculty in zip(cls.students, ['CNTT', 'Điện', 'CNTT', 'Điện', 'CNTT', 'Hóa']):
+            student.faculty = faculty
+            student.save()
+
+    def test_groups_share_rooms_and_counters_follow_bulk_writes(self):
+        result = allocate_rooms(start_date=date(2026, 9, 1))
+
+        # CNTT (3 người) lấp một phòng và nửa phòng thứ hai, Điện một phòng; Hóa không ở ghép với khoa khác
+        self.assertEqual((result['assigned'], result['contracts_created'], result['rooms_used']), (5, 5, 3))
+        self.assertEqual(result['unassigned'], ['SV0005'])
+        for room in Room.objects.all():
+            faculties = set(Contract.objects.filter(room=room).values_list('student__faculty', flat=True))
+            self.assertEqual(len(faculties), 1)
+            self.assertEqual(room.free_beds, 2 - room.occupied_beds)
+        self.assertEqual(Room.objects.filter(status='occupied').count(), 2)
+        stats = get_overview_stats()
+        self.assertEqual((stats['rooms']['occupied'], stats['contracts']['active']), (2, 5))
+        incremental = {key: value for key, value in read_counters().items() if value}
+        rebuild_counters()
+        self.assertEqual(incremental, {key: value for key, value in read_counters().items() if value})
+
+    def test_preferences_are_honoured_then_relaxed(self):
+        preferences = read_preferences(StringIO(
+            'student_id,building,room_type\n'
+            'SV0000,B2,Phòng đôi\n'
+            'SV0002,b2,\n'
+            'SV0004,B2,\n'
+            'SV9999,A1,\n'
+        ))
+        result = allocate_rooms(preferences, strict=True)
+
+        self.assertEqual(result['skipped']['unknown_student'], 1)
+        self.assertEqual(result['levels']['exact'], 2)
+        self.assertEqual(result['unassigned'], ['SV0004'])
+        self.assertEqual(set(Contract.objects.values_list('room', flat=True)), {self.rooms[2].pk})
+
+        result = allocate_rooms(preferences)
+        self.assertEqual((result['assigned'], result['levels']['room_type'], result['skipped']['has_contract']), (1, 1, 2))
+
+    def test_partly_filled_room_only_takes_same_group(self):
+        book_room(self.students[1], self.rooms[0].pk)
+        result = allocate_rooms([{'student_id': 'SV0000', 'building': 'A1', 'room_type': ''}], strict=True)
+
+        contract = Contract.objects.get(student=self.students[0])
+        self.assertEqual((result['assigned'], contract.room), (1, self.rooms[1]))
+
+    def test_same_day_contract_number_gets_a_suffix(self):
+        start = date(2026, 9, 1)
+        earlier = book_room(self.students[0], self.rooms[0].pk, today=start)
+        earlier.status = 'terminated'
+        earlier.save()
+
+        out = StringIO()
+        call_command('allocate_rooms', '--start-date', '2026-09-01', '--group-by', 'none', stdout=out)
+
+        self.assertIn('1 sinh viên đã có hợp đồng cùng số', out.getvalue())
+        contract = Contract.objects.get(student=self.students[0], status='active')
+        self.assertEqual(contract.contract_number, f'{earlier.contract_number}-2')
+        self.assertEqual(Contract.objects.filter(status='active').count(), 6)
+
+    def test_dry_run_command_writes_nothing(self):
+        out = StringIO()
+        call_command('allocate_rooms', '--dry-run', '--group-by', 'none', stdout=out)
+
+        self.assertIn('Chạy thử: sẽ xếp 6 sinh viên vào 3 phòng', out.getvalue())
+        self.assertFalse(Contract.objects.exists())
+        self.assertFalse(Room.objects.filter(occupied_beds__gt=0).exists())
+
+
+class ContractExpiryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        double = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        single = RoomType.objects.create(name='Phòng đơn', capacity=1, price_per_month=2000000)
+        cls.shared = Room.objects.create(room_number='201', building=building, room_type=double, floor=2)
+        cls.single = Room.objects.create(room_number='202', building=building, room_type=single, floor=2)
+        students = _make_students(3)
+        today = date.today()
+        for i, (student, room, end) in enumerate([
+            (students[0], cls.shared, today - timedelta(days=1)),
+            (students[1], cls.shared, today + timedelta(days=20)),
+            (students[2], cls.single, today - timedelta(days=30)),
+        ]):
+            Contract.objects.create(contract_number=f'CT{i}', student=student, room=room,
+                                    start_date=today - timedelta(days=365), end_date=end, deposit=0)
+
+    def test_due_contracts_expire_and_rooms_reopen(self):
+        self.assertEqual(get_overview_stats()['contracts']['upcoming_expiry'], 3)
+
+        result = expire_contracts()
+
+        self.assertEqual((result['expired'], result['rooms'], result['reopened']), (2, 2, 2))
+        self.assertEqual(set(Contract.objects.filter(status='expired').values_list('contract_number', flat=True)), {'CT0', 'CT2'})
+        self.shared.refresh_from_db()
+        self.single.refresh_from_db()
+        self.assertEqual((self.shared.occupied_beds, self.shared.free_beds, self.shared.status), (1, 1, 'available'))
+        self.assertEqual((self.single.occupied_beds, self.single.free_beds, self.single.status), (0, 1, 'available'))
+        stats = get_overview_stats()
+        self.assertEqual((stats['rooms']['available'], stats['contracts']['active'], stats['contracts']['expired']), (2, 1, 2))
+        self.assertEqual(stats['contracts']['upcoming_expiry'], 1)
+        incremental = {key: value for key, value in read_counters().items() if value}
+        rebuild_counters()
+        self.assertEqual(incremental, {key: value for key, value in read_counters().items() if value})
+
+    def test_rerun_is_a_no_op_and_dry_run_writes_nothing(self):
+        out = StringIO()
+        call_command('expire_contracts', '--dry-run', stdout=out)
+        self.assertIn('2 hợp đồng đến hạn ở 2 phòng', out.getvalue())
+        self.assertEqual(Contract.objects.filter(status='active').count(), 3)
+
+        call_command('expire_contracts', stdout=StringIO())
+        # Không còn hợp đồng đến hạn: chỉ một truy vấn dùng index (status, end_date) trong savepoint
+        with self.assertNumQueries(3):
+            result = expire_contracts()
+        self.assertEqual(result['expired'], 0)
+
+
+class RoomAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        double = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        single = RoomType.objects.create(name='Phòng đơn', capacity=1, price_per_month=2000000)
+        cls.double = Room.objects.create(room_number='101', building=building, room_type=double, floor=1)
+        cls.single = Room.objects.create(room_number='102', building=building, room_type=single, floor=1)
+        cls.empty = Room.objects.create(room_number='103', building=building, room_type=single, floor=1)
+        Room.objects.create(room_number='104', building=building, room_type=double, floor=1, status='maintenance')
+        students = _make_students(3)
+        for i, (student, room, start, end, status) in enumerate([
+            (students[0], cls.double, date(2026, 9, 1), date(2026, 12, 31), 'active'),
+            (students[1], cls.single, date(2027, 1, 15), date(2027, 6, 30), 'active'),
+            (students[2], cls.empty, date(2026, 9, 1), date(2027, 6, 30), 'terminated'),
+        ]):
+            Contract.objects.create(contract_number=f'CT{i}', student=student, room=room,
+                                    start_date=start, end_date=end, deposit=0, status=status)
+        cls.staff = CustomUser.objects.create_user(username='nv', password='x', user_type='staff')
+
+    def test_overlapping_contracts_reduce_free_beds(self):
+        with self.assertNumQueries(1):
+            rooms = {room.room_number: room.period_free_beds
+                     for room in available_rooms(date(2026, 9, 1), date(2027, 1, 31))}
+        self.assertEqual(rooms, {'101': 1, '103': 1})
+
+        self.assertEqual([room.room_number for room in available_rooms(date(2026, 9, 1), date(2027, 1, 31), min_beds=2)], [])
+        # Khoảng chạm đúng ngày bắt đầu hợp đồng vẫn tính là giao nhau
+        self.assertNotIn('102', {room.room_number for room in available_rooms(date(2027, 1, 1), date(2027, 1, 15))})
+        self.assertIn('102', {room.room_number for room in available_rooms(date(2027, 7, 1), date(2027, 8, 31))})
+
+    def test_back_to_back_contracts_share_a_bed(self):
+        first, second, third = _make_students(3, prefix='TT')
+        Contract.objects.create(contract_number='CT-NEXT', student=first, room=self.double,
+                                start_date=date(2027, 1, 1), end_date=date(2027, 3, 31), deposit=0)
+        rooms = {room.room_number: room.period_free_beds for room in available_rooms(date(2026, 9, 1), date(2027, 1, 31))}
+        self.assertEqual(rooms['101'], 1)
+
+        # Hai hợp đồng cùng hiệu lực trong tháng 12 thì phòng hết giường
+        Contract.objects.create(contract_number='CT-DEC', student=second, room=self.double,
+                                start_date=date(2026, 12, 1), end_date=date(2027, 2, 28), deposit=0)
+        Contract.objects.create(contract_number='CT-LATER', student=third, room=self.double,
+                                start_date=date(2027, 4, 1), end_date=date(2027, 6, 30), deposit=0)
+        with self.assertNumQueries(1):
+            rooms = {room.room_number: room.period_free_beds
+                     for room in available_rooms(date(2026, 9, 1), date(2027, 1, 31))}
+        self.assertNotIn('101', rooms)
+        self.assertEqual(
+            {room.room_number: room.period_free_beds for room in available_rooms(date(2027, 3, 1), date(2027, 6, 30))}['101'],
+            1,
+        )
+
+    def test_json_and_html_views(self):
+        self.client.force_login(self.staff)
+        url = reverse('room_availability')
+        params = {'start_date': '2026-09-01', 'end_date': '2027-01-31', 'min_beds': '1'}
+
+        data = self.client.get(url, {**params, 'format': 'json'}).json()
+        self.assertEqual(data['start_date'], '2026-09-01')
+        self.assertEqual([(room['room_number'], room['free_beds'], room['capacity']) for room in data['results']],
+                         [('101', 1, 2), ('103', 1, 1)])
+        self.assertNotIn('period_free_beds', data['results'][0])
+
+        response = self.client.get(url, params)
+        self.assertContains(response, '🛏️ 1/2')
+        self.assertNotContains(response, '<strong>102</strong>')
+
+        response = self.client.get(url, {'start_date': '2027-01-31', 'end_date': '2026-09-01', 'format': 'json'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end_date', response.json()['errors'])
+
+    def test_students_are_denied(self):
+        self.client.force_login(CustomUser.objects.filter(user_type='student').first())
+        response = self.client.get(reverse('room_availability'), {'format': 'json'})
+        self.assertEqual(response.status_code, 403)
+
+
+class VacancyForecastTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+        double = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+        single = RoomType.objects.create(name='Phòng đơn', capacity=1, price_per_month=2000000)
+        doubles = [Room.objects.create(room_number=f'10{i}', building=building, room_type=double, floor=1) for i in range(2)]
+        single_room = Room.objects.create(room_number='201', building=building, room_type=single, floor=2)
+        Room.objects.create(room_number='202', building=building, room_type=single, floor=2, status='maintenance')
+        students = _make_students(3)
+        for i, (student, room, start, end) in enumerate([
+            (students[0], doubles[0], -10, 9),
+            (students[1], doubles[1], 30, 59),
+            (students[2], single_room, -100, 400),
+        ]):
+            Contract.objects.create(contract_number=f'CT{i}', student=student, room=room, deposit=0,
+                                    start_date=cls.today + timedelta(days=start), end_date=cls.today + timedelta(days=end))
+        cls.staff = CustomUser.objects.create_user(username='nv', password='x', user_type='staff')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sweep_projects_free_beds_per_group(self):
+        result = forecast.compute_forecast(self.today, days=90)
+
+        groups = {group['room_type']: group for group in result['groups']}
+        self.assertEqual((groups['Phòng đôi']['capacity'], groups['Phòng đơn']['capacity']), (4, 1))
+        self.assertEqual(groups['Phòng đôi']['free'], [3] * 10 + [4] * 20 + [3] * 30 + [4] * 30)
+        self.assertEqual(groups['Phòng đơn']['free'], [0] * 90)
+        self.assertEqual(result['total'][:11], [3] * 10 + [4])
+
+        with mock.patch('dormitory.forecast.np', None):
+            self.assertEqual(forecast.compute_forecast(self.today, days=90), result)
+
+    def test_cache_is_reused_until_contracts_change(self):
+        first = forecast.get_forecast(self.today, days=60)
+        self.assertEqual(first['total'][45], 3)
+        # Chỉ đọc bộ đếm phiên bản và dấu vân tay phòng
+        with self.assertNumQueries(2):
+            self.assertEqual(forecast.get_forecast(self.today, days=60), first)
+
+        contract = Contract.objects.get(contract_number='CT1')
+        contract.end_date = self.today + timedelta(days=40)
+        contract.save()
+        self.assertEqual(forecast.get_forecast(self.today, days=60)['total'][45], 4)
+
+    def test_report_page_and_json(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('vacancy_forecast'))
+        self.assertContains(response, '🛏️ 3 / 5')
+        self.assertIn(len(response.context['total_months']), (12, 13))
+
+        data = self.client.get(reverse('vacancy_forecast'), {'format': 'json'}).json()
+        self.assertEqual((data['days'], data['capacity'], len(data['total'])), (365, 5, 365))
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Nhiều luồng đăng ký cùng lúc, mỗi luồng một kết nối DB riêng"""
+
+    def test_no_double_booking_under_contention(self):
+        building = Building.objects.create(name='B1', address='Hà Nội', total_floors=5)
+        room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1000000)
+        rooms = [
+            Room.objects.create(room_number=f'{i:03d}', building=building, room_type=room_type, floor=1)
+            for i in range(5)
+        ]
+        students = _make_students(40)
+
+        def attempt(args):
+            student, room = args
+            try:
+                book_room(student, room.pk)
+                return True
+            except BookingError:
+                return False
+            finally:
+                connection.close()
+
+        # Mỗi sinh viên thử hai phòng, mỗi phòng có 16 yêu cầu tranh 2 giường
+        requests = [(student, rooms[(i + offset) % len(rooms)]) for i, student in enumerate(students) for offset in (0, 2)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            succeeded = sum(pool.map(attempt, requests))
+
+        active = Contract.objects.filter(status='active')
+        self.assertEqual(succeeded, 10)
+        self.assertEqual(active.count(), 10)
+        self.assertEqual(active.values('student').distinct().count(), 10)
+        for room in Room.objects.all():
+            self.assertEqual((room.occupied_beds, room.free_beds, room.status), (2, 0, 'occupied'))
+            self.assertEqual(active.filter(room=room).count(), 2)
+        counters = read_counters()
+        self.assertEqual((counters[('rooms:occupied', building.pk)], counters[('rooms:available', building.pk)]), (5, 0))
@@ -0,0 +1,67 @@
+# dormitory/text.py
+import unicodedata
+
+from django.apps import apps as global_apps
+from django.db.models import Q
+
+# Cột gốc -> cột chuẩn hóa (bỏ dấu, chữ thường) của từng model
+NORMALIZED_FIELDS = {
+    'Building': {'name': 'name_normalized'},
+    'Room': {'room_number': 'room_number_normalized'},
+    'Student': {
+        'full_name': 'full_name_normalized',
+        'university': 'university_normalized',
+        'faculty': 'faculty_normalized',
+    },
+}
+BACKFILL_BATCH_SIZE = 1000
+
+
+def normalize(text):
+    """'Nguyễn Văn Đức' -> 'nguyen van duc': bỏ dấu, đ -> d, chữ thường, gộp khoảng trắng"""
+    text = unicodedata.normalize('NFD', text or '').replace('đ', 'd').replace('Đ', 'D')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.lower().split())
+
+
+def fill_normalized(instance):
+    """Gán các cột chuẩn hóa từ cột gốc trước khi lưu"""
+    for source, target in NORMALIZED_FIELDS[instance.__class__.__name__].items():
+        setattr(instance, target, normalize(getattr(instance, source)))
+
+
+def prefix_filter(fields, text):
+    """Tìm theo tiền tố trên cột chuẩn hóa bằng điều kiện khoảng >= x AND < x + '\\uffff'
+    để dùng được B-tree index (LIKE 'x%' thì SQLite không dùng index vì không phân biệt hoa thường)
+    """
+    prefix = normalize(text)
+    condition = Q()
+    if not prefix:
+        return condition
+    for field in fields:
+        condition |= Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\uffff'})
+    return condition
+
+
+def backfill_normalized(apps=global_apps):
+    """Điền lại cột chuẩn hóa cho dữ liệu có sẵn, trả về số bản ghi đã cập nhật"""
+    updated = 0
+    for model_name, mapping in NORMALIZED_FIELDS.items():
+        model = apps.get_model('dormitory', model_name)
+        last_pk = 0
+        while True:
+            # Phân trang theo khóa, mỗi lô một bulk_update
+            batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', *mapping, *mapping.values())[:BACKFILL_BATCH_SIZE])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for obj in batch:
+                values = {target: normalize(getattr(obj, source)) for source, target in mapping.items()}
+                if any(getattr(obj, target) != value for target, value in values.items()):
+                    for target, value in values.items():
+                        setattr(obj, target, value)
+                    changed.append(obj)
+            model.objects.bulk_update(changed, list(mapping.values()))
+            updated += len(changed)
+    return updated
@@ -27,14 +27,24 @@ urlpatterns = [
     path('contracts/<int:pk>/edit/', views.contract_update, name='contract_edit'),
     path('contracts/<int:pk>/delete/', views.contract_delete, name='contract_delete'),
 
+    path('autocomplete/', views.autocomplete_lookup, name='autocomplete'),
+
     path('reports/', views.reports, name='reports'),
 
    
     path('export/rooms/pdf/', views.export_rooms_pdf, name='export_rooms_pdf'),
     path('export/rooms/excel/', views.export_rooms_excel, name='export_rooms_excel'),
     path('export/students/excel/', views.export_students_excel, name='export_students_excel'),
+    path('export/contracts/excel/', views.export_contracts_excel, name='export_contracts_excel'),
+    path('export/<slug:name>.<slug:fmt>', views.export_stream, name='export_stream'),
+    path('exports/<slug:export_type>.<slug:fmt>/', views.export_job_start, name='export_job_start'),
+    path('exports/jobs/<int:pk>/', views.export_job_status, name='export_job_status'),
+    path('exports/jobs/<int:pk>/progress/', views.export_job_progress, name='export_job_progress'),
+    path('exports/jobs/<int:pk>/download/', views.export_job_download, name='export_job_download'),
 
     path('rooms/<int:room_id>/book/', views.room_booking, name='room_booking'), 
+    path('rooms/availability/', views.room_availability, name='room_availability'),
+    path('reports/forecast/', views.vacancy_forecast, name='vacancy_forecast'),
 
      path('accounts/login/', auth_views.LoginView.as_view(template_name='dormitory/login.html'), name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(next_page='home'), name='logout'),
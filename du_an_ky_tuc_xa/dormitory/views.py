@@ -3,18 +3,16 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from .models import Room, Building, Contract, Student
+from .services import building_statistics, get_overview_stats
 
 def home(request):
-    total_rooms = Room.objects.count()
-    available_rooms = Room.objects.filter(status='available').count()
-    total_buildings = Building.objects.count()
-    active_contracts = Contract.objects.filter(status='active').count()
+    stats = get_overview_stats()
     
     context = {
-        'total_rooms': total_rooms,
-        'available_rooms': available_rooms,
-        'total_buildings': total_buildings,
-        'active_contracts': active_contracts,
+        'total_rooms': stats['rooms']['total'],
+        'available_rooms': stats['rooms']['available'],
+        'total_buildings': stats['total_buildings'],
+        'active_contracts': stats['contracts']['active'],
     }
     return render(request, 'dormitory/home.html', context)
 
@@ -48,9 +46,9 @@ def student_dashboard(request):
             status='active'
         ).first()
         
-        # Lấy danh sách phòng trống
+        # Lấy danh sách phòng còn giường (dùng index status, free_beds)
         available_rooms = Room.objects.filter(
-            status='available'
+            status='available', free_beds__gt=0
         ).select_related('building', 'room_type')
         
         context = {
@@ -98,36 +96,19 @@ def dashboard(request):
     # if request.user.user_type not in ['manager', 'staff']:
     #     return render(request, 'errors/access_denied.html')
     
-    # Thống kê tổng quan
-    total_buildings = Building.objects.count()
-    total_rooms = Room.objects.count()
-    available_rooms = Room.objects.filter(status='available').count()
-    occupied_rooms = Room.objects.filter(status='occupied').count()
-    total_students = Student.objects.count()
-    active_contracts = Contract.objects.filter(status='active').count()
-    
-    # Tính tỷ lệ lấp đầy
-    if total_rooms > 0:
-        occupancy_percentage = (occupied_rooms / total_rooms) * 100
-    else:
-        occupancy_percentage = 0
-    
-    # Phòng sắp hết hợp đồng (trong 30 ngày tới)
-    from datetime import date, timedelta
-    upcoming_expiry = Contract.objects.filter(
-        status='active',
-        end_date__lte=date.today() + timedelta(days=30)
-    ).count()
-    
     # THÊM PHẦN NÀY: THÔNG BÁO THANH TOÁN
+    from datetime import timedelta
     from payment.models import Payment
     from django.utils import timezone
     
     today = timezone.now().date()
     
+    # Thống kê tổng quan (phòng, hợp đồng, thanh toán)
+    stats = get_overview_stats(today)
+    
     # Hóa đơn quá hạn
     overdue_payments = Payment.objects.filter(
-        status='pending', 
+        status__in=Payment.UNPAID_STATUSES, 
         due_date__lt=today
     ).select_related('contract__student', 'contract__room')[:5]  # 5 cái gần nhất
     
@@ -137,23 +118,19 @@ def dashboard(request):
         due_date__range=[today, today + timedelta(days=7)]
     ).select_related('contract__student', 'contract__room')[:5]
     
-    # Thống kê thanh toán
-    total_pending_payments = Payment.objects.filter(status='pending').count()
-    total_overdue_payments = Payment.objects.filter(status='pending', due_date__lt=today).count()
-    
     context = {
         'stats': {
-            'total_buildings': total_buildings,
-            'total_rooms': total_rooms,
-            'available_rooms': available_rooms,
-            'occupied_rooms': occupied_rooms,
-            'occupancy_percentage': occupancy_percentage,
-            'total_students': total_students,
-            'active_contracts': active_contracts,
-            'upcoming_expiry': upcoming_expiry,
+            'total_buildings': stats['total_buildings'],
+            'total_rooms': stats['rooms']['total'],
+            'available_rooms': stats['rooms']['available'],
+            'occupied_rooms': stats['rooms']['occupied'],
+            'occupancy_percentage': stats['rooms']['occupancy_percentage'],
+            'total_students': stats['total_students'],
+            'active_contracts': stats['contracts']['active'],
+            'upcoming_expiry': stats['contracts']['upcoming_expiry'],
             # THÊM THỐNG KÊ THANH TOÁN
-            'total_pending_payments': total_pending_payments,
-            'total_overdue_payments': total_overdue_payments,
+            'total_pending_payments': stats['payments']['pending'],
+            'total_overdue_payments': stats['payments']['overdue'],
         },
         # THÊM THÔNG BÁO
         'overdue_payments': overdue_payments,
@@ -167,7 +144,8 @@ from django.shortcuts import render, get_object_or_404, redirect
 from .forms import RoomForm
 from django.db.models import Q
 # dormitory/views.py - SỬA room_list
-from django.core.paginator import Paginator
+from .pagination import page_query, paginate
+from . import search
 
 def room_list(request):
     """Danh sách phòng với tìm kiếm và phân trang"""
@@ -175,20 +153,18 @@ def room_list(request):
     
     # Tìm kiếm
     search_query = request.GET.get('search', '')
+    ordering = ('building_id', 'room_number')
     if search_query:
-        rooms = rooms.filter(
-            Q(room_number__icontains=search_query) |
-            Q(building__name__icontains=search_query) |
-            Q(room_type__name__icontains=search_query)
-        )
+        # Tìm trong chỉ mục full-text, xếp theo độ liên quan (bm25)
+        rooms = search.search_list(rooms, 'room', search_query)
+        ordering = ('search_rank',) + ordering
     
-    # Phân trang - 10 items per page
-    paginator = Paginator(rooms, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Phân trang theo khóa, tập nhỏ vẫn giữ số trang - 10 items per page
+    page_obj = paginate(request, rooms, 10, ordering=ordering)
     
     return render(request, 'dormitory/room_list.html', {
         'page_obj': page_obj,
+        'page_query': page_query(request),
         'search_query': search_query
     })
 
@@ -238,13 +214,12 @@ def building_list(request):
             Q(address__icontains=search_query)
         )
     
-    # Phân trang - 10 items per page
-    paginator = Paginator(buildings, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Phân trang theo khóa, tập nhỏ vẫn giữ số trang - 10 items per page
+    page_obj = paginate(request, buildings, 10, ordering=('pk',))
     
     return render(request, 'dormitory/building_list.html', {
         'page_obj': page_obj,
+        'page_query': page_query(request),
         'search_query': search_query
     })
 def building_create(request):
@@ -286,22 +261,18 @@ def student_list(request):
     students = Student.objects.select_related('user').all()
     
     search_query = request.GET.get('search', '')
+    ordering = ('student_id',)
     if search_query:
-        students = students.filter(
-            Q(student_id__icontains=search_query) |
-            Q(full_name__icontains=search_query) |
-            Q(user__username__icontains=search_query) |
-            Q(university__icontains=search_query) |
-            Q(faculty__icontains=search_query)
-        )
+        # Tìm trong chỉ mục full-text, xếp theo độ liên quan (bm25)
+        students = search.search_list(students, 'student', search_query)
+        ordering = ('search_rank',) + ordering
     
-    # Phân trang - 10 items per page
-    paginator = Paginator(students, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Phân trang theo khóa, tập nhỏ vẫn giữ số trang - 10 items per page
+    page_obj = paginate(request, students, 10, ordering=ordering)
     
     return render(request, 'dormitory/student_list.html', {
         'page_obj': page_obj,
+        'page_query': page_query(request),
         'search_query': search_query
     })
 def student_create(request):
@@ -344,22 +315,18 @@ def contract_list(request):
     contracts = Contract.objects.select_related('student', 'room').all()
     
     search_query = request.GET.get('search', '')
+    ordering = ('-pk',)
     if search_query:
-        contracts = contracts.filter(
-            Q(contract_number__icontains=search_query) |
-            Q(student__student_id__icontains=search_query) |
-            Q(student__full_name__icontains=search_query) |
-            Q(room__room_number__icontains=search_query) |
-            Q(room__building__name__icontains=search_query)
-        )
+        # Tìm trong chỉ mục full-text, xếp theo độ liên quan (bm25)
+        contracts = search.search_list(contracts, 'contract', search_query)
+        ordering = ('search_rank',) + ordering
     
-    # Phân trang - 10 items per page
-    paginator = Paginator(contracts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Phân trang theo khóa, tập nhỏ vẫn giữ số trang - 10 items per page
+    page_obj = paginate(request, contracts, 10, ordering=ordering)
     
     return render(request, 'dormitory/contract_list.html', {
         'page_obj': page_obj,
+        'page_query': page_query(request),
         'search_query': search_query
     })
 def contract_create(request):
@@ -394,56 +361,43 @@ def contract_delete(request, pk):
     return render(request, 'dormitory/contract_confirm_delete.html', {'contract': contract})
 
 # dormitory/views.py
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.http import urlencode
+from . import autocomplete
+
+AUTOCOMPLETE_URLS = {'student': 'student_edit', 'room': 'room_edit'}
+
+@login_required
+def autocomplete_lookup(request):
+    """Gợi ý sinh viên / phòng theo tiền tố (mã SV, họ tên, tòa nhà + số phòng) dạng JSON"""
+    if request.user.user_type == 'student':
+        return JsonResponse({'error': 'Không có quyền truy cập'}, status=403)
+    
+    kind = request.GET.get('type') or None
+    if kind not in (None, 'student', 'room'):
+        return JsonResponse({'error': 'type phải là student hoặc room'}, status=400)
+    try:
+        limit = min(int(request.GET.get('limit', autocomplete.RESULT_LIMIT)), 50)
+    except ValueError:
+        limit = autocomplete.RESULT_LIMIT
+    
+    results = autocomplete.suggest(request.GET.get('q', ''), kind=kind, limit=limit)
+    for result in results:
+        result['url'] = reverse(AUTOCOMPLETE_URLS[result['type']], args=[result['id']])
+    return JsonResponse({'results': results})
+
+
 def reports(request):
     """Trang báo cáo thống kê"""
-    # Thống kê phòng
-    total_rooms = Room.objects.count()
-    occupied_rooms = Room.objects.filter(status='occupied').count()
+    stats = get_overview_stats()
     
-    # Tính tỷ lệ lấp đầy
-    if total_rooms > 0:
-        occupancy_percentage = (occupied_rooms / total_rooms) * 100
-    else:
-        occupancy_percentage = 0
-    
-    room_stats = {
-        'total': total_rooms,
-        'available': Room.objects.filter(status='available').count(),
-        'occupied': occupied_rooms,
-        'maintenance': Room.objects.filter(status='maintenance').count(),
-        'occupancy_percentage': occupancy_percentage,  # Thêm tỷ lệ phần trăm
-    }
+    # Thống kê phòng (kèm tỷ lệ lấp đầy) và hợp đồng
+    room_stats = stats['rooms']
+    contract_stats = stats['contracts']
     
-    # Thống kê hợp đồng
-    from datetime import date, timedelta
-    contract_stats = {
-        'active': Contract.objects.filter(status='active').count(),
-        'expired': Contract.objects.filter(status='expired').count(),
-        'upcoming_expiry': Contract.objects.filter(
-            status='active',
-            end_date__lte=date.today() + timedelta(days=30)
-        ).count(),
-    }
-    
-    # Thống kê theo tòa nhà
-    building_stats = []
-    for building in Building.objects.all():
-        building_total = building.room_set.count()
-        building_occupied = building.room_set.filter(status='occupied').count()
-        
-        # Tính tỷ lệ lấp đầy cho từng tòa nhà
-        if building_total > 0:
-            building_occupancy_rate = (building_occupied / building_total) * 100
-        else:
-            building_occupancy_rate = 0
-        
-        building_stats.append({
-            'name': building.name,
-            'total_rooms': building_total,
-            'occupied_rooms': building_occupied,
-            'occupancy_rate': building_occupancy_rate,  # Tỷ lệ phần trăm
-            'available_rooms': building_total - building_occupied,  # Phòng trống
-        })
+    # Thống kê theo tòa nhà (một truy vấn GROUP BY)
+    building_stats = building_statistics()
     
     context = {
         'room_stats': room_stats,
@@ -453,123 +407,137 @@ def reports(request):
     return render(request, 'dormitory/reports.html', context)
 
 
-import io
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from openpyxl import Workbook
+from django.http import FileResponse, Http404
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from . import export_jobs, exports
+from .models import ExportJob
 from django.utils import timezone
+@login_required
 def export_rooms_pdf(request):
-    """Xuất danh sách phòng PDF"""
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="danh_sach_phong.pdf"'
-    
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    
-    # Tiêu đề
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(100, 750, "DANH SÁCH PHÒNG - KÝ TÚC XÁ")
-    p.setFont("Helvetica", 10)
-    p.drawString(100, 730, f"Ngày xuất: {timezone.now().strftime('%d/%m/%Y %H:%M')}")
-    
-    # Header table
-    p.setFont("Helvetica-Bold", 10)
-    p.drawString(50, 700, "Mã phòng")
-    p.drawString(120, 700, "Tòa nhà")
-    p.drawString(200, 700, "Loại phòng")
-    p.drawString(300, 700, "Tầng")
-    p.drawString(350, 700, "Trạng thái")
-    
-    # Dữ liệu
-    rooms = Room.objects.select_related('building', 'room_type').all()
-    y = 680
-    p.setFont("Helvetica", 9)
-    
-    for room in rooms:
-        if y < 100:  # Tạo trang mới nếu hết chỗ
-            p.showPage()
-            y = 750
-            # Vẽ header lại cho trang mới
-            p.setFont("Helvetica-Bold", 10)
-            p.drawString(50, 750, "Mã phòng")
-            p.drawString(120, 750, "Tòa nhà")
-            p.drawString(200, 750, "Loại phòng")
-            p.drawString(300, 750, "Tầng")
-            p.drawString(350, 750, "Trạng thái")
-            p.setFont("Helvetica", 9)
-            y = 730
-        
-        p.drawString(50, y, room.room_number)
-        p.drawString(120, y, room.building.name)
-        p.drawString(200, y, room.room_type.name)
-        p.drawString(300, y, str(room.floor))
-        p.drawString(350, y, room.get_status_display())
-        y -= 20
-    
-    p.save()
-    pdf = buffer.getvalue()
-    buffer.close()
-    response.write(pdf)
+    """Xuất danh sách phòng PDF qua job nền; dữ liệu chưa đổi thì trả lại ngay file đã dựng"""
+    if request.user.user_type == 'student':
+        messages.error(request, "Bạn không có quyền xuất dữ liệu!")
+        return redirect('room_list')
+    
+    job, _ = export_jobs.submit('rooms', 'pdf', request.GET, request.user)
+    if job.status != 'done':
+        return redirect('export_job_status', pk=job.pk)
+    
+    # dedupe_key gồm cả dấu vân tay dữ liệu nên dùng được làm ETag
+    etag = quote_etag(job.dedupe_key)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(job.file.open('rb'), as_attachment=True,
+                                filename='danh_sach_phong.pdf', content_type='application/pdf')
+        response['ETag'] = etag
     return response
 
+@login_required
 def export_rooms_excel(request):
-    """Xuất danh sách phòng Excel"""
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="danh_sach_phong.xlsx"'
-    
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Danh sách phòng"
-    
-    # Header
-    headers = ['Mã phòng', 'Tòa nhà', 'Loại phòng', 'Sức chứa', 'Giá thuê', 'Tầng', 'Trạng thái']
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col, value=header)
+    """Xuất danh sách phòng Excel (write-only, stream từ file tạm)"""
+    if request.user.user_type == 'student':
+        messages.error(request, "Bạn không có quyền xuất dữ liệu!")
+        return redirect('room_list')
     
-    # Dữ liệu
-    rooms = Room.objects.select_related('building', 'room_type').all()
-    for row, room in enumerate(rooms, 2):
-        ws.cell(row=row, column=1, value=room.room_number)
-        ws.cell(row=row, column=2, value=room.building.name)
-        ws.cell(row=row, column=3, value=room.room_type.name)
-        ws.cell(row=row, column=4, value=room.room_type.capacity)
-        ws.cell(row=row, column=5, value=float(room.room_type.price_per_month))
-        ws.cell(row=row, column=6, value=room.floor)
-        ws.cell(row=row, column=7, value=room.get_status_display())
-    
-    wb.save(response)
-    return response
+    return exports.xlsx_response(exports.ROOMS)
 
+@login_required
 def export_students_excel(request):
-    """Xuất danh sách sinh viên Excel"""
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="danh_sach_sinh_vien.xlsx"'
+    """Xuất danh sách sinh viên Excel (write-only, stream từ file tạm)"""
+    if request.user.user_type == 'student':
+        messages.error(request, "Bạn không có quyền xuất dữ liệu!")
+        return redirect('student_list')
     
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Danh sách sinh viên"
+    return exports.xlsx_response(exports.STUDENTS)
+
+@login_required
+def export_contracts_excel(request):
+    """Xuất danh sách hợp đồng Excel (write-only, stream từ file tạm)"""
+    if request.user.user_type == 'student':
+        messages.error(request, "Bạn không có quyền xuất dữ liệu!")
+        return redirect('contract_list')
     
-    # Header
-    headers = ['Mã SV', 'Họ tên', 'Ngày sinh', 'Email', 'Trường', 'Khoa', 'Khóa học']
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col, value=header)
+    return exports.xlsx_response(exports.CONTRACTS)
+
+@login_required
+def export_job_start(request, export_type, fmt):
+    """Tạo (hoặc gộp vào) job xuất chạy nền rồi chuyển tới trang theo dõi"""
+    if request.user.user_type == 'student':
+        messages.error(request, "Bạn không có quyền xuất dữ liệu!")
+        return redirect('home')
+    if not export_jobs.supports(export_type, fmt):
+        raise Http404("Không có bảng xuất này")
     
-    # Dữ liệu
-    students = Student.objects.select_related('user').all()
-    for row, student in enumerate(students, 2):
-        ws.cell(row=row, column=1, value=student.student_id)
-        ws.cell(row=row, column=2, value=student.full_name or student.user.get_full_name())
-        ws.cell(row=row, column=3, value=student.date_of_birth.strftime('%d/%m/%Y') if student.date_of_birth else '')
-        ws.cell(row=row, column=4, value=student.user.email)
-        ws.cell(row=row, column=5, value=student.university)
-        ws.cell(row=row, column=6, value=student.faculty)
-        ws.cell(row=row, column=7, value=student.course)
-    
-    wb.save(response)
-    return response
+    job, _ = export_jobs.submit(export_type, fmt, request.GET, request.user)
+    return redirect('export_job_status', pk=job.pk)
+
+def _export_job(request, pk):
+    if request.user.user_type == 'student':
+        raise Http404("Không có job xuất này")
+    return get_object_or_404(ExportJob, pk=pk)
+
+@login_required
+def export_job_status(request, pk):
+    """Trang theo dõi job xuất, tự hỏi tiến độ qua export_job_progress"""
+    job = _export_job(request, pk)
+    state = {'queued': 'running', 'running': 'running'}.get(job.status, 'ready' if job.status == 'done' else 'failed')
+    return render(request, 'dormitory/export_status.html', {
+        'title': f"{job.export_type} ({job.get_format_display()})",
+        'state': state,
+        'job': job,
+        'progress_url': reverse('export_job_progress', args=[job.pk]),
+        'download_url': reverse('export_job_download', args=[job.pk]),
+        'retry_url': f"{reverse('export_job_start', args=[job.export_type, job.format])}?{urlencode(job.filters)}",
+    })
+
+@login_required
+def export_job_progress(request, pk):
+    """Tiến độ job dạng JSON để trang theo dõi (hoặc công cụ khác) hỏi định kỳ"""
+    job = _export_job(request, pk)
+    return JsonResponse({
+        'status': job.status,
+        'rows_processed': job.rows_processed,
+        'total_rows': job.total_rows,
+        'percent': job.percent,
+        'download_url': reverse('export_job_download', args=[job.pk]) if job.status == 'done' else None,
+        'error': job.error,
+    })
+
+@login_required
+def export_job_download(request, pk):
+    """Tải file của job đã xong và chưa hết hạn"""
+    job = _export_job(request, pk)
+    if job.status != 'done' or not job.file:
+        return redirect('export_job_status', pk=job.pk)
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=f'{job.export_type}.{job.format}')
+
+# Bảng xuất CSV / NDJSON: dataset và loại tài liệu dùng cho ô tìm kiếm
+STREAM_EXPORTS = {
+    'rooms': (exports.ROOMS, 'room'),
+    'students': (exports.STUDENTS, 'student'),
+    'contracts': (exports.CONTRACTS, 'contract'),
+}
+
+@login_required
+def export_stream(request, name, fmt):
+    """Xuất CSV / NDJSON cho công cụ BI, lọc theo ?search= như danh sách"""
+    if request.user.user_type == 'student':
+        messages.error(request, "Bạn không có quyền xuất dữ liệu!")
+        return redirect('home')
+    if name not in STREAM_EXPORTS or fmt not in exports.STREAM_CONTENT_TYPES:
+        raise Http404("Không có bảng xuất này")
+    
+    dataset, kind = STREAM_EXPORTS[name]
+    queryset = dataset.queryset()
+    search_query = request.GET.get('search', '')
+    if search_query:
+        queryset = search.search_list(queryset, kind, search_query)
+    return exports.stream_response(request, dataset, fmt, queryset)
 
 # dormitory/views.py
+from .booking import BookingError, book_room
+
 @login_required
 def room_booking(request, room_id):
     """Đăng ký phòng cho sinh viên"""
@@ -577,7 +545,7 @@ def room_booking(request, room_id):
         messages.error(request, "Chỉ sinh viên mới có thể đăng ký phòng!")
         return redirect('home')
     
-    room = get_object_or_404(Room, pk=room_id, status='available')
+    room = get_object_or_404(Room, pk=room_id, status='available', free_beds__gt=0)
     student = request.user.student
     
     # Kiểm tra sinh viên đã có hợp đồng active chưa
@@ -587,22 +555,12 @@ def room_booking(request, room_id):
         return redirect('student_dashboard')
     
     if request.method == 'POST':
-        # Tạo hợp đồng mới
-        from datetime import date, timedelta
-        
-        contract = Contract.objects.create(
-            contract_number=f"CT{date.today().strftime('%Y%m%d')}{student.student_id}",
-            student=student,
-            room=room,
-            start_date=date.today(),
-            end_date=date.today() + timedelta(days=365),  # 1 năm
-            deposit=room.room_type.price_per_month,  # Cọc 1 tháng
-            status='active'
-        )
-        
-        # Cập nhật trạng thái phòng
-        room.status = 'occupied'
-        room.save()
+        # Giữ phòng và tạo hợp đồng trong một giao dịch, an toàn khi nhiều người đăng ký cùng lúc
+        try:
+            book_room(student, room.pk)
+        except BookingError as exc:
+            messages.error(request, str(exc))
+            return redirect('student_dashboard')
         
         messages.success(request, f"✅ Đã đăng ký thành công phòng {room.room_number}!")
         return redirect('student_dashboard')
@@ -610,4 +568,92 @@ def room_booking(request, room_id):
     return render(request, 'dormitory/room_booking.html', {
         'room': room,
         'student': student
-    })
\ No newline at end of file
+    })
+
+# dormitory/views.py
+from django.db.models import F
+from .availability import available_rooms
+from .forms import AvailabilityForm
+
+@login_required
+def room_availability(request):
+    """Phòng còn giường trong một khoảng ngày; ?format=json trả về danh sách cho API"""
+    as_json = request.GET.get('format') == 'json'
+    if request.user.user_type == 'student':
+        if as_json:
+            return JsonResponse({'error': 'Không có quyền truy cập'}, status=403)
+        messages.error(request, "Bạn không có quyền truy cập trang này")
+        return redirect('home')
+    
+    form = AvailabilityForm(request.GET or None)
+    if not form.is_valid():
+        if as_json:
+            return JsonResponse({'errors': form.errors}, status=400)
+        return render(request, 'dormitory/room_availability.html', {'form': form})
+    
+    rooms = available_rooms(
+        form.cleaned_data['start_date'],
+        form.cleaned_data['end_date'],
+        min_beds=form.cleaned_data['min_beds'] or 1,
+        building=form.cleaned_data['building'],
+        room_type=form.cleaned_data['room_type'],
+    )
+    if as_json:
+        results = rooms.order_by('building__name', 'room_number').values(
+            'id', 'room_number', 'floor', 'period_free_beds',
+            building_name=F('building__name'), room_type_name=F('room_type__name'),
+            capacity=F('room_type__capacity'), price_per_month=F('room_type__price_per_month'),
+        )
+        results = list(results)
+        for room in results:
+            # Không đặt tên free_beds trong values(): trùng tên cột số giường trống hiện tại
+            room['free_beds'] = room.pop('period_free_beds')
+        return JsonResponse({
+            'start_date': form.cleaned_data['start_date'],
+            'end_date': form.cleaned_data['end_date'],
+            'results': results,
+        })
+    
+    rooms = rooms.select_related('building', 'room_type')
+    page_obj = paginate(request, rooms, ordering=('building_id', 'room_number'))
+    return render(request, 'dormitory/room_availability.html', {
+        'form': form,
+        'page_obj': page_obj,
+        'page_query': page_query(request),
+    })
+
+# dormitory/views.py
+from datetime import timedelta
+from . import forecast
+
+# Các mốc hiển thị trên thẻ tổng quan của trang dự báo (số ngày kể từ hôm nay)
+FORECAST_MILESTONES = (0, 30, 90, 180, 364)
+
+@login_required
+def vacancy_forecast(request):
+    """Dự báo giường trống từng ngày trong 12 tháng tới; ?format=json trả về chuỗi theo ngày"""
+    as_json = request.GET.get('format') == 'json'
+    if request.user.user_type == 'student':
+        if as_json:
+            return JsonResponse({'error': 'Không có quyền truy cập'}, status=403)
+        messages.error(request, "Bạn không có quyền truy cập trang này")
+        return redirect('home')
+    
+    result = forecast.get_forecast()
+    if as_json:
+        return JsonResponse(result)
+    
+    milestones = [
+        (result['start'] + timedelta(days=offset), result['total'][offset])
+        for offset in FORECAST_MILESTONES if offset < result['days']
+    ]
+    rows = [
+        {**group, 'months': forecast.monthly_minimum(result, group['free'])}
+        for group in result['groups']
+    ]
+    return render(request, 'dormitory/vacancy_forecast.html', {
+        'forecast': result,
+        'milestones': milestones,
+        'rows': rows,
+        'total_months': forecast.monthly_minimum(result, result['total']),
+    })
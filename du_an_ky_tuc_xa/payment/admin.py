@@ -1,7 +1,7 @@
 # payment/admin.py
 from django.contrib import admin
-from .models import Payment
-from .services import send_payment_reminder
+from .models import BillingRun, EmailOutbox, Payment
+from .services import enqueue_payment_reminders
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -11,15 +11,24 @@ class PaymentAdmin(admin.ModelAdmin):
     actions = ['send_reminder_email']
     
     def send_reminder_email(self, request, queryset):
-        """Action để gửi email nhắc nhở"""
-        success_count = 0
-        for payment in queryset:
-            if send_payment_reminder(payment, request):
-                success_count += 1
+        """Action để gửi email nhắc nhở - chỉ xếp vào hàng đợi, worker process_outbox sẽ gửi"""
+        queued = enqueue_payment_reminders(queryset, request)
         
-        if success_count > 0:
-            self.message_user(request, f'✅ Đã gửi {success_count} email nhắc nhở thành công!')
+        if queued > 0:
+            self.message_user(request, f'✅ Đã xếp {queued} email nhắc nhở vào hàng đợi!')
         else:
-            self.message_user(request, '❌ Gửi email thất bại!')
+            self.message_user(request, '❌ Không có email nào để gửi!')
     
-    send_reminder_email.short_description = '📧 Gửi email nhắc nhở'
\ No newline at end of file
+    send_reminder_email.short_description = '📧 Gửi email nhắc nhở'
+
+@admin.register(BillingRun)
+class BillingRunAdmin(admin.ModelAdmin):
+    list_display = ['billing_period', 'building', 'status', 'bills_created', 'last_contract_id', 'updated_at']
+    list_filter = ['billing_period', 'status']
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['recipient', 'subject']
@@ -0,0 +1,188 @@
+# payment/billing.py
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection, connections, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from dormitory import counters
+from dormitory.models import Contract
+from .models import BillingRun, Payment
+
+BATCH_SIZE = 500
+
+
+def billing_period_for(day):
+    """Khóa kỳ thu tiền dạng YYYY-MM"""
+    return day.strftime('%Y-%m')
+
+
+@contextmanager
+def count_queries():
+    """Đếm số truy vấn SQL chạy trong khối lệnh"""
+    counter = {'queries': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def contracts_to_bill(period, today):
+    """Hợp đồng đang hoạt động chưa có hóa đơn của kỳ, kèm giá phòng (một truy vấn JOIN)"""
+    already_billed = Payment.objects.filter(contract=OuterRef('pk'), billing_period=period)
+    return (
+        Contract.objects
+        .filter(status='active', end_date__gte=today)
+        .filter(~Exists(already_billed))
+        .order_by('pk')
+        .values_list('pk', 'room__room_type__price_per_month')
+    )
+
+
+def billing_partitions(today):
+    """Danh sách tòa nhà có hợp đồng đang hoạt động - mỗi tòa là một phân vùng"""
+    return list(
+        Contract.objects
+        .filter(status='active', end_date__gte=today)
+        .order_by('room__building_id')
+        .values_list('room__building_id', flat=True)
+        .distinct()
+    )
+
+
+def _write_chunk(run, chunk, last_pk, period, due_date, notes):
+    """Ghi hóa đơn của một lô cùng checkpoint trong một giao dịch, trả về số hóa đơn thật sự thêm.
+
+    Câu đầu tiên của giao dịch là UPDATE checkpoint: SQLite giữ khóa ghi ngay từ đầu nên
+    các worker khác chờ theo busy timeout. Nếu giao dịch đọc trước rồi mới ghi, SQLite trả
+    'database is locked' ngay khi worker khác đang giữ khóa ghi.
+    """
+    # Lần chạy chồng có thể đã tạo một phần hóa đơn của lô; ignore_conflicts bỏ qua
+    # chúng nên đếm số dòng thật sự thêm bằng cách đếm trước và sau khi ghi
+    billed = Payment.objects.filter(billing_period=period, contract_id__in=[pk for pk, _ in chunk])
+    with transaction.atomic():
+        BillingRun.objects.filter(pk=run.pk).update(last_contract_id=last_pk, updated_at=timezone.now())
+        existing = billed.count()
+        Payment.objects.bulk_create(
+            [
+                Payment(
+                    contract_id=contract_id,
+                    amount=price,
+                    payment_method='bank_transfer',
+                    status='pending',
+                    due_date=due_date,
+                    billing_period=period,
+                    notes=notes,
+                )
+                for contract_id, price in chunk
+            ],
+            ignore_conflicts=True,
+        )
+        created = billed.count() - existing
+        # bulk_create không gửi signal nên tự cập nhật bộ đếm
+        counters.bump(counters.payment_counter('pending'), created)
+        BillingRun.objects.filter(pk=run.pk).update(bills_created=F('bills_created') + created)
+    return created
+
+
+def run_partition(today, building_id, batch_size=BATCH_SIZE, dry_run=False):
+    """Tạo hóa đơn tháng cho các hợp đồng thuộc một tòa nhà.
+
+    Mỗi lô bulk_create được commit cùng với checkpoint trong BillingRun, nên khi
+    bị ngắt giữa chừng, lần chạy sau tiếp tục từ hợp đồng cuối cùng đã xử lý.
+    Phân vùng lỗi giữa chừng được đánh dấu 'failed'; phân vùng đã hoàn tất thì chạy lại từ đầu.
+    Với dry_run chỉ đếm số hóa đơn sẽ tạo, không ghi gì.
+    """
+    period = billing_period_for(today)
+    due_date = today + timedelta(days=30)
+    notes = f"Hóa đơn thuê phòng tháng {today.month}/{today.year}"
+    result = {'building_id': building_id, 'bills_created': 0}
+
+    with count_queries() as counter:
+        pending = contracts_to_bill(period, today).filter(room__building_id=building_id)
+
+        if dry_run:
+            result['bills_created'] = pending.count()
+            result['queries'] = counter['queries']
+            return result
+
+        # Checkpoint chỉ dùng để chạy tiếp lần bị ngắt. Phân vùng đã xong quét lại từ đầu
+        # vì hợp đồng có pk nhỏ hơn có thể cần thu tiền sau đó (kích hoạt lại, chuyển tòa);
+        # anti-join đã loại các hợp đồng có hóa đơn nên quét lại không tạo trùng
+        run, _ = BillingRun.objects.get_or_create(billing_period=period, building_id=building_id)
+        last_pk = run.last_contract_id
+        if run.status == 'done':
+            last_pk = 0
+        BillingRun.objects.filter(pk=run.pk).update(
+            status='running', last_contract_id=last_pk, finished_at=None, updated_at=timezone.now(),
+        )
+        try:
+            while True:
+                # Phân trang theo khóa để không giữ cả tập kết quả trong bộ nhớ
+                chunk = list(pending.filter(pk__gt=last_pk)[:batch_size])
+                if not chunk:
+                    break
+                last_pk = chunk[-1][0]
+                created = _write_chunk(run, chunk, last_pk, period, due_date, notes)
+                result['bills_created'] += created
+        except Exception:
+            # Lần chạy sau tiếp tục từ checkpoint của lô cuối cùng đã commit
+            BillingRun.objects.filter(pk=run.pk).update(status='failed', updated_at=timezone.now())
+            raise
+
+        BillingRun.objects.filter(pk=run.pk).update(status='done', finished_at=timezone.now())
+
+    result['queries'] = counter['queries']
+    return result
+
+
+def _init_worker():
+    """Khởi tạo Django trong tiến trình con, không dùng lại kết nối DB của tiến trình cha"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def generate_monthly_bills(today=None, batch_size=BATCH_SIZE, workers=1, dry_run=False):
+    """Tạo hóa đơn tháng cho mọi hợp đồng cần thu tiền, chia phân vùng theo tòa nhà.
+
+    Chạy lại hoặc chạy chồng nhau đều an toàn: hợp đồng đã có hóa đơn của kỳ bị loại
+    bằng anti-join, và ràng buộc (contract, billing_period) chặn bản ghi trùng.
+    Với workers > 1 các phân vùng chạy song song trong một process pool.
+    """
+    today = today or timezone.now().date()
+    started = time.monotonic()
+
+    with count_queries() as counter:
+        building_ids = billing_partitions(today)
+
+    if workers > 1 and len(building_ids) > 1:
+        # Tiến trình con phải mở kết nối riêng
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            partitions = list(pool.map(
+                run_partition,
+                [today] * len(building_ids),
+                building_ids,
+                [batch_size] * len(building_ids),
+                [dry_run] * len(building_ids),
+            ))
+    else:
+        partitions = [run_partition(today, building_id, batch_size, dry_run) for building_id in building_ids]
+
+    elapsed = time.monotonic() - started
+    bills_created = sum(p['bills_created'] for p in partitions)
+    return {
+        'period': billing_period_for(today),
+        'partitions': partitions,
+        'bills_created': bills_created,
+        'elapsed': elapsed,
+        'rows_per_second': bills_created / elapsed if elapsed > 0 else 0,
+        'queries': counter['queries'] + sum(p['queries'] for p in partitions),
+    }
@@ -0,0 +1,20 @@
+# payment/exports.py
+from dormitory.exports import Column, Dataset, choice_label, date_vn, money
+from .models import Payment
+
+PAYMENTS = Dataset(
+    'payments', 'Danh sách hóa đơn', 'danh_sach_hoa_don.xlsx',
+    Payment.objects.all,
+    [
+        Column('id', 'Mã hóa đơn'),
+        Column('contract_number', 'Số hợp đồng', 'contract__contract_number'),
+        Column('student_id', 'Mã SV', 'contract__student__student_id'),
+        Column('amount', 'Số tiền', format=money),
+        Column('payment_method', 'Phương thức', format=choice_label(Payment.PAYMENT_METHODS)),
+        Column('status', 'Trạng thái', format=choice_label(Payment.STATUS_CHOICES)),
+        Column('billing_period', 'Kỳ thu'),
+        Column('due_date', 'Hạn thanh toán', format=date_vn),
+        Column('paid_date', 'Ngày thanh toán', format=date_vn),
+        Column('transaction_id', 'Mã giao dịch'),
+    ],
+)
@@ -1,6 +1,8 @@
 # payment/management/commands/check_overdue_payments.py
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.utils import timezone
+from dormitory import counters
 from payment.models import Payment
 
 class Command(BaseCommand):
@@ -8,18 +10,32 @@ class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
         today = timezone.now().date()
-        overdue_payments = Payment.objects.filter(
-            status='pending',
-            due_date__lt=today
+        
+        # Chuyển trạng thái bằng một câu UPDATE duy nhất
+        with transaction.atomic():
+            marked = Payment.objects.filter(
+                status='pending',
+                due_date__lt=today
+            ).update(status='overdue', updated_at=timezone.now())
+            counters.bump(counters.payment_counter('pending'), -marked)
+            counters.bump(counters.payment_counter('overdue'), marked)
+        
+        self.stdout.write(
+            self.style.WARNING(f'⚠️ Đã đánh dấu {marked} hóa đơn quá hạn')
         )
         
-        count = overdue_payments.count()
+        # Báo cáo đọc theo từng khối, JOIN sẵn mã sinh viên
+        overdue_payments = Payment.objects.filter(
+            status='overdue'
+        ).order_by('due_date', 'pk').values_list(
+            'id', 'contract__student__student_id', 'amount'
+        ).iterator(chunk_size=2000)
+        
+        count = 0
+        for payment_id, student_id, amount in overdue_payments:
+            self.stdout.write(f'   - HĐ #{payment_id}: {student_id} - {amount} VNĐ')
+            count += 1
         
         self.stdout.write(
             self.style.WARNING(f'⚠️ Có {count} hóa đơn quá hạn')
         )
-        
-        for payment in overdue_payments:
-            self.stdout.write(
-                f'   - HĐ #{payment.id}: {payment.contract.student.student_id} - {payment.amount} VNĐ'
-            )
\ No newline at end of file
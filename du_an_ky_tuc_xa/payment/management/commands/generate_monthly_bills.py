@@ -1,45 +1,47 @@
 # payment/management/commands/generate_monthly_bills.py
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from datetime import timedelta
-from payment.models import Payment
-from dormitory.models import Contract
+from dormitory.models import Building
+from payment.billing import BATCH_SIZE, generate_monthly_bills
 
 class Command(BaseCommand):
     help = 'Tạo hóa đơn thuê phòng hàng tháng'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Số hóa đơn mỗi lần bulk_create')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Số tiến trình chạy song song, mỗi tòa nhà là một phân vùng')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Chỉ báo cáo số hóa đơn sẽ tạo, không ghi dữ liệu')
+
+    def handle(self, *args, **options):
         today = timezone.now().date()
-        next_month = today + timedelta(days=30)
-        
-        # Lấy các hợp đồng đang active
-        active_contracts = Contract.objects.filter(
-            status='active',
-            end_date__gte=today  # Chưa hết hạn
+        dry_run = options['dry_run']
+        result = generate_monthly_bills(
+            today,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            dry_run=dry_run,
         )
-        
-        bills_created = 0
-        
-        for contract in active_contracts:
-            # Kiểm tra xem đã có hóa đơn tháng này chưa
-            existing_bill = Payment.objects.filter(
-                contract=contract,
-                due_date__year=today.year,
-                due_date__month=today.month
-            ).exists()
-            
-            if not existing_bill:
-                # Tạo hóa đơn mới
-                Payment.objects.create(
-                    contract=contract,
-                    amount=contract.room.room_type.price_per_month,
-                    payment_method='bank_transfer',
-                    status='pending',
-                    due_date=next_month,
-                    notes=f"Hóa đơn thuê phòng tháng {today.month}/{today.year}"
-                )
-                bills_created += 1
-        
+
+        buildings = dict(Building.objects.values_list('id', 'name'))
+        for partition in result['partitions']:
+            name = buildings.get(partition['building_id'], partition['building_id'])
+            if dry_run:
+                self.stdout.write(f'   - {name}: sẽ tạo {partition["bills_created"]} hóa đơn')
+            else:
+                self.stdout.write(f'   - {name}: đã tạo {partition["bills_created"]} hóa đơn')
+
+        if dry_run:
+            self.stdout.write(
+                self.style.WARNING(f'🧪 Chạy thử: sẽ tạo {result["bills_created"]} hóa đơn tháng {today.month}/{today.year}')
+            )
+            return
+
         self.stdout.write(
-            self.style.SUCCESS(f'✅ Đã tạo {bills_created} hóa đơn tháng {today.month}/{today.year}')
-        )
\ No newline at end of file
+            self.style.SUCCESS(f'✅ Đã tạo {result["bills_created"]} hóa đơn tháng {today.month}/{today.year}')
+        )
+        self.stdout.write(
+            f'⏱️ {result["elapsed"]:.2f}s • {result["rows_per_second"]:.0f} hóa đơn/giây • {result["queries"]} truy vấn'
+        )
@@ -0,0 +1,45 @@
+# payment/management/commands/process_outbox.py
+import time
+from django.core.management.base import BaseCommand
+from payment.services import OUTBOX_MAX_ATTEMPTS, REMINDER_BATCH_SIZE, outbox_worker_id, process_outbox_batch
+
+class Command(BaseCommand):
+    help = 'Gửi email trong hàng đợi (có thể chạy nhiều worker cùng lúc)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE,
+                            help='Số email nhận mỗi lô')
+        parser.add_argument('--max-attempts', type=int, default=OUTBOX_MAX_ATTEMPTS,
+                            help='Số lần thử tối đa trước khi đánh dấu thất bại')
+        parser.add_argument('--rate-limit', type=float, default=None,
+                            help='Số email tối đa mỗi giây')
+        parser.add_argument('--loop', action='store_true',
+                            help='Chạy liên tục, chờ email mới khi hàng đợi trống')
+        parser.add_argument('--sleep', type=float, default=5,
+                            help='Số giây chờ khi hàng đợi trống (dùng với --loop)')
+
+    def handle(self, *args, **options):
+        worker_id = outbox_worker_id()
+        total_sent = total_failed = 0
+
+        while True:
+            result = process_outbox_batch(
+                worker_id,
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+                rate_limit=options['rate_limit'],
+            )
+            if result is None:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            sent, failed = result
+            total_sent += sent
+            total_failed += failed
+            self.stdout.write(f'📧 Lô mới: {sent} đã gửi, {failed} lỗi')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Đã gửi {total_sent} email, {total_failed} email lỗi sẽ thử lại hoặc đã thất bại')
+        )
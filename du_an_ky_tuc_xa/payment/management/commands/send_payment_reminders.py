@@ -3,13 +3,34 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from payment.models import Payment
-from payment.services import send_payment_reminder
+from payment.services import (
+    exclude_recently_reminded, record_reminders, send_payment_reminders, send_reminder_digests,
+)
 
 class Command(BaseCommand):
     help = 'Gửi email nhắc nhở thanh toán cho hóa đơn sắp hết hạn'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Số email gửi qua một kết nối mỗi lần')
+        parser.add_argument('--rate-limit', type=float, default=None,
+                            help='Số email tối đa mỗi giây')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Số kết nối SMTP song song')
+        parser.add_argument('--digest', action='store_true',
+                            help='Gửi một email cho mỗi sinh viên, liệt kê tất cả hóa đơn cần nhắc')
+
+    def handle(self, *args, **options):
         today = timezone.now().date()
+        dispatch_options = {
+            'batch_size': options['batch_size'],
+            'rate_limit': options['rate_limit'],
+            'workers': options['workers'],
+        }
+        
+        if options['digest']:
+            self.send_digests(today, dispatch_options)
+            return
         
         # Hóa đơn sắp hết hạn (3 ngày tới)
         upcoming_payments = Payment.objects.filter(
@@ -20,24 +41,44 @@ class Command(BaseCommand):
         
         # Hóa đơn quá hạn
         overdue_payments = Payment.objects.filter(
-            status='pending',
+            status__in=Payment.UNPAID_STATUSES,
             due_date__lt=today
         )
         
         emails_sent = 0
         
-        # Gửi cho hóa đơn sắp hết hạn
-        for payment in upcoming_payments:
-            if send_payment_reminder(payment):
-                self.stdout.write(f'✅ Đã gửi nhắc nhở HĐ #{payment.id} cho {payment.contract.student.student_id}')
-                emails_sent += 1
-        
-        # Gửi cho hóa đơn quá hạn
-        for payment in overdue_payments:
-            if send_payment_reminder(payment):
-                self.stdout.write(f'⚠️ Đã gửi cảnh báo quá hạn HĐ #{payment.id} cho {payment.contract.student.student_id}')
-                emails_sent += 1
+        for payments, label in ((upcoming_payments, '✅ Đã gửi nhắc nhở'), (overdue_payments, '⚠️ Đã gửi cảnh báo quá hạn')):
+            # Bỏ các hóa đơn vừa được nhắc trong thời gian chờ
+            payments = list(exclude_recently_reminded(payments, today).select_related('contract__student__user'))
+            results = send_payment_reminders(payments, **dispatch_options)
+            record_reminders(payments, results, today)
+            for payment in payments:
+                result = results[payment.id]
+                if result['sent']:
+                    self.stdout.write(f'{label} HĐ #{payment.id} cho {payment.contract.student.student_id}')
+                    emails_sent += 1
+                else:
+                    self.stdout.write(self.style.ERROR(f'❌ HĐ #{payment.id}: {result["error"]}'))
         
         self.stdout.write(
             self.style.SUCCESS(f'✅ Đã gửi {emails_sent} email nhắc nhở')
-        )
\ No newline at end of file
+        )
+
+    def send_digests(self, today, dispatch_options):
+        """Hóa đơn sắp hết hạn và quá hạn lấy trong một truy vấn, gom theo sinh viên"""
+        payments = Payment.objects.filter(
+            status__in=Payment.UNPAID_STATUSES,
+            due_date__lte=today + timedelta(days=3)
+        )
+        results = send_reminder_digests(exclude_recently_reminded(payments, today), **dispatch_options)
+        
+        sent_ids = [payment_id for payment_id, result in results.items() if result['sent']]
+        record_reminders(Payment.objects.filter(pk__in=sent_ids).only('id', 'due_date'), results, today)
+        sent_payments = len(sent_ids)
+        for payment_id, result in results.items():
+            if not result['sent']:
+                self.stdout.write(self.style.ERROR(f'❌ HĐ #{payment_id}: {result["error"]}'))
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'✅ Đã gửi email tổng hợp cho {sent_payments} hóa đơn')
+        )
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:05
+
+import re
+
+from django.db import migrations, models
+
+# Ghi chú của hóa đơn do generate_monthly_bills cũ tạo: "Hóa đơn thuê phòng tháng 10/2026"
+BILL_NOTES = re.compile(r'tháng (\d{1,2})/(\d{4})')
+
+
+def backfill_billing_period(apps, schema_editor):
+    """Gán kỳ thu tiền cho hóa đơn cũ để anti-join của lần tạo hóa đơn đầu tiên thấy chúng.
+
+    Hóa đơn tự động lấy kỳ từ ghi chú; hóa đơn khác lấy tháng của hạn thanh toán, giống
+    điều kiện kiểm tra cũ. Hợp đồng có nhiều hóa đơn cùng kỳ chỉ gán cho hóa đơn đầu tiên.
+    """
+    Payment = apps.get_model('payment', 'Payment')
+    taken, updated = set(), []
+    for payment in Payment.objects.order_by('pk').only('pk', 'contract_id', 'due_date', 'notes').iterator(chunk_size=2000):
+        found = BILL_NOTES.search(payment.notes or '')
+        if found:
+            period = f'{int(found.group(2)):04d}-{int(found.group(1)):02d}'
+        else:
+            period = payment.due_date.strftime('%Y-%m')
+        if (payment.contract_id, period) in taken:
+            continue
+        taken.add((payment.contract_id, period))
+        payment.billing_period = period
+        updated.append(payment)
+    Payment.objects.bulk_update(updated, ['billing_period'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='billing_period',
+            field=models.CharField(blank=True, max_length=7, null=True),
+        ),
+        migrations.RunPython(backfill_billing_period, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='payment',
+            constraint=models.UniqueConstraint(fields=('contract', 'billing_period'), name='unique_payment_billing_period'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dormitory', '0002_student_date_of_birth_student_full_name'),
+        ('payment', '0002_payment_billing_period'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('billing_period', models.CharField(max_length=7)),
+                ('status', models.CharField(choices=[('running', 'Đang chạy'), ('done', 'Hoàn tất')], default='running', max_length=20)),
+                ('last_contract_id', models.BigIntegerField(default=0)),
+                ('bills_created', models.IntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('building', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dormitory.building')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='billingrun',
+            constraint=models.UniqueConstraint(fields=('billing_period', 'building'), name='unique_billing_run_partition'),
+        ),
+    ]
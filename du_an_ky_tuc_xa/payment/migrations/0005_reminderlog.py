@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0004_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('upcoming', 'Sắp đến hạn'), ('overdue', 'Quá hạn')], max_length=10)),
+                ('sent_on', models.DateField()),
+                ('payment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='payment.payment')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='reminderlog',
+            constraint=models.UniqueConstraint(fields=('payment', 'kind', 'sent_on'), name='unique_reminder_log'),
+        ),
+    ]
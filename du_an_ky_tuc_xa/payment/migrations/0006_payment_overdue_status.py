@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-17 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0005_reminderlog'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Chờ thanh toán'), ('overdue', 'Quá hạn'), ('paid', 'Đã thanh toán'), ('cancelled', 'Đã hủy'), ('failed', 'Thất bại')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'due_date'], name='payment_status_due_idx'),
+        ),
+    ]
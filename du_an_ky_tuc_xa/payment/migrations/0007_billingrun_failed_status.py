@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0006_payment_overdue_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='billingrun',
+            name='status',
+            field=models.CharField(choices=[('running', 'Đang chạy'), ('done', 'Hoàn tất'), ('failed', 'Lỗi')], default='running', max_length=20),
+        ),
+    ]
@@ -1,6 +1,7 @@
 # payment/models.py
 from django.db import models
-from dormitory.models import Contract
+from django.utils import timezone
+from dormitory.models import Building, Contract
 
 class Payment(models.Model):
     PAYMENT_METHODS = (
@@ -12,11 +13,15 @@ class Payment(models.Model):
     
     STATUS_CHOICES = (
         ('pending', 'Chờ thanh toán'),
+        ('overdue', 'Quá hạn'),
         ('paid', 'Đã thanh toán'),
         ('cancelled', 'Đã hủy'),
         ('failed', 'Thất bại'),
     )
     
+    # Các trạng thái còn phải thu tiền
+    UNPAID_STATUSES = ('pending', 'overdue')
+    
     contract = models.ForeignKey(Contract, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHODS, default='cash')
@@ -25,9 +30,102 @@ class Payment(models.Model):
     paid_date = models.DateField(null=True, blank=True)
     transaction_id = models.CharField(max_length=100, blank=True)
     notes = models.TextField(blank=True)
+    # Kỳ thu tiền dạng YYYY-MM, chỉ có ở hóa đơn tạo tự động hàng tháng
+    billing_period = models.CharField(max_length=7, null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        constraints = [
+            # Mỗi hợp đồng chỉ có một hóa đơn cho mỗi kỳ thu tiền
+            models.UniqueConstraint(fields=['contract', 'billing_period'], name='unique_payment_billing_period'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='payment_status_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Payment #{self.id} - {self.contract.student.student_id} - {self.amount}"
+
+
+class BillingRun(models.Model):
+    """Điểm kiểm tra (checkpoint) của một phân vùng khi tạo hóa đơn tháng"""
+    STATUS_CHOICES = (
+        ('running', 'Đang chạy'),
+        ('done', 'Hoàn tất'),
+        ('failed', 'Lỗi'),
+    )
+    
+    billing_period = models.CharField(max_length=7)
+    building = models.ForeignKey(Building, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    last_contract_id = models.BigIntegerField(default=0)
+    bills_created = models.IntegerField(default=0)
+    
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['billing_period', 'building'], name='unique_billing_run_partition'),
+        ]
+    
+    def __str__(self):
+        return f"{self.billing_period} - {self.building} - {self.get_status_display()}"
+
+
+
+class ReminderLog(models.Model):
+    """Nhật ký nhắc nhở đã gửi, dùng để không gửi trùng giữa các lần chạy"""
+    KIND_CHOICES = (
+        ('upcoming', 'Sắp đến hạn'),
+        ('overdue', 'Quá hạn'),
+    )
+    
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    sent_on = models.DateField()
+    
+    class Meta:
+        constraints = [
+            # Chỉ mục này cũng phục vụ anti-join (payment, kind, sent_on) khi lọc hóa đơn cần nhắc
+            models.UniqueConstraint(fields=['payment', 'kind', 'sent_on'], name='unique_reminder_log'),
+        ]
+    
+    def __str__(self):
+        return f"HĐ #{self.payment_id} - {self.get_kind_display()} - {self.sent_on}"
+
+
+class EmailOutbox(models.Model):
+    """Email đã render, chờ worker process_outbox gửi đi"""
+    STATUS_CHOICES = (
+        ('pending', 'Chờ gửi'),
+        ('sending', 'Đang gửi'),
+        ('sent', 'Đã gửi'),
+        ('failed', 'Thất bại'),
+    )
+    
+    payment = models.ForeignKey(Payment, on_delete=models.SET_NULL, null=True, blank=True)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+    
     def __str__(self):
-        return f"Payment #{self.id} - {self.contract.student.student_id} - {self.amount}"
\ No newline at end of file
+        return f"{self.recipient} - {self.subject} - {self.get_status_display()}"
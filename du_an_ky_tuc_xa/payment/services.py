@@ -1,40 +1,376 @@
 # payment/services.py
-from django.core.mail import EmailMultiAlternatives
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import groupby
+
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils.dateparse import parse_date
+from django.utils import timezone
 
-def send_payment_reminder(payment, request=None):
-    """Gửi email nhắc nhở thanh toán"""
-    student = payment.contract.student
-    context = {
-        'student_name': student.full_name or student.user.get_full_name(),
+from .models import EmailOutbox, ReminderLog
+
+logger = logging.getLogger(__name__)
+
+# Số email mỗi lô (chờ giới hạn tốc độ một lần), số email tối đa mỗi giây và số kết nối SMTP song song
+REMINDER_BATCH_SIZE = getattr(settings, 'PAYMENT_REMINDER_BATCH_SIZE', 50)
+REMINDER_RATE_LIMIT = getattr(settings, 'PAYMENT_REMINDER_RATE_LIMIT', None)
+REMINDER_WORKERS = getattr(settings, 'PAYMENT_REMINDER_WORKERS', 1)
+
+# Số ngày không nhắc lại cùng một hóa đơn, theo loại nhắc nhở
+REMINDER_COOLDOWN_DAYS = getattr(settings, 'PAYMENT_REMINDER_COOLDOWN_DAYS', {'upcoming': 3, 'overdue': 1})
+
+# Hàng đợi email: số lần thử tối đa, thời gian chờ gốc (giây) cho backoff và thời gian giữ khóa
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+OUTBOX_BACKOFF_SECONDS = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_SECONDS', 60)
+OUTBOX_LOCK_TIMEOUT = timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_LOCK_TIMEOUT', 600))
+
+
+PAYMENT_FILTERS = ('status', 'method', 'building', 'due_from', 'due_to')
+
+
+def _parse_date(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+def filter_payments(payments, params):
+    """Lọc hóa đơn theo tham số GET: status, method, building, due_from, due_to"""
+    status = params.get('status')
+    if status:
+        payments = payments.filter(status=status)
+    method = params.get('method')
+    if method:
+        payments = payments.filter(payment_method=method)
+    building = params.get('building')
+    if building and building.isdigit():
+        payments = payments.filter(contract__room__building_id=building)
+    due_from = _parse_date(params.get('due_from'))
+    if due_from:
+        payments = payments.filter(due_date__gte=due_from)
+    due_to = _parse_date(params.get('due_to'))
+    if due_to:
+        payments = payments.filter(due_date__lte=due_to)
+    return payments
+
+
+def _bill_context(payment, request=None, today=None):
+    today = today or timezone.now().date()
+    # Tạo payment URL
+    if request:
+        payment_url = request.build_absolute_uri(f'/payments/{payment.id}/')
+    else:
+        payment_url = f'http://localhost:8000/payments/{payment.id}/'
+    return {
         'payment_id': payment.id,
         'amount': payment.amount,
         'due_date': payment.due_date,
         'notes': payment.notes or "Tiền thuê phòng ký túc xá",
+        'payment_url': payment_url,
+        'overdue': payment.due_date < today,
     }
-    
-    # Tạo payment URL
-    if request:
-        context['payment_url'] = request.build_absolute_uri(f'/payments/{payment.id}/')
-    else:
-        context['payment_url'] = f'http://localhost:8000/payments/{payment.id}/'
-    
+
+
+def build_reminder_digest(student, payments, request=None):
+    """Tạo một email nhắc nhở (chưa gửi) liệt kê các hóa đơn của một sinh viên"""
+    bills = [_bill_context(payment, request) for payment in payments]
+    context = {
+        'student_name': student.full_name or student.user.get_full_name(),
+        'bills': bills,
+        'total_amount': sum(bill['amount'] for bill in bills),
+    }
+
     # Render template
     html_content = render_to_string('payment/email/payment_reminder.html', context)
     text_content = strip_tags(html_content)
-    
-    # Tạo email
-    subject = f"🔔 Thông báo thanh toán hóa đơn #{payment.id}"
-    from_email = settings.DEFAULT_FROM_EMAIL
-    to_email = [student.user.email]
-    
-    try:
-        msg = EmailMultiAlternatives(subject, text_content, from_email, to_email)
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
-        return True
-    except Exception as e:
-        print(f"Lỗi gửi email: {e}")
-        return False
\ No newline at end of file
+
+    if len(bills) == 1:
+        subject = f"🔔 Thông báo thanh toán hóa đơn #{bills[0]['payment_id']}"
+    else:
+        subject = f"🔔 Thông báo thanh toán {len(bills)} hóa đơn"
+    msg = EmailMultiAlternatives(subject, text_content, settings.DEFAULT_FROM_EMAIL, [student.user.email])
+    msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
+def build_payment_reminder(payment, request=None):
+    """Tạo email nhắc nhở thanh toán cho một hóa đơn (chưa gửi)"""
+    return build_reminder_digest(payment.contract.student, [payment], request)
+
+
+class RateLimiter:
+    """Giới hạn số email gửi mỗi giây, dùng chung cho nhiều luồng"""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self, count=1):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_slot)
+            self.next_slot = start + self.interval * count
+        if start > now:
+            time.sleep(start - now)
+
+
+def _send_batch(connection, batch, results):
+    """Gửi một lô qua kết nối có sẵn, mỗi email một lần send_messages.
+
+    Backend gửi lần lượt và có thể lỗi giữa chừng mà không cho biết email nào đã đi, nên
+    gửi từng email trên kết nối đang mở để ghi đúng kết quả của từng email: email đã gửi
+    không bao giờ bị báo lỗi rồi gửi lại.
+    """
+    for key, msg in batch:
+        try:
+            connection.send_messages([msg])
+        except Exception as e:
+            logger.warning("Lỗi gửi email %s: %s", key, e)
+            results[key] = {'sent': False, 'error': str(e)}
+            try:
+                # Kết nối SMTP có thể đã hỏng sau lỗi, mở lại trước khi gửi tiếp
+                connection.close()
+                connection.open()
+            except Exception as e:
+                logger.warning("Lỗi kết nối email: %s", e)
+        else:
+            results[key] = {'sent': True, 'error': ''}
+
+
+def dispatch_messages(items, batch_size=None, rate_limit=None, workers=None):
+    """Gửi danh sách (khóa, email) theo lô qua các kết nối dùng chung.
+
+    Mỗi luồng mở một kết nối và giữ nó cho tới khi hết lô. Trả về dict
+    khóa -> {'sent': bool, 'error': str}.
+    """
+    batch_size = batch_size or REMINDER_BATCH_SIZE
+    rate_limit = rate_limit if rate_limit is not None else REMINDER_RATE_LIMIT
+    workers = workers or REMINDER_WORKERS
+
+    items = list(items)
+    if not items:
+        return {}
+    batches = queue.Queue()
+    for i in range(0, len(items), batch_size):
+        batches.put(items[i:i + batch_size])
+
+    limiter = RateLimiter(rate_limit) if rate_limit else None
+    results = {}
+
+    def worker():
+        connection = get_connection()
+        try:
+            connection.open()
+            while True:
+                try:
+                    batch = batches.get_nowait()
+                except queue.Empty:
+                    return
+                if limiter:
+                    limiter.wait(len(batch))
+                _send_batch(connection, batch, results)
+        except Exception as e:
+            # Không mở được kết nối: đánh dấu lỗi cho các lô còn lại
+            logger.warning("Lỗi kết nối email: %s", e)
+            while True:
+                try:
+                    batch = batches.get_nowait()
+                except queue.Empty:
+                    return
+                for key, _ in batch:
+                    results[key] = {'sent': False, 'error': str(e)}
+        finally:
+            connection.close()
+
+    workers = max(1, min(workers, batches.qsize()))
+    if workers == 1:
+        worker()
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in range(workers):
+                pool.submit(worker)
+    return results
+
+
+def send_payment_reminders(payments, request=None, batch_size=None, rate_limit=None, workers=None):
+    """Gửi email nhắc nhở cho nhiều hóa đơn, trả về dict payment_id -> kết quả"""
+    if hasattr(payments, 'select_related'):
+        payments = payments.select_related('contract__student__user')
+
+    results = {}
+    items = []
+    for payment in payments:
+        if not payment.contract.student.user.email:
+            results[payment.id] = {'sent': False, 'error': 'Sinh viên chưa có email'}
+            continue
+        items.append((payment.id, build_payment_reminder(payment, request)))
+
+    results.update(dispatch_messages(items, batch_size=batch_size, rate_limit=rate_limit, workers=workers))
+    return results
+
+
+def send_reminder_digests(payments, request=None, batch_size=None, rate_limit=None, workers=None):
+    """Gom hóa đơn theo sinh viên và gửi một email cho mỗi sinh viên.
+
+    Chỉ dùng một truy vấn; kết quả vẫn trả về theo từng payment_id.
+    """
+    payments = payments.select_related('contract__student__user').order_by('contract__student_id', 'due_date', 'pk')
+
+    results = {}
+    items = []
+    for student_id, group in groupby(payments, key=lambda payment: payment.contract.student_id):
+        group = list(group)
+        payment_ids = tuple(payment.id for payment in group)
+        student = group[0].contract.student
+        if not student.user.email:
+            for payment_id in payment_ids:
+                results[payment_id] = {'sent': False, 'error': 'Sinh viên chưa có email'}
+            continue
+        items.append((payment_ids, build_reminder_digest(student, group, request)))
+
+    sent = dispatch_messages(items, batch_size=batch_size, rate_limit=rate_limit, workers=workers)
+    for payment_ids, result in sent.items():
+        for payment_id in payment_ids:
+            results[payment_id] = result
+    return results
+
+
+def reminder_kind(payment, today):
+    return 'overdue' if payment.due_date < today else 'upcoming'
+
+
+def recently_reminded(kind, today):
+    """Điều kiện EXISTS: hóa đơn đã được nhắc loại `kind` trong thời gian chờ"""
+    return Exists(ReminderLog.objects.filter(
+        payment=OuterRef('pk'),
+        kind=kind,
+        sent_on__gt=today - timedelta(days=REMINDER_COOLDOWN_DAYS[kind]),
+    ))
+
+
+def exclude_recently_reminded(payments, today):
+    """Bỏ các hóa đơn còn trong thời gian chờ bằng anti-join trong SQL"""
+    return payments.filter(
+        Q(~recently_reminded('overdue', today), due_date__lt=today) |
+        Q(~recently_reminded('upcoming', today), due_date__gte=today)
+    )
+
+
+def record_reminders(payments, results, today):
+    """Ghi nhật ký cho các hóa đơn đã gửi thành công"""
+    ReminderLog.objects.bulk_create(
+        [
+            ReminderLog(payment_id=payment.id, kind=reminder_kind(payment, today), sent_on=today)
+            for payment in payments
+            if results.get(payment.id, {}).get('sent')
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def enqueue_payment_reminders(payments, request=None):
+    """Render email nhắc nhở và đưa vào hàng đợi bằng một lần bulk_create, trả về số email"""
+    if hasattr(payments, 'select_related'):
+        payments = payments.select_related('contract__student__user')
+
+    rows = []
+    for payment in payments:
+        if not payment.contract.student.user.email:
+            continue
+        msg = build_payment_reminder(payment, request)
+        rows.append(EmailOutbox(
+            payment=payment,
+            recipient=msg.to[0],
+            subject=msg.subject,
+            body=msg.body,
+            html_body=msg.alternatives[0][0],
+        ))
+    EmailOutbox.objects.bulk_create(rows)
+    return len(rows)
+
+
+def outbox_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _claimable(now):
+    # Email đến hạn gửi, hoặc bị một worker đã chết giữ quá lâu
+    return (
+        Q(status='pending', next_attempt_at__lte=now) |
+        Q(status='sending', locked_at__lt=now - OUTBOX_LOCK_TIMEOUT)
+    )
+
+
+def claim_outbox_batch(worker_id, batch_size):
+    """Nhận một lô email bằng UPDATE có điều kiện, nên nhiều worker chạy song song không nhận trùng"""
+    now = timezone.now()
+    ids = list(
+        EmailOutbox.objects.filter(_claimable(now))
+        .order_by('next_attempt_at', 'pk')
+        .values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    EmailOutbox.objects.filter(_claimable(now), pk__in=ids).update(
+        status='sending', locked_by=worker_id, locked_at=now,
+    )
+    return list(EmailOutbox.objects.filter(pk__in=ids, status='sending', locked_by=worker_id, locked_at=now))
+
+
+def process_outbox_batch(worker_id, batch_size=None, max_attempts=None, **dispatch_options):
+    """Gửi một lô email trong hàng đợi; email lỗi được hẹn gửi lại với backoff lũy thừa.
+
+    Trả về (số email đã gửi, số email lỗi), hoặc None khi hàng đợi trống.
+    """
+    batch_size = batch_size or REMINDER_BATCH_SIZE
+    max_attempts = max_attempts or OUTBOX_MAX_ATTEMPTS
+
+    rows = claim_outbox_batch(worker_id, batch_size)
+    if not rows:
+        return None
+
+    items = []
+    for row in rows:
+        msg = EmailMultiAlternatives(row.subject, row.body, settings.DEFAULT_FROM_EMAIL, [row.recipient])
+        if row.html_body:
+            msg.attach_alternative(row.html_body, "text/html")
+        items.append((row.pk, msg))
+    results = dispatch_messages(items, batch_size=batch_size, **dispatch_options)
+
+    now = timezone.now()
+    sent_ids = [pk for pk, result in results.items() if result['sent']]
+    EmailOutbox.objects.filter(pk__in=sent_ids).update(
+        status='sent', sent_at=now, attempts=F('attempts') + 1, locked_by='', locked_at=None,
+    )
+
+    failed = []
+    for row in rows:
+        result = results[row.pk]
+        if result['sent']:
+            continue
+        row.attempts += 1
+        row.last_error = result['error']
+        row.locked_by = ''
+        row.locked_at = None
+        if row.attempts >= max_attempts:
+            row.status = 'failed'
+        else:
+            row.status = 'pending'
+            row.next_attempt_at = now + timedelta(seconds=OUTBOX_BACKOFF_SECONDS * 2 ** (row.attempts - 1))
+        failed.append(row)
+    EmailOutbox.objects.bulk_update(
+        failed, ['status', 'attempts', 'next_attempt_at', 'last_error', 'locked_by', 'locked_at'],
+    )
+    return len(sent_ids), len(failed)
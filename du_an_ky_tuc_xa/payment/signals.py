@@ -0,0 +1,26 @@
+# payment/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from dormitory import counters
+from dormitory.signals import remember_state
+from .models import Payment
+
+
+@receiver(pre_save, sender=Payment)
+def payment_before_save(sender, instance, **kwargs):
+    remember_state(sender, instance, ('status',))
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, **kwargs):
+    new_name = counters.payment_counter(instance.status)
+    if instance._old_state is None:
+        counters.bump(new_name, 1)
+    else:
+        counters.move(counters.payment_counter(instance._old_state[0]), new_name)
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    counters.bump(counters.payment_counter(instance.status), -1)
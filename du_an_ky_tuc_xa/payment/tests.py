@@ -1,3 +1,459 @@
-from django.test import TestCase
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import date, timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.core import mail
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from accounts.models import CustomUser
+from dormitory import counters
+from dormitory.models import Building, Contract, Room, RoomType, Student
+from .billing import billing_period_for, generate_monthly_bills
+from .models import BillingRun, EmailOutbox, Payment, ReminderLog
+from .services import (
+    claim_outbox_batch, dispatch_messages, enqueue_payment_reminders, process_outbox_batch,
+    send_payment_reminders, send_reminder_digests,
+)
+
+
+class CountingBackend(EmailBackend):
+    """Backend locmem đếm số kết nối và số lần send_messages"""
+    connections = 0
+    calls = 0
+
+    def open(self):
+        CountingBackend.connections += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        CountingBackend.calls += 1
+        return super().send_messages(messages)
+
+
+def create_payments(count, email='sv@example.com'):
+    building = Building.objects.create(name='A1', address='Hà Nội', total_floors=5)
+    room_type = RoomType.objects.create(name='Phòng đôi', capacity=2, price_per_month=1500000)
+    room = Room.objects.create(room_number='101', building=building, room_type=room_type, floor=1)
+    user = CustomUser.objects.create_user(username='sv1', password='x', email=email)
+    student = Student.objects.create(user=user, student_id='SV001', full_name='Nguyễn Văn A')
+    contract = Contract.objects.create(
+        contract_number='CT001', student=student, room=room,
+        start_date=date.today(), end_date=date.today() + timedelta(days=365), deposit=1500000,
+    )
+    return [
+        Payment.objects.create(contract=contract, amount=1500000, due_date=date.today() + timedelta(days=i))
+        for i in range(count)
+    ]
+
+
+def create_contracts(per_building, buildings=2):
+    """Hợp đồng đang hoạt động chia đều cho các tòa nhà, mỗi tòa một phòng đủ giường"""
+    room_type = RoomType.objects.create(name='Phòng 8 người', capacity=8, price_per_month=800000)
+    contracts = []
+    for b in range(buildings):
+        building = Building.objects.create(name=f'B{b}', address='Hà Nội', total_floors=5)
+        room = Room.objects.create(room_number='101', building=building, room_type=room_type, floor=1)
+        for i in range(per_building):
+            code = f'SV{b}{i:02d}'
+            user = CustomUser.objects.create_user(username=code)
+            student = Student.objects.create(user=user, student_id=code, full_name=code)
+            contracts.append(Contract.objects.create(
+                contract_number=f'CT{code}', student=student, room=room,
+                start_date=date.today(), end_date=date.today() + timedelta(days=365), deposit=0,
+            ))
+    return contracts
+
+
+@override_settings(EMAIL_BACKEND='payment.tests.CountingBackend')
+class ReminderDispatchTests(TestCase):
+    def setUp(self):
+        CountingBackend.connections = 0
+        CountingBackend.calls = 0
+
+    def test_sends_batches_over_one_connection(self):
+        payments = create_payments(5)
+
+        results = send_payment_reminders(Payment.objects.all(), batch_size=2)
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingBackend.connections, 1)
+        self.assertEqual(CountingBackend.calls, 5)
+        self.assertEqual(set(results), {p.id for p in payments})
+        self.assertTrue(all(result['sent'] for result in results.values()))
+
+    def test_thread_pool_opens_one_connection_per_worker(self):
+        create_payments(6)
+
+        results = send_payment_reminders(Payment.objects.all(), batch_size=1, workers=3)
+
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(CountingBackend.connections, 3)
+        self.assertEqual(len(results), 6)
+
+    def test_digest_sends_one_email_per_student(self):
+        payments = create_payments(3)
+
+        with self.assertNumQueries(1):
+            results = send_reminder_digests(Payment.objects.all())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('3 hóa đơn', mail.outbox[0].subject)
+        for payment in payments:
+            self.assertIn(f'#{payment.id}', mail.outbox[0].body)
+            self.assertTrue(results[payment.id]['sent'])
+
+    def test_missing_email_is_reported_per_payment(self):
+        payments = create_payments(2, email='')
+
+        results = send_payment_reminders(Payment.objects.all())
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(results[payments[0].id]['sent'])
+        self.assertTrue(results[payments[0].id]['error'])
+
+    def test_failed_message_does_not_fail_batch(self):
+        good = mail.EmailMessage('ok', 'body', 'noreply@kytucxa.com', ['a@example.com'])
+        bad = mail.EmailMessage('bad', 'body', 'noreply@kytucxa.com', ['b@example.com'])
+        original = CountingBackend.send_messages
+
+        def send_messages(backend, messages):
+            if any(msg.subject == 'bad' for msg in messages):
+                raise OSError('SMTP lỗi')
+            return original(backend, messages)
+
+        with mock.patch.object(CountingBackend, 'send_messages', send_messages):
+            results = dispatch_messages([('good', good), ('bad', bad)], batch_size=2)
+
+        self.assertEqual(results['good'], {'sent': True, 'error': ''})
+        self.assertFalse(results['bad']['sent'])
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_error_mid_batch_does_not_resend_delivered_messages(self):
+        messages = [
+            (i, mail.EmailMessage('bad' if i == 2 else f'ok {i}', 'body', 'noreply@kytucxa.com', ['a@example.com']))
+            for i in range(5)
+        ]
+
+        def send_messages(backend, messages):
+            # Gửi lần lượt như backend SMTP; địa chỉ hỏng lỗi trước khi render email đó
+            CountingBackend.calls += 1
+            for message in messages:
+                if message.subject == 'bad':
+                    raise ValueError('Địa chỉ không hợp lệ')
+                message.message()
+                mail.outbox.append(message)
+            return len(messages)
+
+        with mock.patch.object(CountingBackend, 'send_messages', send_messages):
+            results = dispatch_messages(messages, batch_size=5)
+
+        self.assertEqual(sorted(msg.subject for msg in mail.outbox), ['ok 0', 'ok 1', 'ok 3', 'ok 4'])
+        self.assertEqual((CountingBackend.connections, CountingBackend.calls), (2, 5))
+        self.assertFalse(results[2]['sent'])
+        self.assertTrue(all(results[i]['sent'] for i in (0, 1, 3, 4)))
+
+
+class EmailOutboxTests(TestCase):
+    def test_enqueue_then_process(self):
+        create_payments(3)
+
+        self.assertEqual(enqueue_payment_reminders(Payment.objects.all()), 3)
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(process_outbox_batch('worker-1'), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(EmailOutbox.objects.filter(status='sent').count(), 3)
+        self.assertIsNone(process_outbox_batch('worker-1'))
+
+    def test_failed_send_is_retried_with_backoff(self):
+        create_payments(1)
+        enqueue_payment_reminders(Payment.objects.all())
+
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=OSError('SMTP lỗi')):
+            self.assertEqual(process_outbox_batch('worker-1', max_attempts=2), (0, 1))
+
+        row = EmailOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts), ('pending', 1))
+        self.assertGreater(row.next_attempt_at, row.created_at)
+        # Chưa đến hạn thử lại
+        self.assertIsNone(process_outbox_batch('worker-1'))
+
+    def test_concurrent_workers_claim_disjoint_rows(self):
+        create_payments(4)
+        enqueue_payment_reminders(Payment.objects.all())
+
+        first = claim_outbox_batch('worker-1', 3)
+        second = claim_outbox_batch('worker-2', 3)
+
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 1)
+        self.assertFalse({row.pk for row in first} & {row.pk for row in second})
+
+
+class ReminderLedgerTests(TestCase):
+    def test_second_run_skips_already_reminded_payments(self):
+        payments = create_payments(2)
+        Payment.objects.filter(pk=payments[0].pk).update(due_date=date.today() - timedelta(days=2))
+
+        for digest in ([], ['--digest']):
+            mail.outbox = []
+            ReminderLog.objects.all().delete()
+            call_command('send_payment_reminders', *digest, stdout=StringIO())
+            self.assertEqual(len(mail.outbox), 1 if digest else 2)
+            self.assertEqual(
+                set(ReminderLog.objects.values_list('payment_id', 'kind')),
+                {(payments[0].id, 'overdue'), (payments[1].id, 'upcoming')},
+            )
+
+            mail.outbox = []
+            call_command('send_payment_reminders', *digest, stdout=StringIO())
+            self.assertEqual(len(mail.outbox), 0)
+
+
+class OverdueCheckTests(TestCase):
+    def test_marks_past_due_pending_bills_once(self):
+        late, paid, upcoming = create_payments(3)
+        Payment.objects.filter(pk__in=[late.pk, paid.pk]).update(due_date=date.today() - timedelta(days=1))
+        paid.status = 'paid'
+        paid.save()
+        pending_before = counters.read_counter(counters.payment_counter('pending'))
+
+        out = StringIO()
+        call_command('check_overdue_payments', stdout=out)
+
+        self.assertEqual(
+            dict(Payment.objects.values_list('pk', 'status')),
+            {late.pk: 'overdue', paid.pk: 'paid', upcoming.pk: 'pending'},
+        )
+        self.assertIn('Đã đánh dấu 1 hóa đơn quá hạn', out.getvalue())
+        self.assertIn(f'HĐ #{late.pk}: SV001', out.getvalue())
+        self.assertEqual(counters.read_counter(counters.payment_counter('pending')), pending_before - 1)
+        self.assertEqual(counters.read_counter(counters.payment_counter('overdue')), 1)
+
+        out = StringIO()
+        call_command('check_overdue_payments', stdout=out)
+
+        self.assertIn('Đã đánh dấu 0 hóa đơn quá hạn', out.getvalue())
+        self.assertEqual(counters.read_counter(counters.payment_counter('overdue')), 1)
+        self.assertEqual(Payment.objects.get(pk=late.pk).status, 'overdue')
+
+class PaymentListTests(TestCase):
+    def setUp(self):
+        payments = create_payments(25)
+        Payment.objects.filter(pk__in=[p.pk for p in payments[:5]]).update(status='paid')
+        self.staff = CustomUser.objects.create_user(username='staff', password='x', user_type='staff')
+
+    def test_staff_list_is_paginated_and_aggregated(self):
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse('payment_list'), {'page': 2})
+
+        self.assertEqual(response.context['page_obj'].paginator.count, 25)
+        self.assertEqual(len(response.context['page_obj']), 5)
+        self.assertEqual(response.context['stats'], {
+            'total_pending': 20, 'total_paid': 5, 'total_amount': 5 * 1500000,
+        })
+
+        response = self.client.get(reverse('payment_list'), {'status': 'pending'})
+
+        self.assertEqual(response.context['page_obj'].paginator.count, 20)
+        self.assertEqual(response.context['stats'], {
+            'total_pending': 20, 'total_paid': 0, 'total_amount': 0,
+        })
+
+    def test_filters_and_totals(self):
+        self.client.force_login(self.staff)
+        today = date.today()
+
+        response = self.client.get(reverse('payment_list'), {
+            'due_from': today.isoformat(), 'due_to': (today + timedelta(days=9)).isoformat(),
+        })
+
+        self.assertEqual(response.context['page_obj'].paginator.count, 10)
+        self.assertEqual(response.context['stats']['total_paid'], 5)
+        self.assertEqual(response.context['stats']['total_amount'], 5 * 1500000)
+
+    def test_student_sees_only_own_payments(self):
+        self.client.force_login(CustomUser.objects.get(username='sv1'))
+        response = self.client.get(reverse('payment_list'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 25)
+
+        other = CustomUser.objects.create_user(username='sv2', password='x')
+        Student.objects.create(user=other, student_id='SV002')
+        self.client.force_login(other)
+        response = self.client.get(reverse('payment_list'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 0)
+
+    def test_excel_export_streams_filtered_rows(self):
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse('export_payments_excel'), {'status': 'paid'})
+
+        self.assertTrue(response.streaming)
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        rows = list(sheet.values)
+        self.assertEqual(rows[0][:3], ('Mã hóa đơn', 'Số hợp đồng', 'Mã SV'))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({row[5] for row in rows[1:]}, {'Đã thanh toán'})
+
+    def test_csv_stream_uses_list_filters(self):
+        self.client.force_login(self.staff)
+
+        response = self.client.get(reverse('export_payments_stream', args=['csv']), {'status': 'paid'})
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,contract_number,student_id,amount,payment_method,status'))
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(all(',paid,' in line for line in lines[1:]))
+
+
+class MonthlyBillingTests(TestCase):
+    def setUp(self):
+        self.contracts = create_contracts(3)
+        self.today = date.today()
+        self.period = billing_period_for(self.today)
+
+    def test_bills_every_active_contract_once(self):
+        result = generate_monthly_bills(self.today)
+
+        self.assertEqual(result['period'], self.period)
+        self.assertEqual(result['bills_created'], 6)
+        self.assertEqual([p['bills_created'] for p in result['partitions']], [3, 3])
+        self.assertEqual(Payment.objects.filter(billing_period=self.period, status='pending').count(), 6)
+        self.assertEqual(Payment.objects.get(contract=self.contracts[0]).amount, 800000)
+
+        # Chạy lại trong cùng kỳ không tạo thêm
+        self.assertEqual(generate_monthly_bills(self.today)['bills_created'], 0)
+        self.assertEqual(Payment.objects.count(), 6)
+
+    def test_skips_already_billed_and_inactive_contracts(self):
+        Payment.objects.create(contract=self.contracts[0], amount=1, due_date=self.today, billing_period=self.period)
+        Contract.objects.filter(pk=self.contracts[1].pk).update(status='terminated')
+
+        result = generate_monthly_bills(self.today)
+
+        self.assertEqual(result['bills_created'], 4)
+        self.assertEqual(Payment.objects.get(contract=self.contracts[0]).amount, 1)
+        self.assertFalse(Payment.objects.filter(contract=self.contracts[1]).exists())
+
+    def test_overlapping_run_counts_only_inserted_rows(self):
+        # Lần chạy khác đã ghi hóa đơn sau khi anti-join của lần này đọc danh sách hợp đồng
+        Payment.objects.create(contract=self.contracts[0], amount=1, due_date=self.today, billing_period=self.period)
+        unfiltered = Contract.objects.filter(status='active').order_by('pk').values_list('pk', 'room__room_type__price_per_month')
+
+        with mock.patch('payment.billing.contracts_to_bill', return_value=unfiltered):
+            result = generate_monthly_bills(self.today)
+
+        self.assertEqual(result['bills_created'], 5)
+        self.assertEqual(Payment.objects.count(), 6)
+        # Bộ đếm tăng theo số hóa đơn thật sự thêm, khớp với khi đếm lại từ đầu
+        incremental = counters.read_counters()
+        counters.rebuild_counters()
+        self.assertEqual(incremental, counters.read_counters())
+
+    def test_backfill_assigns_period_to_existing_bills(self):
+        backfill = import_module('payment.migrations.0002_payment_billing_period').backfill_billing_period
+        auto = Payment.objects.create(
+            contract=self.contracts[0], amount=1, due_date=date(2026, 4, 10),
+            notes='Hóa đơn thuê phòng tháng 3/2026',
+        )
+        manual = Payment.objects.create(contract=self.contracts[1], amount=1, due_date=date(2026, 3, 15))
+        duplicate = Payment.objects.create(contract=self.contracts[1], amount=1, due_date=date(2026, 3, 20))
+
+        backfill(apps, None)
+
+        self.assertEqual(
+            [Payment.objects.get(pk=p.pk).billing_period for p in (auto, manual, duplicate)],
+            ['2026-03', '2026-03', None],
+        )
+
+    def test_interrupted_run_resumes_from_checkpoint(self):
+        bulk_create = Payment.objects.bulk_create
+        calls = []
+
+        def fail_second_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError('mất kết nối')
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(Payment.objects, 'bulk_create', side_effect=fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                generate_monthly_bills(self.today, batch_size=2)
+
+        run = BillingRun.objects.get(building=self.contracts[0].room.building_id)
+        self.assertEqual((run.status, run.last_contract_id, run.bills_created), ('failed', self.contracts[1].pk, 2))
+
+        result = generate_monthly_bills(self.today, batch_size=2)
+
+        self.assertEqual(result['bills_created'], 4)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.last_contract_id, run.bills_created), ('done', self.contracts[2].pk, 3))
+        self.assertEqual(Payment.objects.count(), 6)
+
+    def test_finished_partition_rescans_from_start(self):
+        Contract.objects.filter(pk=self.contracts[0].pk).update(status='terminated')
+        self.assertEqual(generate_monthly_bills(self.today)['bills_created'], 5)
+
+        # Hợp đồng có pk nhỏ hơn checkpoint được kích hoạt lại trong cùng kỳ
+        Contract.objects.filter(pk=self.contracts[0].pk).update(status='active')
+
+        self.assertEqual(generate_monthly_bills(self.today)['bills_created'], 1)
+        self.assertTrue(Payment.objects.filter(contract=self.contracts[0], billing_period=self.period).exists())
+        self.assertFalse(BillingRun.objects.exclude(status='done').exists())
+
+    def test_dry_run_writes_nothing(self):
+        out = StringIO()
+        call_command('generate_monthly_bills', '--dry-run', stdout=out)
+
+        self.assertIn('sẽ tạo 6 hóa đơn', out.getvalue())
+        self.assertFalse(Payment.objects.exists())
+        self.assertFalse(BillingRun.objects.exists())
+
+
+@contextmanager
+def file_database():
+    """Chép CSDL test trong bộ nhớ ra file tạm để tiến trình con (fork) cùng đọc ghi được"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'billing.sqlite3')
+        connection.ensure_connection()
+        target = sqlite3.connect(path)
+        connection.connection.backup(target)
+        target.close()
+        memory, name = connection.connection, connection.settings_dict['NAME']
+        connection.connection = None
+        connection.settings_dict['NAME'] = path
+        try:
+            yield
+        finally:
+            connection.close()
+            connection.settings_dict['NAME'] = name
+            connection.connection = memory
+
+
+@skipUnless(multiprocessing.get_start_method() == 'fork', 'Tiến trình con cần kế thừa cấu hình CSDL test')
+class ParallelBillingTests(TransactionTestCase):
+    def test_workers_bill_partitions_in_parallel(self):
+        create_contracts(4, buildings=3)
+
+        with file_database():
+            result = generate_monthly_bills(date.today(), batch_size=1, workers=3)
+            statuses = set(BillingRun.objects.values_list('status', flat=True))
+            bills = Payment.objects.filter(billing_period=result['period']).count()
+            pending = counters.read_counter(counters.payment_counter('pending'))
+
+        self.assertEqual(result['bills_created'], 12)
+        self.assertEqual([p['bills_created'] for p in result['partitions']], [4, 4, 4])
+        self.assertEqual((statuses, bills, pending), ({'done'}, 12, 12))
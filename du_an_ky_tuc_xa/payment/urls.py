@@ -8,4 +8,6 @@ urlpatterns = [
     path('<int:pk>/', views.payment_detail, name='payment_detail'),
     path('<int:pk>/update/', views.payment_update, name='payment_update'),
     path('<int:pk>/send-reminder/', views.send_reminder, name='send_reminder'),
+    path('export/excel/', views.export_payments_excel, name='export_payments_excel'),
+    path('export.<slug:fmt>', views.export_payments_stream, name='export_payments_stream'),
 ]
\ No newline at end of file
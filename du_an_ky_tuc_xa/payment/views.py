@@ -2,33 +2,53 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import Http404
+from django.core.paginator import Paginator
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from .models import Payment
-from dormitory.models import Contract
+from dormitory.models import Building
 from .forms import PaymentForm
+from .services import PAYMENT_FILTERS, filter_payments
+from .exports import PAYMENTS
+from dormitory.exports import STREAM_CONTENT_TYPES, stream_response, xlsx_response
 
 @login_required
 def payment_list(request):
-    """Danh sách thanh toán"""
+    """Danh sách thanh toán - phân trang, lọc, thống kê tính bằng aggregate trong DB"""
+    payments = Payment.objects.select_related('contract__student', 'contract__room__building')
     if request.user.user_type == 'student':
-        student = request.user.student
-        contracts = Contract.objects.filter(student=student)
-        payments = Payment.objects.filter(contract__in=contracts).select_related('contract__student', 'contract__room')
-    else:
-        payments = Payment.objects.all().select_related('contract__student', 'contract__room')
+        payments = payments.filter(contract__student__user=request.user)
+    
+    payments = filter_payments(payments, request.GET).order_by('-due_date', '-pk')
     
     # Thống kê
-    total_pending = payments.filter(status='pending').count()
-    total_paid = payments.filter(status='paid').count()
-    total_amount = sum(p.amount for p in payments.filter(status='paid'))
+    stats = payments.aggregate(
+        total_pending=Count('id', filter=Q(status__in=Payment.UNPAID_STATUSES)),
+        total_paid=Count('id', filter=Q(status='paid')),
+        total_amount=Sum('amount', filter=Q(status='paid')),
+    )
+    stats['total_amount'] = stats['total_amount'] or 0
+    
+    # Phân trang - 20 items per page
+    paginator = Paginator(payments, 20)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    # Giữ bộ lọc khi chuyển trang
+    filters = {key: request.GET.get(key, '') for key in PAYMENT_FILTERS}
+    query = request.GET.copy()
+    query.pop('page', None)
     
     context = {
-        'payments': payments,
-        'stats': {
-            'total_pending': total_pending,
-            'total_paid': total_paid,
-            'total_amount': total_amount,
-        }
+        'payments': page_obj,
+        'page_obj': page_obj,
+        'stats': stats,
+        'filters': filters,
+        'filter_query': query.urlencode(),
+        'status_choices': Payment.STATUS_CHOICES,
+        'method_choices': Payment.PAYMENT_METHODS,
+        'buildings': Building.objects.order_by('name').values_list('id', 'name'),
+        'today': timezone.now().date(),
     }
     return render(request, 'payment/payment_list.html', context)
 
@@ -85,7 +105,7 @@ def payment_update(request, pk):
 # payment/views.py - THÊM FUNCTION
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
-from .services import send_payment_reminder
+from .services import send_payment_reminders
 
 def send_reminder(request, pk):
     """Gửi email nhắc nhở cho hóa đơn cụ thể"""
@@ -95,9 +115,32 @@ def send_reminder(request, pk):
     
     payment = get_object_or_404(Payment, pk=pk)
     
-    if send_payment_reminder(payment, request):
+    result = send_payment_reminders([payment], request)[payment.id]
+    if result['sent']:
         messages.success(request, f'✅ Đã gửi email nhắc nhở cho HĐ #{payment.id}!')
     else:
-        messages.error(request, '❌ Gửi email thất bại!')
+        messages.error(request, f'❌ Gửi email thất bại: {result["error"]}')
+    
+    return redirect('admin:payment_payment_changelist')
+
+
+@login_required
+def export_payments_excel(request):
+    """Xuất hóa đơn Excel theo bộ lọc của danh sách (write-only, stream từ file tạm)"""
+    if request.user.user_type == 'student':
+        messages.error(request, "Bạn không có quyền xuất dữ liệu!")
+        return redirect('payment_list')
+    
+    return xlsx_response(PAYMENTS, filter_payments(Payment.objects.all(), request.GET))
+
+
+@login_required
+def export_payments_stream(request, fmt):
+    """Xuất hóa đơn CSV / NDJSON cho công cụ BI, dùng bộ lọc của danh sách"""
+    if request.user.user_type == 'student':
+        messages.error(request, "Bạn không có quyền xuất dữ liệu!")
+        return redirect('payment_list')
+    if fmt not in STREAM_CONTENT_TYPES:
+        raise Http404("Định dạng không hỗ trợ")
     
-    return redirect('admin:payment_payment_changelist')
\ No newline at end of file
+    return stream_response(request, PAYMENTS, fmt, filter_payments(Payment.objects.all(), request.GET))